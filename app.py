@@ -4,23 +4,49 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import plotly.graph_objects as go
-from scipy import stats
+from scipy import stats, signal
 from plotly.subplots import make_subplots
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression, LogisticRegression
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
 from sklearn.metrics import (mean_squared_error, r2_score, accuracy_score, 
                            mean_absolute_error, confusion_matrix, 
                            precision_score, recall_score, f1_score,
                            silhouette_score)
 import plotly.express as px
 import io
+import os
+import gzip
+import json
+import math
+import itertools
+import functools
+import threading
+import multiprocessing
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, as_completed
 import requests
+from requests.adapters import HTTPAdapter
 import time
+import random
+import asyncio
+import ast
+import abc
 import logging
 import base64
-from typing import Optional, Dict, Any
+from operator import itemgetter
+from urllib.parse import parse_qs, urlsplit, unquote
+from typing import Optional, Dict, Any, List, Tuple, Iterable, Iterator, Callable
+
+# pyarrow's multithreaded CSV reader is used for uploads when it is available
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+    pa_csv = None
 
 # Configure yfinance logging
 logging.getLogger('yfinance').setLevel(logging.ERROR)
@@ -569,116 +595,785 @@ st.markdown(f"""
     </style>
 """, unsafe_allow_html=True)
 
-# Alpha Vantage API configuration
-ALPHA_VANTAGE_API_KEY = ""  # Will be set by user input
+# Local OHLCV cache configuration
+OHLCV_CACHE_DIR = os.environ.get(
+    "STOCKSAGE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ohlcv")
+)
+OHLCV_CACHE_LIVE_TTL = 15 * 60     # Seconds a cached bar for the current day stays fresh
+OHLCV_CACHE_ROW_GROUP_SIZE = 252   # Roughly one trading year per Parquet row group
+_ohlcv_cache_locks: Dict[Tuple[str, str], threading.RLock] = {}
+_ohlcv_cache_locks_guard = threading.Lock()
+
+def _ohlcv_cache_lock(source: str, symbol: str) -> threading.RLock:
+    """Return the lock serialising cache access for one source and symbol"""
+    with _ohlcv_cache_locks_guard:
+        return _ohlcv_cache_locks.setdefault((source, symbol), threading.RLock())
+
+def _ohlcv_cache_dir(source: str, symbol: str) -> str:
+    """Return the partition directory holding cached bars for one source and symbol"""
+    return os.path.join(OHLCV_CACHE_DIR, source, f"symbol={symbol}")
+
+def _normalize_cache_range(start_date: pd.Timestamp, end_date: pd.Timestamp) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """Convert a requested range to a [start, end) pair of tz-naive midnights"""
+    start_date = pd.Timestamp(start_date)
+    end_date = pd.Timestamp(end_date)
+    if start_date.tzinfo is not None:
+        start_date = start_date.tz_localize(None)
+    if end_date.tzinfo is not None:
+        end_date = end_date.tz_localize(None)
+    return start_date.normalize(), end_date.normalize()
+
+def _merge_intervals(intervals: List[Tuple[pd.Timestamp, pd.Timestamp, float]]) -> List[Tuple[pd.Timestamp, pd.Timestamp, float]]:
+    """
+    Merge overlapping or touching [start, end) intervals stamped with their fetch time.
+    
+    A merged interval keeps the fetch time of the write that reached its end,
+    since that write holds its newest bar.
+    """
+    merged = []
+    for start, end, fetched_at in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            last_start, last_end, last_fetched_at = merged[-1]
+            if end > last_end or (end == last_end and fetched_at > last_fetched_at):
+                merged[-1] = (last_start, end, fetched_at)
+        else:
+            merged.append((start, end, fetched_at))
+    return merged
+
+def load_cache_coverage(source: str, symbol: str) -> Dict[str, Any]:
+    """
+    Load the coverage record for a cached symbol.
+    
+    Returns:
+    --------
+    dict
+        'intervals' : list of (start, end) date ranges already held, end exclusive
+        'fetched_at' : UNIX time each interval's newest bar was fetched, in the same order
+    """
+    path = os.path.join(_ohlcv_cache_dir(source, symbol), "_coverage.json")
+    try:
+        with open(path, "r") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return {'intervals': [], 'fetched_at': []}
+    
+    # Older records hold [start, end] pairs and one fetch time for the symbol
+    default_fetched_at = record.get('fetched_at') or 0
+    intervals = []
+    fetched_at = []
+    for start, end, *stamp in record.get('intervals', []):
+        intervals.append((pd.Timestamp(start), pd.Timestamp(end)))
+        fetched_at.append(stamp[0] if stamp else default_fetched_at)
+    return {'intervals': intervals, 'fetched_at': fetched_at}
+
+def _fresh_intervals(coverage: Dict[str, Any]) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """
+    Clip each interval whose last day had not closed when it was fetched.
+    
+    Bars from the fetch day on may have been partial, so once the fetch is
+    older than OHLCV_CACHE_LIVE_TTL the interval is cut back to the fetch day
+    and those days are fetched again.
+    """
+    now = time.time()
+    
+    fresh = []
+    for (start, end), fetched_at in zip(coverage['intervals'], coverage['fetched_at']):
+        fetched = pd.Timestamp.fromtimestamp(fetched_at)
+        if fetched < end and now - fetched_at > OHLCV_CACHE_LIVE_TTL:
+            end = min(end, fetched.normalize())
+        if start < end:
+            fresh.append((start, end))
+    return fresh
 
-def fetch_alpha_vantage_data(ticker_symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> Optional[pd.DataFrame]:
+def read_cached_ohlcv(source: str, symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> Optional[pd.DataFrame]:
     """
-    Fetch stock data from Alpha Vantage API
+    Read cached bars for a symbol if the requested range is fully held locally.
     
     Parameters:
     -----------
-    ticker_symbol : str
+    source : str
+        Data provider the bars came from ('alpha_vantage' or 'yahoo')
+    symbol : str
         The stock ticker symbol
     start_date : pd.Timestamp
-        Start date for data fetching
+        First date of the requested range (inclusive)
     end_date : pd.Timestamp
-        End date for data fetching
+        End of the requested range (exclusive)
         
     Returns:
     --------
     Optional[pd.DataFrame]
-        DataFrame containing the stock data or None if fetch fails
+        Cached bars indexed by date, or None on a cache miss
     """
-    if not ALPHA_VANTAGE_API_KEY:
-        st.error("Please enter an Alpha Vantage API key in the sidebar.")
-        st.info("You can get a free API key at https://www.alphavantage.co/support/#api-key")
-        return None
+    start_date, end_date = _normalize_cache_range(start_date, end_date)
+    path = os.path.join(_ohlcv_cache_dir(source, symbol), "bars.parquet")
+    
+    with _ohlcv_cache_lock(source, symbol):
+        if plan_delta_fetch(source, symbol, start_date, end_date) or not os.path.exists(path):
+            return None
         
+        try:
+            # Date filters are pushed down to the Parquet reader so only the
+            # row groups overlapping the requested range are decoded
+            df = pd.read_parquet(
+                path,
+                engine="pyarrow",
+                filters=[('date', '>=', start_date), ('date', '<', end_date)]
+            )
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Ignoring unreadable cache for {symbol}: {e}")
+            return None
+    
+    df = df.set_index('date').sort_index()
+    df['symbol'] = symbol
+    return df
+
+def write_cached_ohlcv(source: str, symbol: str, df: pd.DataFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> None:
+    """
+    Merge freshly fetched bars into the local cache and record the covered range.
+    
+    Parameters:
+    -----------
+    source : str
+        Data provider the bars came from ('alpha_vantage' or 'yahoo')
+    symbol : str
+        The stock ticker symbol
+    df : pd.DataFrame
+        Bars indexed by date
+    start_date : pd.Timestamp
+        First date the fetch covered (inclusive)
+    end_date : pd.Timestamp
+        End of the range the fetch covered (exclusive)
+    """
+    start_date, end_date = _normalize_cache_range(start_date, end_date)
+    directory = _ohlcv_cache_dir(source, symbol)
+    path = os.path.join(directory, "bars.parquet")
+    
     try:
-        # Base URL for Alpha Vantage API
-        base_url = "https://www.alphavantage.co/query"
+        with _ohlcv_cache_lock(source, symbol):
+            os.makedirs(directory, exist_ok=True)
+            coverage = load_cache_coverage(source, symbol)
+            
+            # An empty frame still records the range as covered (e.g. a holiday gap)
+            if df is not None and not df.empty:
+                new_bars = to_cache_frame(df)
+                if os.path.exists(path):
+                    held = pd.read_parquet(path, engine="pyarrow")
+                    new_bars = pd.concat([held, new_bars], ignore_index=True)
+                    new_bars = new_bars.drop_duplicates(subset='date', keep='last')
+                new_bars = new_bars.sort_values('date').reset_index(drop=True)
+                
+                # Write to a temporary file first so readers never see a partial file
+                tmp_path = path + ".tmp"
+                new_bars.to_parquet(tmp_path, engine="pyarrow", index=False,
+                                    row_group_size=OHLCV_CACHE_ROW_GROUP_SIZE)
+                os.replace(tmp_path, path)
+            
+            stamped = [(start, end, fetched_at) for (start, end), fetched_at in zip(coverage['intervals'], coverage['fetched_at'])]
+            intervals = _merge_intervals(stamped + [(start_date, end_date, time.time())])
+            record = {
+                'intervals': [[start.isoformat(), end.isoformat(), fetched_at] for start, end, fetched_at in intervals]
+            }
+            tmp_path = os.path.join(directory, "_coverage.json.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(record, f)
+            os.replace(tmp_path, os.path.join(directory, "_coverage.json"))
+    except Exception as e:
+        # The cache is an optimisation only; a failed write must not break the fetch
+        logging.getLogger(__name__).warning(f"Could not cache data for {symbol}: {e}")
+
+def to_cache_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert a provider frame to the flat, tz-naive layout stored in the cache"""
+    bars = df.drop(columns=['symbol'], errors='ignore').copy()
+    index = pd.DatetimeIndex(bars.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    bars.index = index.rename('date')
+    return bars.reset_index()
+
+# Intraday bar intervals, mapped to Alpha Vantage's names for them
+INTRADAY_INTERVALS = {
+    '1m': '1min',
+    '5m': '5min',
+    '15m': '15min',
+    '30m': '30min',
+    '60m': '60min'
+}
+
+def cache_source(provider: str, interval: str = "1d") -> str:
+    """Name of the cache partition for a provider's bars at one interval"""
+    return provider if interval == "1d" else f"{provider}_{interval}"
+
+# Number of most recent bars Alpha Vantage returns for outputsize=compact
+ALPHA_VANTAGE_COMPACT_BARS = 100
+
+def plan_delta_fetch(source: str, symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """
+    Work out which parts of a requested range are not yet held in the local cache.
+    
+    Parameters:
+    -----------
+    source : str
+        Data provider the bars come from ('alpha_vantage' or 'yahoo')
+    symbol : str
+        The stock ticker symbol
+    start_date : pd.Timestamp
+        First date of the requested range (inclusive)
+    end_date : pd.Timestamp
+        End of the requested range (exclusive)
         
-        # Parameters for the API request
-        params = {
-            "function": "TIME_SERIES_DAILY",
-            "symbol": ticker_symbol,
-            "apikey": ALPHA_VANTAGE_API_KEY,
-            "outputsize": "full"
-        }
+    Returns:
+    --------
+    List[Tuple[pd.Timestamp, pd.Timestamp]]
+        The (start, end) gaps that still have to be fetched, empty when fully cached
+    """
+    start_date, end_date = _normalize_cache_range(start_date, end_date)
+    with _ohlcv_cache_lock(source, symbol):
+        intervals = _fresh_intervals(load_cache_coverage(source, symbol))
+    
+    gaps = []
+    cursor = start_date
+    for start, end in intervals:
+        if end <= cursor:
+            continue
+        if start >= end_date:
+            break
+        if start > cursor:
+            gaps.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < end_date:
+        gaps.append((cursor, end_date))
+    return gaps
+
+def alpha_vantage_output_size(gaps: List[Tuple[pd.Timestamp, pd.Timestamp]]) -> str:
+    """Use the compact payload when every gap falls inside its last 100 trading days"""
+    # 100 business days back is never earlier than the 100th most recent trading day
+    horizon = pd.Timestamp.now().normalize() - pd.tseries.offsets.BDay(ALPHA_VANTAGE_COMPACT_BARS)
+    if gaps and all(start >= horizon for start, _ in gaps):
+        return "compact"
+    return "full"
+
+class DataFetchError(Exception):
+    """Raised when a data provider returns no usable bars"""
+
+class ProviderUnavailableError(DataFetchError):
+    """Raised when a data provider cannot be reached or answers with a server error"""
+
+class SymbolNotFoundError(DataFetchError):
+    """Raised when a provider does not know the requested symbol"""
+
+class EmptyRangeError(DataFetchError):
+    """Raised when a known symbol has no bars in the requested range"""
+
+class RequestAbandonedError(DataFetchError):
+    """Raised instead of sending a request whose answer is no longer needed"""
+
+# Negative cache configuration
+NEGATIVE_CACHE_TTL = 15 * 60        # Seconds an unknown symbol or empty range is remembered
+NEGATIVE_CACHE_ERROR_TTL = 60       # Seconds a provider error is remembered
+NEGATIVE_CACHE_MAX_ENTRIES = 10000
+
+class NegativeCache:
+    """
+    TTL-bounded memory of lookups that returned no data or a provider error.
+    
+    Unknown symbols are remembered for the whole symbol, empty ranges and
+    provider errors for the exact range. Repeat lookups re-raise the stored
+    error without touching the network, and entries expire on their own so
+    new listings become visible again.
+    """
+    
+    def __init__(self, max_entries: int = NEGATIVE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple, Tuple[float, type, str]] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _keys(provider: str, symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> Tuple[Tuple, Tuple]:
+        return (provider, symbol), (provider, symbol) + _normalize_cache_range(start_date, end_date)
+    
+    def check(self, provider: str, symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> None:
+        """Raise the remembered error if this lookup failed recently"""
+        now = time.monotonic()
+        with self._lock:
+            for key in self._keys(provider, symbol, start_date, end_date):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, error_type, message = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    continue
+                raise error_type(message)
+    
+    def record(self, provider: str, symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp, error: Exception) -> None:
+        """Remember a failed lookup; errors that say nothing about the symbol are ignored"""
+        symbol_key, range_key = self._keys(provider, symbol, start_date, end_date)
+        if isinstance(error, SymbolNotFoundError):
+            key, ttl = symbol_key, NEGATIVE_CACHE_TTL
+        elif isinstance(error, EmptyRangeError):
+            key, ttl = range_key, NEGATIVE_CACHE_TTL
+        elif isinstance(error, ProviderUnavailableError):
+            key, ttl = range_key, NEGATIVE_CACHE_ERROR_TTL
+        else:
+            return
         
-        with st.spinner(f'Fetching data for {ticker_symbol} from Alpha Vantage...'):
-            # Make the API request
-            response = requests.get(base_url, params=params)
-            
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + ttl, type(error), str(error))
+            if len(self._entries) > self.max_entries:
+                self._evict()
+    
+    def clear(self, provider: str, symbol: str) -> None:
+        """Forget every entry for a symbol, e.g. after it returned data"""
+        with self._lock:
+            for key in [key for key in self._entries if key[:2] == (provider, symbol)]:
+                del self._entries[key]
+    
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if entry[0] <= now]:
+            del self._entries[key]
+        # Entries are kept in insertion order, so the oldest go first
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+NEGATIVE_CACHE = NegativeCache()
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into a single execution.
+    
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for and receive the same result (or exception).
+    """
+    
+    def __init__(self):
+        self._calls: Dict[Any, Future] = {}
+        self._lock = threading.Lock()
+        self.shared_calls = 0
+    
+    def do(self, key: Any, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.shared_calls += 1
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+# Process-wide, so identical fetches from different Streamlit sessions are shared
+FETCH_SINGLE_FLIGHT = SingleFlight()
+
+def _fetch_key(provider: str, symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp, interval: str = "1d") -> Tuple:
+    """Key identifying one provider request for single-flight deduplication"""
+    return (provider, symbol) + _normalize_cache_range(start_date, end_date) + (interval,)
+
+# HTTP connection pool configuration
+HTTP_POOL_SIZE = 16     # Keep-alive connections held per host
+HTTP_TIMEOUT = 30       # Seconds before a provider request is abandoned
+
+# Alpha Vantage field names in the order of the OHLCV columns
+ALPHA_VANTAGE_FIELDS = ('1. open', '2. high', '3. low', '4. close', '5. volume')
+
+def parse_alpha_vantage_series(time_series_data: Dict[str, Dict[str, str]], start_date: Optional[pd.Timestamp] = None, end_date: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """
+    Parse an Alpha Vantage daily or intraday time series into an OHLCV DataFrame.
+    
+    The ISO date keys are filtered against the requested range before any
+    value is converted, and the remaining rows are converted to floats in a
+    single NumPy call.
+    
+    Parameters:
+    -----------
+    time_series_data : Dict[str, Dict[str, str]]
+        The 'Time Series (Daily)' or 'Time Series (5min)' style object of the response
+    start_date : pd.Timestamp, optional
+        First date to keep (inclusive)
+    end_date : pd.Timestamp, optional
+        End of the range to keep (exclusive)
+        
+    Returns:
+    --------
+    pd.DataFrame
+        Bars indexed by date in ascending order
+    """
+    dates = np.array(list(time_series_data.keys()), dtype=str)
+    
+    # ISO dates sort lexicographically, so the range filter works on the raw keys
+    mask = np.ones(len(dates), dtype=bool)
+    if start_date is not None:
+        mask &= dates >= pd.Timestamp(start_date).strftime('%Y-%m-%d')
+    if end_date is not None:
+        mask &= dates < pd.Timestamp(end_date).strftime('%Y-%m-%d')
+    dates = np.sort(dates[mask])
+    
+    fields = itemgetter(*ALPHA_VANTAGE_FIELDS)
+    values = np.array([fields(time_series_data[date]) for date in dates], dtype=np.float64)
+    
+    return pd.DataFrame(
+        values.reshape(len(dates), len(ALPHA_VANTAGE_FIELDS)),
+        index=pd.to_datetime(dates, format='ISO8601'),
+        columns=['open', 'high', 'low', 'close', 'volume']
+    )
+
+# Free-tier Alpha Vantage request quota
+ALPHA_VANTAGE_CALLS_PER_MINUTE = 5
+ALPHA_VANTAGE_THROTTLE_RETRIES = 3   # Times a throttled request is queued again
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that paces callers to a fixed request rate.
+    
+    Callers reserve tokens in arrival order. A reservation made while the
+    bucket is empty borrows from the future and tells the caller how long to
+    wait, so queued requests go out exactly on the quota schedule.
+    """
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate              # Tokens added per second
+        self.capacity = capacity      # Maximum burst size
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._waiting = 0
+        self._lock = threading.Lock()
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def reserve(self) -> float:
+        """Take one token and return the seconds to wait before it may be used"""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+    
+    def acquire(self) -> None:
+        """Block until a token is available"""
+        wait = self.reserve()
+        if wait <= 0:
+            return
+        with self._lock:
+            self._waiting += 1
+        try:
+            time.sleep(wait)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+    
+    def release(self) -> None:
+        """Give back a token that was acquired but not used"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + 1)
+    
+    def drain(self) -> None:
+        """Empty the bucket, e.g. after the provider reports throttling"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+    
+    @property
+    def queue_depth(self) -> int:
+        """Number of callers currently waiting for a token"""
+        with self._lock:
+            return self._waiting
+    
+    def expected_wait(self, n_requests: int = 1) -> float:
+        """Seconds until the last of n new requests could be sent"""
+        with self._lock:
+            self._refill()
+            return max(0.0, (n_requests - self._tokens) / self.rate)
+
+# Set while a request is made on behalf of a hedged fetch; the event fires
+# once another provider has answered, so requests not yet sent can be dropped
+HEDGE_ABANDONED: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("HEDGE_ABANDONED", default=None)
+
+def request_abandoned() -> bool:
+    """Return whether the hedged fetch this request belongs to has already been answered"""
+    abandoned = HEDGE_ABANDONED.get()
+    return abandoned is not None and abandoned.is_set()
+
+class AlphaVantageClient:
+    """
+    Alpha Vantage connection owned by a single API key.
+    
+    Each client has its own keep-alive connection pool, call counter,
+    concurrency limit and token bucket, so sessions using different keys never
+    share quota or throttling state and never wait on each other. Requests
+    beyond the quota are queued and paced instead of failing.
+    """
+    
+    BASE_URL = "https://www.alphavantage.co/query"
+    
+    def __init__(self, api_key: str, pool_size: int = HTTP_POOL_SIZE, max_concurrent: int = 4, calls_per_minute: int = ALPHA_VANTAGE_CALLS_PER_MINUTE, base_url: Optional[str] = None, record_dir: Optional[str] = None):
+        self.api_key = api_key
+        self.base_url = base_url or self.BASE_URL
+        self.record_dir = record_dir    # Save raw payloads here for LocalReplayProvider
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.bucket = TokenBucket(calls_per_minute / 60.0, calls_per_minute)
+        self._limiter = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.calls_made = 0
+        self.throttled_calls = 0
+    
+    def request(self, params: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Send one API request and return the decoded JSON body.
+        
+        A throttled answer empties the bucket and puts the request back in
+        the queue, up to ALPHA_VANTAGE_THROTTLE_RETRIES times.
+        
+        Raises:
+        -------
+        DataFetchError
+            If the request fails, the API reports an error or the quota stays exhausted
+        """
+        for attempt in range(ALPHA_VANTAGE_THROTTLE_RETRIES + 1):
+            response = self._send(params)
             if response.status_code != 200:
-                st.error(f"Failed to fetch data: HTTP {response.status_code}")
-                return None
-                
+                raise ProviderUnavailableError(f"Failed to fetch data: HTTP {response.status_code}")
+            
             data = response.json()
             
             # Check for API errors
             if "Error Message" in data:
-                st.error(f"API Error: {data['Error Message']}")
-                return None
-                
-            if "Time Series (Daily)" not in data:
-                st.error("No daily time series data found in the response")
-                return None
-                
-            # Convert the data to a DataFrame
-            time_series_data = data["Time Series (Daily)"]
-            
-            # Create lists to store the data
-            dates = []
-            opens = []
-            highs = []
-            lows = []
-            closes = []
-            volumes = []
+                raise SymbolNotFoundError(f"API Error: {data['Error Message']}")
             
-            # Parse the time series data
-            for date, values in time_series_data.items():
-                dates.append(date)
-                opens.append(float(values['1. open']))
-                highs.append(float(values['2. high']))
-                lows.append(float(values['3. low']))
-                closes.append(float(values['4. close']))
-                volumes.append(float(values['5. volume']))
-            
-            # Create DataFrame
-            df = pd.DataFrame({
-                'open': opens,
-                'high': highs,
-                'low': lows,
-                'close': closes,
-                'volume': volumes
-            }, index=pd.to_datetime(dates))
+            # Throttled calls come back as HTTP 200 with a note instead of data
+            note = data.get("Note") or data.get("Information")
+            if not note:
+                return data
+            with self._lock:
+                self.throttled_calls += 1
+            self.bucket.drain()
+        
+        raise DataFetchError(f"API limit reached: {note}")
+    
+    def _send(self, params: Dict[str, str]) -> requests.Response:
+        """Wait for a quota slot, then send the request"""
+        # A hedged request that lost the race while queued hands its slot back
+        # instead of sending
+        if request_abandoned():
+            raise RequestAbandonedError("Another provider answered first; request not sent")
+        self.bucket.acquire()
+        if request_abandoned():
+            self.bucket.release()
+            raise RequestAbandonedError("Another provider answered first; request not sent")
+        with self._limiter:
+            with self._lock:
+                self.calls_made += 1
+            return self.session.get(
+                self.base_url,
+                params={**params, "apikey": self.api_key},
+                timeout=HTTP_TIMEOUT
+            )
+    
+    def download_daily(self, ticker_symbol: str, outputsize: str = "full", start_date: Optional[pd.Timestamp] = None, end_date: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """
+        Download the daily time series for one symbol.
+        
+        Parameters:
+        -----------
+        ticker_symbol : str
+            The stock ticker symbol
+        outputsize : str
+            'compact' for the latest 100 bars or 'full' for the whole history
+        start_date, end_date : pd.Timestamp, optional
+            Only parse bars in [start_date, end_date)
             
-            # Sort index in ascending order
-            df.sort_index(inplace=True)
+        Returns:
+        --------
+        pd.DataFrame
+            Bars indexed by date in ascending order
             
-            # Filter the date range
-            df = df.loc[start_date:end_date]
+        Raises:
+        -------
+        DataFetchError
+            If the request fails or the response holds no daily series
+        """
+        data = self.request({
+            "function": "TIME_SERIES_DAILY",
+            "symbol": ticker_symbol,
+            "outputsize": outputsize
+        })
             
-            if len(df) == 0:
-                st.error(f"No data available for {ticker_symbol} in the specified date range.")
-                return None
-                
-            # Add ticker symbol as a column
-            df['symbol'] = ticker_symbol
+        if "Time Series (Daily)" not in data:
+            raise DataFetchError("No daily time series data found in the response")
+        
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+            with open(os.path.join(self.record_dir, f"{ticker_symbol}.json"), "w") as f:
+                json.dump(data, f)
             
-            st.success(f"Successfully fetched {len(df)} days of data for {ticker_symbol}")
-            return df
+        return parse_alpha_vantage_series(data["Time Series (Daily)"], start_date, end_date)
+
+    def download_intraday(self, ticker_symbol: str, interval: str = "5m", month: Optional[str] = None, start_date: Optional[pd.Timestamp] = None, end_date: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """
+        Download intraday bars for one symbol.
+        
+        Parameters:
+        -----------
+        ticker_symbol : str
+            The stock ticker symbol
+        interval : str
+            One of INTRADAY_INTERVALS, e.g. '1m' or '5m'
+        month : str, optional
+            'YYYY-MM' to fetch a past month; the latest 30 days otherwise
+        start_date, end_date : pd.Timestamp, optional
+            Only parse bars in [start_date, end_date)
             
-    except Exception as e:
-        st.error(f"Error fetching data from Alpha Vantage: {str(e)}")
+        Returns:
+        --------
+        pd.DataFrame
+            Bars indexed by timestamp in ascending order
+        """
+        params = {
+            "function": "TIME_SERIES_INTRADAY",
+            "symbol": ticker_symbol,
+            "interval": INTRADAY_INTERVALS[interval],
+            "outputsize": "full"
+        }
+        if month:
+            params["month"] = month
+        data = self.request(params)
+        
+        series_key = f"Time Series ({INTRADAY_INTERVALS[interval]})"
+        if series_key not in data:
+            raise DataFetchError("No intraday time series data found in the response")
+        return parse_alpha_vantage_series(data[series_key], start_date, end_date)
+
+_alpha_vantage_clients: Dict[str, AlphaVantageClient] = {}
+_alpha_vantage_clients_lock = threading.Lock()
+
+def get_alpha_vantage_client(api_key: str) -> Optional[AlphaVantageClient]:
+    """Return the client for an API key, shared by every session using that key"""
+    api_key = (api_key or "").strip()
+    if not api_key:
         return None
+    with _alpha_vantage_clients_lock:
+        if api_key not in _alpha_vantage_clients:
+            _alpha_vantage_clients[api_key] = AlphaVantageClient(api_key)
+        return _alpha_vantage_clients[api_key]
 
-def fetch_stock_data(ticker_symbol: str, start_date: Any, end_date: Any, max_retries: int = 3, retry_delay: int = 2) -> Optional[pd.DataFrame]:
+def load_alpha_vantage_bars(client: Optional[AlphaVantageClient], ticker_symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp, interval: str = "1d") -> Tuple[pd.DataFrame, bool]:
     """
-    Fetch stock data with fallback between different data sources
+    Load bars for a date range from the local cache, downloading only the missing part.
+    
+    Lookups that recently failed are answered from the negative cache.
+    
+    Returns:
+    --------
+    Tuple[pd.DataFrame, bool]
+        The bars in the requested range and whether they came entirely from the cache
+        
+    Raises:
+    -------
+    DataFetchError
+        If the bars cannot be fetched or the range holds no data
     """
+    source = cache_source("alpha_vantage", interval)
+    NEGATIVE_CACHE.check(source, ticker_symbol, start_date, end_date)
+    try:
+        # Concurrent identical requests share one in-flight download
+        df, from_cache = FETCH_SINGLE_FLIGHT.do(
+            _fetch_key("alpha_vantage", ticker_symbol, start_date, end_date, interval),
+            _load_alpha_vantage_bars, client, ticker_symbol, start_date, end_date, interval
+        )
+    except DataFetchError as e:
+        NEGATIVE_CACHE.record(source, ticker_symbol, start_date, end_date, e)
+        raise
+    NEGATIVE_CACHE.clear(source, ticker_symbol)
+    # The result may be shared with concurrent callers; each gets its own copy
+    # so an in-place edit in one session cannot leak into another
+    return df.copy(), from_cache
+
+def _load_alpha_vantage_bars(client: Optional[AlphaVantageClient], ticker_symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp, interval: str = "1d") -> Tuple[pd.DataFrame, bool]:
+    """Cache-aware Alpha Vantage load behind load_alpha_vantage_bars"""
+    source = cache_source("alpha_vantage", interval)
+    # Serve from the local cache when the whole range is already held
+    gaps = plan_delta_fetch(source, ticker_symbol, start_date, end_date)
+    if not gaps:
+        cached_df = read_cached_ohlcv(source, ticker_symbol, start_date, end_date)
+        if cached_df is not None and len(cached_df) > 0:
+            return cached_df, True
+    
+    if client is None:
+        raise DataFetchError("Please enter an Alpha Vantage API key in the sidebar.")
+    
+    if interval != "1d":
+        return _load_alpha_vantage_intraday(client, ticker_symbol, start_date, end_date, interval, gaps)
+    
+    # Only download the full history when a gap reaches beyond the compact window,
+    # and only parse the bars from the first missing date on
+    outputsize = alpha_vantage_output_size(gaps)
+    parse_from = gaps[0][0] if gaps else _normalize_cache_range(start_date, end_date)[0]
+    df = client.download_daily(ticker_symbol, outputsize, start_date=parse_from)
+    
+    # Either payload holds every bar from parse_from on (compact is only chosen
+    # when it reaches back that far), so merge them into the stored series
+    if len(df) > 0:
+        write_cached_ohlcv(
+            "alpha_vantage", ticker_symbol, df, parse_from,
+            pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+        )
+    
+    # Read the requested range back from the merged series, or filter
+    # the payload directly if the cache is unavailable
+    merged_df = read_cached_ohlcv("alpha_vantage", ticker_symbol, start_date, end_date)
+    df = merged_df if merged_df is not None else df.loc[start_date:end_date]
+    
+    if len(df) == 0:
+        raise EmptyRangeError(f"No data available for {ticker_symbol} in the specified date range.")
+        
+    # Add ticker symbol as a column
+    df['symbol'] = ticker_symbol
+    return df, False
+
+def _load_alpha_vantage_intraday(client: AlphaVantageClient, ticker_symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp, interval: str, gaps: List[Tuple[pd.Timestamp, pd.Timestamp]]) -> Tuple[pd.DataFrame, bool]:
+    """Download the missing calendar months of intraday bars, one request per month"""
+    source = cache_source("alpha_vantage", interval)
+    fetched = []
+    for gap_start, gap_end in gaps:
+        for month_start in pd.date_range(gap_start.replace(day=1), gap_end - pd.Timedelta(days=1), freq='MS'):
+            chunk_start = max(gap_start, month_start)
+            chunk_end = min(gap_end, month_start + pd.offsets.MonthBegin(1))
+            df = client.download_intraday(ticker_symbol, interval, month_start.strftime('%Y-%m'), chunk_start, chunk_end)
+            write_cached_ohlcv(source, ticker_symbol, df, chunk_start, chunk_end)
+            fetched.append(df)
+    
+    df = read_cached_ohlcv(source, ticker_symbol, start_date, end_date)
+    if df is None:
+        df = pd.concat(fetched).sort_index() if fetched else pd.DataFrame()
+    if len(df) == 0:
+        raise EmptyRangeError(f"No {interval} data available for {ticker_symbol} in the specified date range.")
+    df['symbol'] = ticker_symbol
+    return df, False
+
+def normalize_fetch_range(start_date: Any, end_date: Any) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """Convert user-selected dates to the (start, end) pair sent to the providers"""
     # Convert dates to pandas Timestamp if they aren't already
     if not isinstance(start_date, pd.Timestamp):
         start_date = pd.Timestamp(start_date)
@@ -692,167 +1387,1467 @@ def fetch_stock_data(ticker_symbol: str, start_date: Any, end_date: Any, max_ret
         
     # Add 1 day buffer to end_date to include the last day
     end_date = end_date + pd.Timedelta(days=1)
-        
-    # Validate ticker symbol
-    ticker_symbol = ticker_symbol.strip().upper()
+    return start_date, end_date
+
+def load_yahoo_bars(ticker_symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp, max_retries: int = 3, retry_delay: int = 2, interval: str = "1d") -> Tuple[pd.DataFrame, bool]:
+    """
+    Load bars for a date range from the local cache, downloading only the
+    missing ranges from Yahoo Finance.
     
-    # First try Alpha Vantage
-    if ALPHA_VANTAGE_API_KEY:
-        df = fetch_alpha_vantage_data(ticker_symbol, start_date, end_date)
-        if df is not None:
-            return df
-        st.warning("Alpha Vantage API failed, falling back to Yahoo Finance...")
+    Lookups that recently failed are answered from the negative cache.
     
-    # Fallback to Yahoo Finance
+    Returns:
+    --------
+    Tuple[pd.DataFrame, bool]
+        The bars in the requested range and whether they came entirely from the cache
+        
+    Raises:
+    -------
+    DataFetchError
+        If the bars cannot be fetched or the range holds no data
+    """
+    source = cache_source("yahoo", interval)
+    NEGATIVE_CACHE.check(source, ticker_symbol, start_date, end_date)
     try:
-        with st.spinner(f'Fetching data for {ticker_symbol} from Yahoo Finance...'):
-            # Set up custom headers to avoid rate limiting
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
+        # Concurrent identical requests share one in-flight download
+        df, from_cache = FETCH_SINGLE_FLIGHT.do(
+            _fetch_key("yahoo", ticker_symbol, start_date, end_date, interval),
+            _load_yahoo_bars, ticker_symbol, start_date, end_date, max_retries, retry_delay, interval
+        )
+    except DataFetchError as e:
+        NEGATIVE_CACHE.record(source, ticker_symbol, start_date, end_date, e)
+        raise
+    NEGATIVE_CACHE.clear(source, ticker_symbol)
+    # The result may be shared with concurrent callers; each gets its own copy
+    # so an in-place edit in one session cannot leak into another
+    return df.copy(), from_cache
+
+def _load_yahoo_bars(ticker_symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp, max_retries: int, retry_delay: int, interval: str = "1d") -> Tuple[pd.DataFrame, bool]:
+    """Cache-aware Yahoo Finance load behind load_yahoo_bars"""
+    source = cache_source("yahoo", interval)
+    # Work out which parts of the range still have to come from Yahoo Finance
+    gaps = plan_delta_fetch(source, ticker_symbol, start_date, end_date)
+    if not gaps:
+        cached_df = read_cached_ohlcv(source, ticker_symbol, start_date, end_date)
+        if cached_df is not None and len(cached_df) > 0:
+            return cached_df, True
+        gaps = [_normalize_cache_range(start_date, end_date)]
+    
+    held = bool(load_cache_coverage(source, ticker_symbol)['intervals'])
+    today = pd.Timestamp.now().normalize()
+    fetched = []
+    
+    # Only download the missing ranges and merge them into the stored series
+    for gap_start, gap_end in gaps:
+        try:
+            stock_data = fetch_yahoo_history(
+                ticker_symbol, gap_start, gap_end, max_retries, retry_delay, interval
+            )
+        except EmptyRangeError:
             stock_data = None
-            last_error = None
-            
-            # Try to fetch data with retries
-            for attempt in range(max_retries):
-                try:
-                    ticker = yf.Ticker(ticker_symbol)
-                    ticker.session.headers.update(headers)
-                    
-                    stock_data = ticker.history(
-                        start=start_date,
-                        end=end_date,
-                        interval="1d",
-                        auto_adjust=True
-                    )
-                    
-                    if not stock_data.empty:
-                        break
-                        
-                except Exception as e:
-                    last_error = str(e)
-                    st.warning(f"Attempt {attempt + 1}/{max_retries} failed. Retrying...")
-                    time.sleep(retry_delay * (attempt + 1))
-                    continue
-            
-            if stock_data is None or stock_data.empty:
-                if last_error:
-                    st.error(f"Failed to fetch data after {max_retries} attempts. Last error: {last_error}")
-                else:
-                    st.error(f"No data found for {ticker_symbol}. Please verify the ticker symbol and try again.")
-                return None
-            
-            # Standardize column names
-            stock_data.columns = stock_data.columns.str.lower()
-            
-            # Add ticker symbol as a column
-            stock_data['symbol'] = ticker_symbol
-            
-            st.success(f"Successfully fetched {len(stock_data)} days of data for {ticker_symbol}")
-            return stock_data
-            
-    except Exception as e:
-        st.error(f"Error fetching stock data: {str(e)}")
-        return None
+        
+        if stock_data is None or stock_data.empty:
+            # Yahoo Finance answered that the range has no bars. Only remember
+            # that for days that are over and sit next to held data (e.g. a
+            # market holiday); anything else is simply fetched again next time
+            if held and gap_end <= today:
+                write_cached_ohlcv(source, ticker_symbol, None, gap_start, gap_end)
+            continue
+        
+        # Standardize column names
+        stock_data.columns = stock_data.columns.str.lower()
+        fetched.append(to_cache_frame(stock_data))
+        held = True
+        write_cached_ohlcv(source, ticker_symbol, stock_data, gap_start, gap_end)
+    
+    # Read the requested range back from the merged series, or use the
+    # downloaded bars directly if the cache is unavailable
+    stock_data = read_cached_ohlcv(source, ticker_symbol, start_date, end_date)
+    if stock_data is None:
+        if not fetched:
+            raise EmptyRangeError(f"No data found for {ticker_symbol} in the specified date range.")
+        stock_data = pd.concat(fetched, ignore_index=True).set_index('date').sort_index()
+    
+    if stock_data.empty:
+        raise EmptyRangeError(f"No data found for {ticker_symbol} in the specified date range.")
+    
+    # Add ticker symbol as a column
+    stock_data['symbol'] = ticker_symbol
+    return stock_data, False
 
-def display_stock_data(df, title="Stock Data Overview"):
-    """Display stock data with interactive components"""
-    st.subheader(title)
+class YahooSession(requests.Session):
+    """
+    Session handed to yfinance that remembers how Yahoo Finance last answered
+    the chart request for each symbol.
     
-    # Display basic statistics
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("Latest Close", f"${df['close'].iloc[-1]:.2f}", 
-                 f"{((df['close'].iloc[-1] - df['close'].iloc[-2])/df['close'].iloc[-2]*100):.2f}%")
-    with col2:
-        st.metric("Highest Price", f"${df['high'].max():.2f}")
-    with col3:
-        st.metric("Lowest Price", f"${df['low'].min():.2f}")
+    yfinance reports a timeout, a rate limit and an unknown symbol with the
+    same "no data" errors; the recorded answer tells them apart.
+    """
     
-    # Create interactive price chart
-    fig = go.Figure()
-    fig.add_trace(go.Candlestick(
-        x=df.index if isinstance(df.index, pd.DatetimeIndex) else df['date'],
-        open=df['open'],
-        high=df['high'],
-        low=df['low'],
-        close=df['close'],
-        name='OHLC'
-    ))
-    fig.update_layout(
-        title='Stock Price Chart',
-        yaxis_title='Price',
-        template='plotly_dark',
-        xaxis_rangeslider_visible=False
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self._answers: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _chart_symbol(url: str) -> Optional[str]:
+        path = urlsplit(url).path
+        if '/finance/chart/' not in path:
+            return None
+        return unquote(path.rsplit('/', 1)[-1]).upper()
     
-    # Display the raw data with expandable details
-    with st.expander("View Raw Data"):
-        st.dataframe(df)
-        
-        # Display summary statistics
-        st.subheader("Summary Statistics")
-        st.dataframe(df.describe())
+    def request(self, method, url, *args, **kwargs):
+        symbol = self._chart_symbol(url)
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException as e:
+            self._record(symbol, f"{type(e).__name__}: {e}")
+            raise
+        self._record(symbol, response.status_code)
+        return response
+    
+    def _record(self, symbol: Optional[str], answer: Any) -> None:
+        if symbol is None:
+            return
+        with self._lock:
+            self._answers[symbol] = answer
+    
+    def answer(self, symbol: str) -> Any:
+        """The last HTTP status, or the transport error, seen for a symbol's chart request"""
+        with self._lock:
+            return self._answers.get(symbol.upper())
+    
+    def forget(self, symbols: Iterable[str]) -> None:
+        """Drop the recorded answers before the symbols are requested again"""
+        with self._lock:
+            for symbol in symbols:
+                self._answers.pop(symbol.upper(), None)
+        # yfinance keeps recent responses in memory; dropping them makes the
+        # next request reach Yahoo Finance, so a cached 429 is not replayed
+        yf.data.YfData.cache_get.cache_clear()
 
-def preprocess_stock_data(df):
-    """
-    Preprocess stock data by handling missing values and outliers.
-    Returns the preprocessed dataframe and a summary of changes made.
+YAHOO_SESSION = YahooSession()
+
+# yfinance messages for a known symbol without bars in the requested range
+YAHOO_EMPTY_RANGE_MESSAGES = ("No price data found", "Data doesn't exist")
+
+def classify_yahoo_error(ticker_symbol: str, error: Exception) -> DataFetchError:
     """
-    if df is None or df.empty:
-        return None, "No data to preprocess"
+    Map a yfinance error to the matching DataFetchError.
     
-    # Create a copy to avoid modifying original data
-    processed_df = df.copy()
-    summary = []
-    
-    # Store initial shape
-    initial_rows = len(processed_df)
+    Only a 404 from Yahoo Finance marks the symbol as unknown and only its
+    "no price data" answers mark the range as empty. Timeouts, rate limits,
+    server errors and anything unrecognised mean the provider is unavailable.
     
-    # Check and report missing values
-    missing_values = processed_df.isnull().sum()
-    if missing_values.sum() > 0:
-        summary.append("Missing values found:")
-        for column in missing_values[missing_values > 0].index:
-            summary.append(f"- {column}: {missing_values[column]} missing values")
-        
-        # Forward fill missing values (use previous day's values)
-        processed_df.fillna(method='ffill', inplace=True)
-        # Backward fill any remaining missing values at the start
-        processed_df.fillna(method='bfill', inplace=True)
+    Parameters:
+    -----------
+    ticker_symbol : str
+        The symbol that was requested
+    error : Exception
+        The exception raised by yfinance
         
-        summary.append("→ Filled missing values using forward and backward fill")
+    Returns:
+    --------
+    DataFetchError
+        The error to raise for the symbol
+    """
+    answer = YAHOO_SESSION.answer(ticker_symbol)
+    if isinstance(answer, str):
+        return ProviderUnavailableError(f"Yahoo Finance could not be reached for {ticker_symbol}: {answer}")
+    if answer is not None and (answer == 429 or answer >= 500):
+        return ProviderUnavailableError(f"Yahoo Finance answered HTTP {answer} for {ticker_symbol}")
+    if answer == 404:
+        return SymbolNotFoundError(f"No data found for {ticker_symbol}. Please verify the ticker symbol and try again.")
+    if not isinstance(error, requests.RequestException) and any(message in str(error) for message in YAHOO_EMPTY_RANGE_MESSAGES):
+        return EmptyRangeError(f"No data found for {ticker_symbol} in the specified date range.")
+    return ProviderUnavailableError(f"Yahoo Finance request for {ticker_symbol} failed: {error}")
+
+def fetch_yahoo_history(ticker_symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp, max_retries: int = 3, retry_delay: int = 2, interval: str = "1d") -> pd.DataFrame:
+    """
+    Download daily or intraday bars for one date range from Yahoo Finance with retries.
+    
+    Only provider failures are retried. Retries back off exponentially with
+    jitter and stop early once the Yahoo Finance circuit breaker has opened.
+    
+    Returns:
+    --------
+    pd.DataFrame
+        The downloaded bars
+        
+    Raises:
+    -------
+    SymbolNotFoundError
+        If Yahoo Finance does not know the symbol
+    EmptyRangeError
+        If Yahoo Finance has no bars for the symbol in the range
+    ProviderUnavailableError
+        If Yahoo Finance could not be reached on any attempt
+    """
+    for attempt in range(max(1, max_retries)):
+        YAHOO_SESSION.forget([ticker_symbol])
+        try:
+            ticker = yf.Ticker(ticker_symbol, session=YAHOO_SESSION)
+            return ticker.history(
+                start=start_date,
+                end=end_date,
+                interval=interval,
+                auto_adjust=True,
+                raise_errors=True
+            )
+        except Exception as e:
+            error = classify_yahoo_error(ticker_symbol, e)
+            if not isinstance(error, ProviderUnavailableError):
+                raise error from e
+            
+            logging.getLogger(__name__).warning(f"Yahoo Finance attempt {attempt + 1}/{max_retries} for {ticker_symbol} failed: {error}")
+            if attempt + 1 >= max_retries or PROVIDER_BREAKERS['yahoo'].state != 'closed':
+                raise ProviderUnavailableError(f"Failed to fetch data after {attempt + 1} attempts. Last error: {error}") from e
+        
+        time.sleep(retry_delay * (2 ** attempt) * random.uniform(0.5, 1.0))
+
+# Display names for the data providers
+PROVIDER_NAMES = {
+    'alpha_vantage': 'Alpha Vantage',
+    'yahoo': 'Yahoo Finance',
+    'local': 'Local Replay'
+}
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures of one data provider.
+    
+    After failure_threshold failures in a row the circuit opens and the
+    provider is skipped. Once reset_timeout seconds have passed a single
+    trial call is let through; its outcome closes or re-opens the circuit.
+    """
+    
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half-open'"""
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+    
+    def allow(self) -> bool:
+        """Return whether a call may be made now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+    
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+    
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+PROVIDER_BREAKERS = {provider: CircuitBreaker() for provider in PROVIDER_NAMES}
+
+def record_provider_outcome(provider: str, error: Optional[BaseException] = None) -> None:
+    """
+    Update a provider's circuit breaker after a call.
+    
+    Transport failures, rate limits and server errors count against the
+    provider; fetch_yahoo_history reports them for Yahoo Finance as
+    ProviderUnavailableError. An answer such as "no data for this symbol"
+    shows the provider is up and counts as success.
+    """
+    breaker = PROVIDER_BREAKERS[provider]
+    if error is None:
+        breaker.record_success()
+    elif isinstance(error, (ProviderUnavailableError, requests.RequestException)):
+        breaker.record_failure()
+    elif isinstance(error, DataFetchError):
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+
+def call_provider(provider: str, fn, *args, **kwargs):
+    """Call a provider function through its circuit breaker"""
+    if not PROVIDER_BREAKERS[provider].allow():
+        raise ProviderUnavailableError(f"{PROVIDER_NAMES[provider]} is temporarily unavailable; skipping it")
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        record_provider_outcome(provider, e)
+        raise
+    record_provider_outcome(provider)
+    return result
+
+# Watchlist fetch configuration
+WATCHLIST_MAX_WORKERS = 8   # Concurrent requests in flight for a watchlist
+
+def fetch_watchlist_data(ticker_symbols: Iterable[str], start_date: Any, end_date: Any, source: str = "yahoo", client: Optional[AlphaVantageClient] = None, max_workers: int = WATCHLIST_MAX_WORKERS) -> Tuple[pd.DataFrame, Dict[str, Dict[str, Any]]]:
+    """
+    Fetch daily bars for many symbols concurrently.
+    
+    Symbols already held in the local cache are served from it. The rest are
+    downloaded one request per symbol over a bounded thread pool, each
+    through the provider's circuit breaker, so a slow or failing symbol
+    never holds up the others.
+    
+    Parameters:
+    -----------
+    ticker_symbols : Iterable[str]
+        The stock ticker symbols to fetch
+    start_date, end_date : Any
+        Date range for data fetching
+    source : str
+        'yahoo' or 'alpha_vantage'
+    client : AlphaVantageClient, optional
+        The session's Alpha Vantage client, required for 'alpha_vantage'
+    max_workers : int
+        Maximum number of requests in flight
+        
+    Returns:
+    --------
+    Tuple[pd.DataFrame, Dict[str, Dict[str, Any]]]
+        Long panel indexed by (symbol, date), and per-symbol status with the
+        keys 'ok', 'source', 'rows' and 'error'
+    """
+    start_date, end_date = normalize_fetch_range(start_date, end_date)
+    symbols = list(dict.fromkeys(s.strip().upper() for s in ticker_symbols if s.strip()))
+    
+    frames = {}
+    status = {}
+    pending = []
+    
+    # Serve fully cached symbols and recently failed lookups straight away
+    for symbol in symbols:
+        try:
+            NEGATIVE_CACHE.check(source, symbol, start_date, end_date)
+        except DataFetchError as e:
+            status[symbol] = {'ok': False, 'source': 'cache', 'rows': 0, 'error': str(e)}
+            continue
+        
+        if not plan_delta_fetch(source, symbol, start_date, end_date):
+            cached_df = read_cached_ohlcv(source, symbol, start_date, end_date)
+            if cached_df is not None and len(cached_df) > 0:
+                frames[symbol] = cached_df
+                status[symbol] = {'ok': True, 'source': 'cache', 'rows': len(cached_df), 'error': None}
+                continue
+        pending.append(symbol)
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {}
+        for symbol in pending:
+            if source == "alpha_vantage":
+                future = executor.submit(call_provider, "alpha_vantage", load_alpha_vantage_bars, client, symbol, start_date, end_date)
+            else:
+                future = executor.submit(call_provider, "yahoo", load_yahoo_bars, symbol, start_date, end_date)
+            futures[future] = symbol
+        
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                df, from_cache = future.result()
+            except Exception as e:
+                status[symbol] = {'ok': False, 'source': 'network', 'rows': 0, 'error': str(e)}
+                continue
+            frames[symbol] = df
+            status[symbol] = {'ok': True, 'source': 'cache' if from_cache else 'network', 'rows': len(df), 'error': None}
+    
+    # Keep the status in the order the symbols were requested
+    status = {symbol: status[symbol] for symbol in symbols}
+    return build_panel(frames, symbols), status
+
+def build_panel(frames: Dict[str, pd.DataFrame], symbols: List[str]) -> pd.DataFrame:
+    """Stack per-symbol bars into a long panel indexed by (symbol, date)"""
+    if not frames:
+        return pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume'],
+                            index=pd.MultiIndex.from_arrays([[], []], names=['symbol', 'date']))
+    return pd.concat(
+        {symbol: frames[symbol].drop(columns=['symbol'], errors='ignore') for symbol in symbols if symbol in frames},
+        names=['symbol', 'date']
+    )
+
+# Memory-mapped history store configuration
+HISTORY_STORE_DIR = os.environ.get(
+    "STOCKSAGE_HISTORY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "history")
+)
+HISTORY_STORE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+class ColumnarHistoryStore:
+    """
+    Daily bars for many symbols in one memory-mapped Arrow IPC file.
+    
+    Rows are sorted by symbol, then date, and the file's schema metadata maps
+    each symbol to its (offset, length) row range. Loads are served as
+    zero-copy slices of the mapping, so every session and worker process
+    reading the store shares the same pages through the OS page cache
+    instead of holding private copies. Writes rebuild the file under a
+    temporary name and swap it in atomically; readers notice the new file
+    on their next load and keep using the old mapping until then.
+    
+    Parameters:
+    -----------
+    directory : str
+        Folder holding the store
+    """
+    
+    def __init__(self, directory: str = HISTORY_STORE_DIR):
+        self.directory = directory
+        self.path = os.path.join(directory, "bars.arrow")
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._table = None
+        self._dates = np.array([], dtype='datetime64[ns]')
+        self._index: Dict[str, Tuple[int, int]] = {}
+    
+    def _refresh(self) -> None:
+        """Map the current store file if it changed since it was last opened"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._stamp, self._table, self._index = None, None, {}
+            return
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        
+        # Reading a memory-mapped IPC file maps its buffers rather than copying them
+        table = pa.ipc.open_file(pa.memory_map(self.path, 'r')).read_all()
+        self._table = table
+        self._dates = table.column('date').chunk(0).to_numpy() if table.num_rows else self._dates[:0]
+        self._index = {symbol: tuple(span) for symbol, span in json.loads(table.schema.metadata[b'symbol_index']).items()}
+        self._stamp = stamp
+    
+    @property
+    def symbols(self) -> List[str]:
+        """Symbols held in the store, in sorted order"""
+        with self._lock:
+            self._refresh()
+            return list(self._index)
+    
+    def load(self, symbol: str, start_date: Any = None, end_date: Any = None) -> Optional[pd.DataFrame]:
+        """
+        Return a symbol's bars for [start_date, end_date) without copying them.
+        
+        The price columns are read-only views of the mapped file; callers that
+        modify values in place must copy first.
+        
+        Returns:
+        --------
+        Optional[pd.DataFrame]
+            Bars indexed by date, or None if the symbol is not in the store
+        """
+        with self._lock:
+            self._refresh()
+            if symbol not in self._index:
+                return None
+            table, dates = self._table, self._dates
+            offset, length = self._index[symbol]
+        
+        # Dates are sorted within each symbol, so the range is found by binary search
+        symbol_dates = dates[offset:offset + length]
+        lo = 0 if start_date is None else int(np.searchsorted(symbol_dates, np.datetime64(pd.Timestamp(start_date), 'ns')))
+        hi = length if end_date is None else int(np.searchsorted(symbol_dates, np.datetime64(pd.Timestamp(end_date), 'ns')))
+        
+        df = table.slice(offset + lo, max(hi - lo, 0)).select(HISTORY_STORE_COLUMNS).to_pandas(split_blocks=True)
+        df.index = pd.DatetimeIndex(symbol_dates[lo:hi], name='date')
+        df['symbol'] = symbol
+        return df
+    
+    def write(self, frames: Any) -> None:
+        """
+        Add or replace the bars of some symbols, keeping every other symbol.
+        
+        Parameters:
+        -----------
+        frames : Dict[str, pd.DataFrame] or pd.DataFrame
+            Bars per symbol, or a (symbol, date) panel as returned by
+            fetch_watchlist_data
+        """
+        if isinstance(frames, pd.DataFrame):
+            frames = {symbol: group.droplevel('symbol') for symbol, group in frames.groupby(level='symbol', sort=False)}
+        
+        pieces = {}
+        for symbol, df in frames.items():
+            bars = to_cache_frame(df).sort_values('date')
+            bars = bars.drop_duplicates(subset='date', keep='last')
+            pieces[symbol] = pa.table({
+                'date': pa.array(bars['date'].to_numpy(dtype='datetime64[ns]')),
+                **{col: pa.array(bars[col].to_numpy(dtype=np.float64)) for col in HISTORY_STORE_COLUMNS}
+            })
+        
+        with self._lock:
+            self._refresh()
+            # Untouched symbols are carried over as slices of the current mapping
+            for symbol, (offset, length) in self._index.items():
+                if symbol not in pieces:
+                    pieces[symbol] = self._table.slice(offset, length)
+            
+            index = {}
+            row = 0
+            for symbol in sorted(pieces):
+                index[symbol] = [row, pieces[symbol].num_rows]
+                row += pieces[symbol].num_rows
+            
+            table = pa.concat_tables([pieces[symbol] for symbol in sorted(pieces)]).combine_chunks()
+            table = table.replace_schema_metadata({'symbol_index': json.dumps(index)})
+            
+            # Write to a temporary file first so readers never see a partial file
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, self.path)
+            self._refresh()
+    
+    def import_cache(self, source: str) -> int:
+        """Load every symbol held in the local OHLCV cache for a source; returns the symbol count"""
+        frames = {}
+        source_dir = os.path.join(OHLCV_CACHE_DIR, source)
+        for entry in sorted(os.listdir(source_dir)) if os.path.isdir(source_dir) else []:
+            path = os.path.join(source_dir, entry, "bars.parquet")
+            if entry.startswith("symbol=") and os.path.exists(path):
+                symbol = entry[len("symbol="):]
+                with _ohlcv_cache_lock(source, symbol):
+                    frames[symbol] = pd.read_parquet(path, engine="pyarrow").set_index('date')
+        if frames:
+            self.write(frames)
+        return len(frames)
+
+_history_stores: Dict[str, ColumnarHistoryStore] = {}
+_history_stores_lock = threading.Lock()
+
+def get_history_store(directory: str = HISTORY_STORE_DIR) -> ColumnarHistoryStore:
+    """Return the process-wide store for a directory, shared by every session"""
+    with _history_stores_lock:
+        if directory not in _history_stores:
+            _history_stores[directory] = ColumnarHistoryStore(directory)
+        return _history_stores[directory]
+
+# Asyncio data-source layer
+HEDGE_DELAY = 2.0               # Seconds to wait on one provider before also asking the next
+PROVIDER_EXECUTOR_WORKERS = 8   # Worker threads per blocking provider
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+_async_loop_lock = threading.Lock()
+_provider_executors: Dict[str, ThreadPoolExecutor] = {}
+_provider_executors_lock = threading.Lock()
+
+def get_async_loop() -> asyncio.AbstractEventLoop:
+    """Return the process-wide event loop that runs provider coroutines"""
+    global _async_loop
+    with _async_loop_lock:
+        if _async_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="data-source-loop", daemon=True).start()
+            _async_loop = loop
+        return _async_loop
+
+def run_async(coro, timeout: Optional[float] = None):
+    """Run a coroutine on the data-source loop and block until it finishes"""
+    return asyncio.run_coroutine_threadsafe(coro, get_async_loop()).result(timeout)
+
+def get_provider_executor(name: str) -> ThreadPoolExecutor:
+    """
+    Return the process-wide worker pool for a blocking provider.
+    
+    Each provider gets its own bounded pool, so calls blocked on one
+    provider (e.g. Alpha Vantage requests waiting for quota) queue there
+    instead of occupying the loop's default executor.
+    """
+    with _provider_executors_lock:
+        if name not in _provider_executors:
+            _provider_executors[name] = ThreadPoolExecutor(
+                max_workers=PROVIDER_EXECUTOR_WORKERS, thread_name_prefix=f"provider-{name}"
+            )
+        return _provider_executors[name]
+
+class AsyncDataProvider(abc.ABC):
+    """
+    Base class for asyncio data sources.
+    
+    Subclasses implement _load(); load() adds the provider's circuit breaker
+    around it.
+    """
     
-    # Handle outliers using Z-score method
-    numeric_columns = ['open', 'high', 'low', 'close', 'volume']
-    outliers_summary = {}
+    name = ""
     
-    for column in numeric_columns:
-        # Calculate Z-scores
-        z_scores = np.abs(stats.zscore(processed_df[column]))
-        # Identify outliers (|z| > 3)
-        outliers = z_scores > 3
-        outliers_count = outliers.sum()
+    async def load(self, symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> Tuple[pd.DataFrame, bool]:
+        """
+        Load daily bars for [start_date, end_date).
         
-        if outliers_count > 0:
-            outliers_summary[column] = outliers_count
-            # Replace outliers with column mean
-            column_mean = processed_df[column][~outliers].mean()
-            processed_df.loc[outliers, column] = column_mean
+        Returns:
+        --------
+        Tuple[pd.DataFrame, bool]
+            The bars and whether they came entirely from the local cache
+        """
+        if not PROVIDER_BREAKERS[self.name].allow():
+            raise ProviderUnavailableError(f"{PROVIDER_NAMES[self.name]} is temporarily unavailable; skipping it")
+        try:
+            result = await self._load(symbol, start_date, end_date)
+        except Exception as e:
+            record_provider_outcome(self.name, e)
+            raise
+        record_provider_outcome(self.name)
+        return result
+    
+    @abc.abstractmethod
+    async def _load(self, symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> Tuple[pd.DataFrame, bool]:
+        """Load the bars without the circuit breaker"""
+    
+    async def run_blocking(self, fn, *args):
+        """Run a blocking call in this provider's worker pool, keeping the caller's context"""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            get_provider_executor(self.name), functools.partial(context.run, fn, *args)
+        )
+
+class AlphaVantageProvider(AsyncDataProvider):
+    """Alpha Vantage through a session's client; the blocking request runs in the provider's worker pool"""
+    
+    name = "alpha_vantage"
+    
+    def __init__(self, client: AlphaVantageClient, interval: str = "1d"):
+        self.client = client
+        self.interval = interval
+    
+    async def _load(self, symbol, start_date, end_date):
+        return await self.run_blocking(load_alpha_vantage_bars, self.client, symbol, start_date, end_date, self.interval)
+
+class YahooProvider(AsyncDataProvider):
+    """Yahoo Finance; yfinance is blocking, so each download runs in the provider's worker pool"""
+    
+    name = "yahoo"
+    
+    def __init__(self, max_retries: int = 3, retry_delay: int = 2, interval: str = "1d"):
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.interval = interval
+    
+    async def _load(self, symbol, start_date, end_date):
+        return await self.run_blocking(load_yahoo_bars, symbol, start_date, end_date, self.max_retries, self.retry_delay, self.interval)
+
+class LocalReplayProvider(AsyncDataProvider):
+    """
+    Offline stand-in that replays recorded Alpha Vantage payloads.
+    
+    Payloads are read from <directory>/<SYMBOL>.json, as written by an
+    AlphaVantageClient with a record_dir. Latency and failures are simulated
+    with asyncio.sleep and a seeded random generator, so thousands of
+    concurrent fetches run on one event loop without any network access.
+    
+    Parameters:
+    -----------
+    directory : str
+        Folder holding the recorded payloads
+    latency : float
+        Base response time in seconds
+    jitter : float
+        Extra uniformly distributed response time in seconds
+    error_rate : float
+        Probability that a call fails with a provider error
+    seed : int, optional
+        Seed for reproducible latency and failures
+    """
+    
+    name = "local"
+    
+    def __init__(self, directory: str, latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.directory = directory
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._payloads: Dict[str, Optional[Dict[str, Any]]] = {}
+    
+    def payload(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Return the recorded payload for a symbol, or None if none was recorded"""
+        if symbol not in self._payloads:
+            try:
+                with open(os.path.join(self.directory, f"{symbol}.json"), "r") as f:
+                    self._payloads[symbol] = json.load(f)
+            except OSError:
+                self._payloads[symbol] = None
+        return self._payloads[symbol]
+    
+    async def _load(self, symbol, start_date, end_date):
+        await asyncio.sleep(self.latency + self._rng.uniform(0, self.jitter))
+        if self._rng.random() < self.error_rate:
+            raise ProviderUnavailableError(f"Simulated failure for {symbol}")
+        
+        data = self.payload(symbol)
+        if data is None or "Time Series (Daily)" not in data:
+            raise SymbolNotFoundError(f"No recorded data for {symbol}")
+        
+        df = parse_alpha_vantage_series(data["Time Series (Daily)"], start_date, end_date)
+        if df.empty:
+            raise EmptyRangeError(f"No data available for {symbol} in the specified date range.")
+        df['symbol'] = symbol
+        return df, False
+
+class LocalReplayServer:
+    """
+    Minimal HTTP stand-in for the Alpha Vantage endpoint.
+    
+    Serves the payloads of a LocalReplayProvider at /query on localhost, so
+    an AlphaVantageClient created with base_url=server.url exercises the real
+    request, pacing and parsing path offline. Simulated failures are answered
+    with HTTP 503.
+    """
+    
+    def __init__(self, provider: LocalReplayProvider, host: str = "127.0.0.1", port: int = 0):
+        self.provider = provider
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+    
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/query"
+    
+    def start(self) -> str:
+        """Start serving on the data-source loop and return the endpoint URL"""
+        self._server = run_async(asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.url
+    
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            run_async(self._server.wait_closed())
+            self._server = None
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            # Keep-alive: answer requests on this connection until the client closes it
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                
+                target = request_line.decode("latin-1").split(" ")[1]
+                query = parse_qs(urlsplit(target).query)
+                status, body = await self._respond(query.get("symbol", [""])[0].upper())
+                
+                payload = json.dumps(body).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\nConnection: keep-alive\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (ConnectionError, IndexError):
+            pass
+        finally:
+            writer.close()
+    
+    async def _respond(self, symbol: str) -> Tuple[str, Dict[str, Any]]:
+        provider = self.provider
+        await asyncio.sleep(provider.latency + provider._rng.uniform(0, provider.jitter))
+        if provider._rng.random() < provider.error_rate:
+            return "503 Service Unavailable", {}
+        data = provider.payload(symbol)
+        if data is None:
+            return "200 OK", {"Error Message": f"Invalid API call. No recorded data for {symbol}."}
+        return "200 OK", data
+
+async def hedged_fetch_async(providers: List[AsyncDataProvider], symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp, delay: float = HEDGE_DELAY) -> Tuple[pd.DataFrame, bool, str]:
+    """
+    Fetch from several providers, keeping whichever answers first.
+    
+    The first provider is started immediately. If it has not answered within
+    `delay` seconds, or fails, the next one is started as well. Providers
+    whose circuit is open are skipped. Calls that lose the race keep running
+    on the loop and still fill the local cache, but an Alpha Vantage request
+    still waiting for its quota token is dropped and the token returned.
+    
+    Returns:
+    --------
+    Tuple[pd.DataFrame, bool, str]
+        The bars, whether they came from the cache, and the provider that answered
+        
+    Raises:
+    -------
+    DataFetchError
+        If every provider failed or was skipped
+    """
+    remaining = []
+    errors = {}
+    for provider in providers:
+        if PROVIDER_BREAKERS[provider.name].state == 'open':
+            errors[provider.name] = "temporarily unavailable"
+        else:
+            remaining.append(provider)
+    if not remaining:
+        raise DataFetchError("All data providers are temporarily unavailable. Please try again shortly.")
+    
+    pending = {}
+    # Tasks copy the current context, so every provider call sees this event
+    abandoned = threading.Event()
+    context_token = HEDGE_ABANDONED.set(abandoned)
+    
+    def start_next():
+        provider = remaining.pop(0)
+        task = asyncio.ensure_future(provider.load(symbol, start_date, end_date))
+        # Losing tasks finish unobserved; retrieve their errors so none are logged as lost
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        pending[task] = provider.name
+    
+    try:
+        start_next()
+        while pending:
+            done, _ = await asyncio.wait(list(pending), timeout=delay if remaining else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Latency budget exceeded: hedge to the next provider
+                start_next()
+                continue
+            
+            for task in done:
+                name = pending.pop(task)
+                try:
+                    df, from_cache = task.result()
+                    return df, from_cache, name
+                except Exception as e:
+                    errors[name] = str(e)
+            
+            if not pending and remaining:
+                start_next()
+    finally:
+        # Whatever is still running has lost the race
+        abandoned.set()
+        HEDGE_ABANDONED.reset(context_token)
+    
+    raise DataFetchError("; ".join(f"{PROVIDER_NAMES[name]}: {error}" for name, error in errors.items()))
+
+async def fetch_symbols_async(provider: AsyncDataProvider, ticker_symbols: Iterable[str], start_date: pd.Timestamp, end_date: pd.Timestamp, max_concurrency: int = 1000) -> Tuple[pd.DataFrame, Dict[str, Dict[str, Any]]]:
+    """
+    Fetch many symbols from one provider concurrently on the event loop.
+    
+    Returns the same (symbol, date) panel and per-symbol status as
+    fetch_watchlist_data.
+    """
+    symbols = list(dict.fromkeys(s.strip().upper() for s in ticker_symbols if s.strip()))
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def load(symbol):
+        async with semaphore:
+            return await provider.load(symbol, start_date, end_date)
+    
+    results = await asyncio.gather(*(load(symbol) for symbol in symbols), return_exceptions=True)
+    
+    frames = {}
+    status = {}
+    for symbol, outcome in zip(symbols, results):
+        if isinstance(outcome, Exception):
+            status[symbol] = {'ok': False, 'source': 'network', 'rows': 0, 'error': str(outcome)}
+        else:
+            df, from_cache = outcome
+            frames[symbol] = df
+            status[symbol] = {'ok': True, 'source': 'cache' if from_cache else 'network', 'rows': len(df), 'error': None}
+    return build_panel(frames, symbols), status
+
+def fetch_stock_data(ticker_symbol: str, start_date: Any, end_date: Any, client: Optional[AlphaVantageClient] = None, max_retries: int = 3, retry_delay: int = 2, providers: Optional[List[AsyncDataProvider]] = None, interval: str = "1d") -> Optional[pd.DataFrame]:
+    """
+    Fetch stock data with hedging between different data sources
+    
+    Thin synchronous wrapper over hedged_fetch_async. Alpha Vantage is only
+    tried when the calling session passes its client; Yahoo Finance is started
+    as well if it has not answered within HEDGE_DELAY seconds, and whichever
+    returns first is used. Pass `providers` to use other sources, such as a
+    LocalReplayProvider for offline testing, and `interval` (one of
+    INTRADAY_INTERVALS) for intraday bars.
+    """
+    start_date, end_date = normalize_fetch_range(start_date, end_date)
+        
+    # Validate ticker symbol
+    ticker_symbol = ticker_symbol.strip().upper()
+    
+    if providers is None:
+        providers = []
+        if client is not None:
+            providers.append(AlphaVantageProvider(client, interval))
+        providers.append(YahooProvider(max_retries, retry_delay, interval))
+    
+    try:
+        with st.spinner(f'Fetching data for {ticker_symbol}...'):
+            df, from_cache, provider = run_async(
+                hedged_fetch_async(providers, ticker_symbol, start_date, end_date)
+            )
+            
+        bars = "days" if interval == "1d" else f"{interval} bars"
+        if from_cache:
+            st.success(f"Loaded {len(df)} {bars} of data for {ticker_symbol} from local cache")
+        else:
+            st.success(f"Successfully fetched {len(df)} {bars} of data for {ticker_symbol} from {PROVIDER_NAMES[provider]}")
+        return df
+            
+    except DataFetchError as e:
+        st.error(str(e))
+        return None
+    except Exception as e:
+        st.error(f"Error fetching stock data: {str(e)}")
+        return None
+
+# Bar aggregation
+def _bucket_bounds(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end positions of each run of equal, sorted bucket keys"""
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    return starts, ends
+
+def _bucket_keys(index: pd.DatetimeIndex, rule: str) -> pd.DatetimeIndex:
+    """Label every timestamp with the start of its bar"""
+    # Calendar rules such as 'W' or 'M' have no fixed length (and pandas
+    # warns about 'M' before refusing to floor by it)
+    if rule.lstrip('0123456789') in ('W', 'M', 'Q', 'Y'):
+        return index.to_period(rule).to_timestamp()
+    try:
+        return index.floor(rule)
+    except ValueError:
+        return index.to_period(rule).to_timestamp()
+
+def aggregate_trades(trades: pd.DataFrame, rule: str = "1min", price_col: str = "price", size_col: str = "size") -> pd.DataFrame:
+    """
+    Build OHLCV bars from individual trades.
+    
+    Trades are bucketed by flooring their timestamps, and every bar is
+    computed with one NumPy reduction over the whole array, so the cost is a
+    sort at most plus a few passes regardless of the number of bars.
+    
+    Parameters:
+    -----------
+    trades : pd.DataFrame
+        Trades indexed by timestamp, with price and size columns
+    rule : str
+        Bar length as a pandas frequency, e.g. '1min', '5min' or '1h'
+    price_col, size_col : str
+        Names of the trade price and size columns
+        
+    Returns:
+    --------
+    pd.DataFrame
+        OHLCV bars indexed by bar start; intervals without trades are omitted
+    """
+    index = pd.DatetimeIndex(trades.index)
+    prices = trades[price_col].to_numpy(dtype=np.float64)
+    sizes = trades[size_col].to_numpy(dtype=np.float64)
+    if not index.is_monotonic_increasing:
+        order = np.argsort(index.asi8, kind='stable')
+        index, prices, sizes = index[order], prices[order], sizes[order]
+    
+    keys = _bucket_keys(index, rule)
+    if len(keys) == 0:
+        return pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume'], index=keys.rename('date'))
+    starts, ends = _bucket_bounds(keys.asi8)
+    
+    return pd.DataFrame({
+        'open': prices[starts],
+        'high': np.maximum.reduceat(prices, starts),
+        'low': np.minimum.reduceat(prices, starts),
+        'close': prices[ends - 1],
+        'volume': np.add.reduceat(sizes, starts)
+    }, index=keys[starts].rename('date'))
+
+def _roll_up_bars(bars: pd.DataFrame, starts: np.ndarray, ends: np.ndarray) -> Dict[str, np.ndarray]:
+    """OHLCV arrays of the coarser bars spanning bars[starts[i]:ends[i]]"""
+    return {
+        'open': bars['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(bars['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(bars['low'].to_numpy(), starts),
+        'close': bars['close'].to_numpy()[ends - 1],
+        'volume': np.add.reduceat(bars['volume'].to_numpy(), starts)
+    }
+
+def resample_bars(bars: pd.DataFrame, rule: str) -> pd.DataFrame:
+    """
+    Roll bars up to a coarser timeframe, e.g. 1-minute bars to '15min', '1h' or '1D'.
+    
+    Opens and closes are the first and last of each bucket, highs and lows its
+    extremes and volume its sum, computed with the same NumPy reductions as
+    aggregate_trades. Any 'symbol' column is carried over.
+    
+    Parameters:
+    -----------
+    bars : pd.DataFrame
+        OHLCV bars indexed by timestamp in ascending order
+    rule : str
+        Target bar length as a pandas frequency
+        
+    Returns:
+    --------
+    pd.DataFrame
+        The coarser bars, indexed by bar start
+    """
+    index = pd.DatetimeIndex(bars.index)
+    keys = _bucket_keys(index, rule)
+    if len(keys) == 0:
+        return bars.iloc[:0]
+    starts, ends = _bucket_bounds(keys.asi8)
+    
+    resampled = pd.DataFrame(_roll_up_bars(bars, starts, ends), index=keys[starts].rename(index.name or 'date'))
+    if 'symbol' in bars.columns:
+        resampled['symbol'] = bars['symbol'].to_numpy()[starts]
+    return resampled
+
+def bar_step(index: pd.Index) -> pd.Timedelta:
+    """Typical spacing of a series' bars; one day for daily or undated data"""
+    if isinstance(index, pd.DatetimeIndex) and len(index) > 1:
+        step = pd.Timedelta(np.median(np.diff(index.asi8)))
+        if step < pd.Timedelta(days=1):
+            return step
+    return pd.Timedelta(days=1)
+
+def future_bar_index(index: pd.Index, periods: int) -> pd.DatetimeIndex:
+    """Timestamps of the next `periods` bars after the end of a series"""
+    step = bar_step(index)
+    return pd.date_range(start=pd.Timestamp(index[-1]) + step, periods=periods, freq=step)
+
+def display_stock_data(df, title="Stock Data Overview"):
+    """Display stock data with interactive components"""
+    st.subheader(title)
+    
+    # Display basic statistics
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Latest Close", f"${df['close'].iloc[-1]:.2f}", 
+                 f"{((df['close'].iloc[-1] - df['close'].iloc[-2])/df['close'].iloc[-2]*100):.2f}%")
+    with col2:
+        st.metric("Highest Price", f"${df['high'].max():.2f}")
+    with col3:
+        st.metric("Lowest Price", f"${df['low'].min():.2f}")
+    
+    # Create interactive price chart
+    fig = go.Figure()
+    fig.add_trace(go.Candlestick(
+        x=df.index if isinstance(df.index, pd.DatetimeIndex) else df['date'],
+        open=df['open'],
+        high=df['high'],
+        low=df['low'],
+        close=df['close'],
+        name='OHLC'
+    ))
+    fig.update_layout(
+        title='Stock Price Chart',
+        yaxis_title='Price',
+        template='plotly_dark',
+        xaxis_rangeslider_visible=False
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Display the raw data with expandable details
+    with st.expander("View Raw Data"):
+        st.dataframe(df)
+        
+        # Display summary statistics
+        st.subheader("Summary Statistics")
+        st.dataframe(df.describe())
+
+# Outlier handling configuration
+OUTLIER_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+OUTLIER_METHODS = {
+    'zscore': "Z-score against the column mean",
+    'rolling': "Z-score against a trailing rolling window",
+    'mad': "Robust z-score against the median (MAD)",
+    'expanding': "Z-score against all bars up to each one (incremental)"
+}
+OUTLIER_REPLACEMENTS = {
+    'zscore': "mean",
+    'rolling': "rolling mean",
+    'mad': "median",
+    'expanding': "running mean"
+}
+MAD_SCALE = 0.6744897501960817   # Makes the MAD of normal data comparable to its std
+
+def fill_missing_2d(values: np.ndarray) -> np.ndarray:
+    """
+    Forward fill, then backward fill, the NaNs of every column of a 2-D array, in place.
+    
+    For each column holding NaNs, the position of the nearest valid value is
+    found with a running maximum over row positions and gathered from, so the
+    fill is a handful of vectorized passes rather than a Python loop over rows.
+    """
+    missing = np.isnan(values)
+    rows = np.arange(len(values))
+    for j in np.flatnonzero(missing.any(axis=0)):
+        column_missing = missing[:, j]
+        # Forward fill: index of the last valid row at or before each row
+        last_valid = np.where(column_missing, 0, rows)
+        np.maximum.accumulate(last_valid, out=last_valid)
+        filled = values[last_valid, j]
+        
+        # Backward fill the leading NaNs from the first valid row
+        leading = np.isnan(filled)
+        if leading.any() and not leading.all():
+            filled[leading] = filled[np.argmin(leading)]
+        values[:, j] = filled
+    return values
+
+def expanding_outliers(values: np.ndarray, count: np.ndarray, mean: np.ndarray, m2: np.ndarray, threshold: float = 3.0, min_periods: int = 20) -> Tuple[np.ndarray, np.ndarray, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Flag outliers against the mean and variance of every row up to and including each row.
+    
+    The running statistics continue from a Welford state (count, mean and
+    sum of squared deviations m2) and are merged with the new rows in one
+    vectorized step: deviations from the previous mean are accumulated with
+    cumsum, which keeps the sums small and numerically stable. A row's
+    z-score therefore never changes once computed, so processing rows in
+    batches gives the same result as processing them all at once.
+    
+    Parameters:
+    -----------
+    values : np.ndarray
+        New (rows, columns) values without NaNs
+    count, mean, m2 : np.ndarray
+        Per-column Welford state of all earlier rows
+    threshold : float
+        Absolute z-score above which a value is an outlier
+    min_periods : int
+        Rows needed before any value is judged
+        
+    Returns:
+    --------
+    Tuple[np.ndarray, np.ndarray, Tuple[np.ndarray, np.ndarray, np.ndarray]]
+        Outlier mask, the running mean to replace outliers with, and the
+        Welford state after the new rows
+    """
+    if len(values) == 0:
+        return np.zeros(values.shape, dtype=bool), values.copy(), (count, mean, m2)
     
+    shift = np.where(count > 0, mean, values[0])
+    counts = count + np.arange(1, len(values) + 1)[:, None]
+    sums = np.cumsum(values - shift, axis=0)
+    squares = np.cumsum(np.square(values - shift), axis=0)
+    
+    running_mean = shift + sums / counts
+    running_m2 = m2 + squares - sums * sums / counts
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deviation = values - running_mean
+        mask = (deviation * deviation > threshold * threshold * running_m2 / counts) & (counts >= min_periods)
+    return mask, running_mean, (counts[-1].copy(), running_mean[-1].copy(), running_m2[-1].copy())
+
+def detect_outliers(values: np.ndarray, method: str = 'zscore', threshold: float = 3.0, window: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Flag outliers in every column of a 2-D array at once.
+    
+    Column-major (Fortran-ordered) input keeps every column reduction
+    contiguous in memory, which is several times faster than row-major.
+    
+    Parameters:
+    -----------
+    values : np.ndarray
+        (rows, columns) array without NaNs
+    method : str
+        'zscore' compares each value with its column's mean and standard
+        deviation, 'rolling' with those of the trailing `window` rows, and
+        'mad' with the column median and median absolute deviation, and
+        'expanding' with the mean and standard deviation of all rows so far
+    threshold : float
+        Absolute (robust) z-score above which a value is an outlier
+    window : int
+        Trailing window length for the 'rolling' method, and the rows needed
+        before 'expanding' judges any value
+        
+    Returns:
+    --------
+    Tuple[np.ndarray, np.ndarray]
+        Boolean outlier mask shaped like `values`, and the replacement for
+        each cell (a single row for the per-column methods)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if method == 'zscore':
+            # Squared deviations are compared with threshold**2 * variance, saving a sqrt and an abs pass
+            center = values.mean(axis=0)
+            squared = values - center
+            np.square(squared, out=squared)
+            mask = squared > threshold * threshold * squared.mean(axis=0)
+            # Replace with the mean of the remaining values, as before
+            count = len(values) - np.count_nonzero(mask, axis=0)
+            replacement = (center * len(values) - values.sum(axis=0, where=mask)) / count
+            return mask, replacement[None, :]
+        
+        if method == 'mad':
+            center = np.median(values, axis=0)
+            deviation = np.abs(values - center)
+            mad = np.median(deviation, axis=0)
+            mask = MAD_SCALE * deviation > threshold * mad
+            return mask, center[None, :]
+        
+        if method == 'rolling':
+            # Trailing sums from cumulative sums; the first rows use the expanding window.
+            # Values are shifted by their first row so the running sums stay small.
+            n = len(values)
+            counts = np.minimum(np.arange(1, n + 1), window)[:, None]
+            shifted = values - values[:1]
+            sums = np.cumsum(shifted, axis=0)
+            squares = np.cumsum(np.square(shifted, out=shifted), axis=0)
+            sums[window:] = sums[window:] - sums[:-window]
+            squares[window:] = squares[window:] - squares[:-window]
+            sums /= counts
+            squares /= counts
+            variance = np.maximum(squares - sums * sums, 0, out=squares)
+            sums += values[:1]
+            deviation = values - sums
+            mask = deviation * deviation > threshold * threshold * variance
+            return mask, sums
+        
+        if method == 'expanding':
+            zeros = np.zeros(values.shape[1])
+            mask, running_mean, _ = expanding_outliers(values, np.zeros(values.shape[1], dtype=np.int64), zeros, zeros, threshold, window)
+            return mask, running_mean
+    
+    raise ValueError(f"Unknown outlier method: {method}")
+
+def describe_array(values: np.ndarray, columns: List[str]) -> pd.DataFrame:
+    """Same table as DataFrame.describe() for a NaN-free 2-D float array"""
+    quartiles = np.quantile(values, [0.25, 0.5, 0.75], axis=0) if len(values) else np.full((3, len(columns)), np.nan)
+    return pd.DataFrame(
+        np.vstack([
+            np.full(len(columns), float(len(values))),
+            values.mean(axis=0),
+            values.std(axis=0, ddof=1) if len(values) > 1 else np.full(len(columns), np.nan),
+            values.min(axis=0),
+            quartiles,
+            values.max(axis=0)
+        ]),
+        index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'],
+        columns=columns
+    )
+
+def _store_columns(df: pd.DataFrame, columns: List[str], values: np.ndarray, changed: np.ndarray) -> None:
+    """Write array columns back into a frame, keeping compact dtypes unless a filled or replaced value needs floats"""
+    for i, column in enumerate(columns):
+        dtype = df[column].dtype
+        if dtype.kind == 'f' or (dtype.kind in 'iu' and not changed[i]):
+            df[column] = values[:, i].astype(dtype, copy=False)
+        else:
+            df[column] = values[:, i]
+
+def _outliers_summary(columns: List[str], outlier_counts: np.ndarray, method: str) -> List[str]:
+    """Summary lines for the outliers replaced in each column"""
+    lines = []
+    outliers_summary = {column: int(count) for column, count in zip(columns, outlier_counts) if count > 0}
     if outliers_summary:
-        summary.append("\nOutliers detected and handled:")
+        lines.append("\nOutliers detected and handled:")
         for column, count in outliers_summary.items():
-            summary.append(f"- {column}: {count} outliers replaced with mean")
+            lines.append(f"- {column}: {count} outliers replaced with {OUTLIER_REPLACEMENTS[method]}")
+    return lines
+
+def preprocess_stock_data(df, method: str = 'zscore', threshold: float = 3.0, window: int = 20):
+    """
+    Preprocess stock data by handling missing values and outliers.
+    Returns the preprocessed dataframe and a summary of changes made.
+    
+    Fills, z-scores and replacements for all OHLCV columns are computed
+    together on one 2-D array (see fill_missing_2d and detect_outliers);
+    `method` picks the outlier test from OUTLIER_METHODS.
+    """
+    if df is None or df.empty:
+        return None, "No data to preprocess", None
     
-    # Calculate basic statistics for the processed data
-    stats_summary = processed_df.describe()
+    # A shallow copy is enough: every modified column is replaced, not written in place
+    processed_df = df.copy(deep=False)
+    summary = []
+    
+    columns = [column for column in OUTLIER_COLUMNS if column in processed_df.columns]
+    other_columns = [column for column in processed_df.columns if column not in columns]
+    # Column-major, so each column's reductions stream through contiguous memory
+    values = np.empty((len(processed_df), len(columns)), dtype=np.float64, order='F')
+    for i, column in enumerate(columns):
+        values[:, i] = processed_df[column].to_numpy()
+    
+    # Check and report missing values
+    missing_values = pd.Series(np.count_nonzero(np.isnan(values), axis=0), index=columns)
+    if other_columns:
+        missing_values = pd.concat([missing_values, processed_df[other_columns].isnull().sum()])[processed_df.columns]
+    if missing_values.sum() > 0:
+        summary.append("Missing values found:")
+        for column in missing_values[missing_values > 0].index:
+            summary.append(f"- {column}: {missing_values[column]} missing values")
+        
+        # Forward fill missing values (use previous day's values), then
+        # backward fill any remaining missing values at the start
+        fill_missing_2d(values)
+        for column in other_columns:
+            if missing_values[column]:
+                processed_df[column] = processed_df[column].ffill().bfill()
+        
+        summary.append("→ Filled missing values using forward and backward fill")
+    
+    # Handle outliers (|z| > threshold)
+    outliers, replacement = detect_outliers(values, method, threshold, window)
+    np.copyto(values, np.broadcast_to(replacement, values.shape), where=outliers)
+    outlier_counts = np.count_nonzero(outliers, axis=0)
+    
+    _store_columns(processed_df, columns, values, outlier_counts + missing_values[columns].to_numpy())
+    summary.extend(_outliers_summary(columns, outlier_counts, method))
+    
+    # Calculate basic statistics for the processed data, straight from the array
+    # unless other numeric columns also need describing
+    numeric_columns = [column for column in processed_df.columns if pd.api.types.is_numeric_dtype(processed_df[column])]
+    if numeric_columns == columns and not (missing_values[columns] == len(values)).any():
+        stats_summary = describe_array(values, columns)
+    else:
+        stats_summary = processed_df.describe()
     
     # Return processed dataframe and summary
     return processed_df, "\n".join(summary), stats_summary
 
+class IncrementalPreprocessor:
+    """
+    Preprocess bars as they are appended, touching only the new rows.
+    
+    Keeps, per OHLCV column, the last valid value for forward filling and
+    the Welford state (count, mean, m2) of everything seen so far. Outliers
+    are judged with the 'expanding' policy, against the statistics of all
+    rows up to each row, so past rows never change when new ones arrive and
+    update() costs O(new rows).
+    
+    Rows before a column's first valid value stay NaN and out of its Welford
+    state until that value arrives; they then enter the state as copies of
+    it, exactly as the full run back-fills them. Feeding a history through
+    preprocess_incremental in any number of batches therefore gives the same
+    rows as preprocess_stock_data(df, method='expanding').
+    
+    Parameters:
+    -----------
+    threshold : float
+        Absolute z-score above which a value is an outlier
+    min_periods : int
+        Rows needed before any value is judged
+    """
+    
+    def __init__(self, threshold: float = 3.0, min_periods: int = 20):
+        self.threshold = threshold
+        self.min_periods = min_periods
+        self.reset()
+    
+    def reset(self) -> None:
+        """Forget all state, as if no rows had been seen"""
+        self.columns: Optional[List[str]] = None
+        self.count = self.mean = self.m2 = self.last = None
+        self.pending = None
+        self.last_other: Dict[str, Any] = {}
+        self.last_index = None
+        self.missing_counts = self.outlier_counts = None
+    
+    def update(self, new_rows: pd.DataFrame) -> pd.DataFrame:
+        """Fill and clean newly appended rows and return them"""
+        processed_df = new_rows.copy(deep=False)
+        if self.columns is None:
+            self.columns = [column for column in OUTLIER_COLUMNS if column in new_rows.columns]
+            k = len(self.columns)
+            self.count, self.pending = np.zeros(k, dtype=np.int64), np.zeros(k, dtype=np.int64)
+            self.mean, self.m2 = np.zeros(k), np.zeros(k)
+            self.last = np.full(k, np.nan)
+            self.missing_counts, self.outlier_counts = np.zeros(k, dtype=np.int64), np.zeros(k, dtype=np.int64)
+        if processed_df.empty:
+            return processed_df
+        
+        values = np.empty((len(processed_df), len(self.columns)), dtype=np.float64, order='F')
+        for i, column in enumerate(self.columns):
+            values[:, i] = processed_df[column].to_numpy()
+        
+        # Leading gaps continue the previous batch's last value; the first batch back-fills them
+        missing = np.isnan(values)
+        missing_counts = np.count_nonzero(missing, axis=0)
+        for j in np.flatnonzero(missing[0] & ~np.isnan(self.last)):
+            first_valid = len(values) if missing[:, j].all() else int(np.argmin(missing[:, j]))
+            values[:first_valid, j] = self.last[j]
+        fill_missing_2d(values)
+        other_columns = [column for column in processed_df.columns if column not in self.columns]
+        for column in other_columns:
+            if processed_df[column].isnull().any():
+                filled = processed_df[column].ffill()
+                if column in self.last_other:
+                    filled = filled.fillna(self.last_other[column])
+                processed_df[column] = filled.bfill()
+            if not pd.isna(processed_df[column].iloc[-1]):
+                self.last_other[column] = processed_df[column].iloc[-1]
+        
+        # Rows waiting for a column's first valid value count as back-filled
+        # copies of it; columns still without one stay out of the statistics
+        unseen = np.isnan(values[-1])
+        arrived = (self.pending > 0) & ~unseen
+        self.count[arrived], self.mean[arrived], self.m2[arrived] = self.pending[arrived], values[0, arrived], 0.0
+        self.pending[arrived] = 0
+        self.pending[unseen] += len(values)
+        
+        outliers, running_mean, (count, mean, m2) = expanding_outliers(
+            values, self.count, self.mean, self.m2, self.threshold, self.min_periods
+        )
+        self.count[~unseen], self.mean[~unseen], self.m2[~unseen] = count[~unseen], mean[~unseen], m2[~unseen]
+        np.copyto(values, running_mean, where=outliers)
+        outlier_counts = np.count_nonzero(outliers, axis=0)
+        
+        _store_columns(processed_df, self.columns, values, outlier_counts + missing_counts)
+        self.last = np.where(np.isnan(values[-1]), self.last, values[-1])
+        self.missing_counts += missing_counts
+        self.outlier_counts += outlier_counts
+        self.last_index = processed_df.index[-1]
+        return processed_df
+
+def preprocess_incremental(df: pd.DataFrame, preprocessor: IncrementalPreprocessor, processed: Optional[pd.DataFrame] = None):
+    """
+    Preprocess a series that may extend one already processed.
+    
+    If `df` starts with the rows of `processed`, only the rows after them go
+    through the preprocessor; otherwise it is reset and run over the whole
+    series. Returns the same (dataframe, summary, statistics) as
+    preprocess_stock_data.
+    """
+    if df is None or df.empty:
+        return None, "No data to preprocess", None
+    
+    n = 0 if processed is None else len(processed)
+    extends = (
+        n and preprocessor.last_index is not None and len(df) >= n
+        and df.index[0] == processed.index[0] and df.index[n - 1] == preprocessor.last_index
+        and ('symbol' not in df.columns or df['symbol'].iloc[0] == processed['symbol'].iloc[0])
+    )
+    if extends:
+        new_rows = df.iloc[n:]
+        processed_df = pd.concat([processed, preprocessor.update(new_rows)]) if len(new_rows) else processed
+        # Earlier rows left NaN before a column's first valid value are back-filled
+        # once it arrives; any such gap shows in the first row
+        if len(new_rows) and processed.iloc[0].isna().any():
+            processed_df = processed_df.bfill()
+        summary = [f"Processed {len(new_rows)} new rows incrementally"]
+    else:
+        preprocessor.reset()
+        processed_df = preprocessor.update(df)
+        summary = []
+    
+    missing = {column: int(count) for column, count in zip(preprocessor.columns, preprocessor.missing_counts) if count > 0}
+    if missing:
+        summary.append("Missing values found:")
+        summary.extend(f"- {column}: {count} missing values" for column, count in missing.items())
+        summary.append("→ Filled missing values using forward and backward fill")
+    summary.extend(_outliers_summary(preprocessor.columns, preprocessor.outlier_counts, 'expanding'))
+    
+    return processed_df, "\n".join(summary), processed_df.describe()
+
 def display_preprocessing_results(original_df, processed_df, summary, stats_summary):
     """Display the results of preprocessing in a user-friendly format"""
     
@@ -877,69 +2872,1133 @@ def display_preprocessing_results(original_df, processed_df, summary, stats_summ
     # Create comparison plot for closing prices
     fig = go.Figure()
     
-    # Add original close price
-    fig.add_trace(go.Scatter(
-        x=original_df.index if isinstance(original_df.index, pd.DatetimeIndex) else original_df['date'],
-        y=original_df['close'],
-        name='Original Close Price',
-        line=dict(color='blue', width=1)
-    ))
+    # Add original close price
+    fig.add_trace(go.Scatter(
+        x=original_df.index if isinstance(original_df.index, pd.DatetimeIndex) else original_df['date'],
+        y=original_df['close'],
+        name='Original Close Price',
+        line=dict(color='blue', width=1)
+    ))
+    
+    # Add processed close price
+    fig.add_trace(go.Scatter(
+        x=processed_df.index if isinstance(processed_df.index, pd.DatetimeIndex) else processed_df['date'],
+        y=processed_df['close'],
+        name='Processed Close Price',
+        line=dict(color='green', width=1)
+    ))
+    
+    # Update layout
+    fig.update_layout(
+        title='Comparison of Close Prices Before and After Preprocessing',
+        yaxis_title='Price',
+        template='plotly_dark',
+        showlegend=True
+    )
+    
+    st.plotly_chart(fig, use_container_width=True)
+
+# Technical indicator engine
+# Each indicator is an expression over nodes; identical sub-expressions
+# (e.g. the 20-bar rolling mean behind SMA_20, BB_middle and the bands)
+# are planned once and evaluated once.
+CLOSE = ('column', 'close')
+CLOSE_DELTA = ('diff', CLOSE)
+MACD_NODE = ('sub', ('ewm', CLOSE, 12), ('ewm', CLOSE, 26))
+INDICATOR_RECIPES = {
+    'SMA_20': ('rolling_mean', CLOSE, 20),
+    'SMA_50': ('rolling_mean', CLOSE, 50),
+    'EMA_20': ('ewm', CLOSE, 20),
+    'BB_middle': ('rolling_mean', CLOSE, 20),
+    'BB_upper': ('add', ('rolling_mean', CLOSE, 20), ('scale', ('rolling_std', CLOSE, 20), 2.0)),
+    'BB_lower': ('sub', ('rolling_mean', CLOSE, 20), ('scale', ('rolling_std', CLOSE, 20), 2.0)),
+    'RSI': ('rsi', ('rolling_mean', ('gain', CLOSE_DELTA), 14), ('rolling_mean', ('loss', CLOSE_DELTA), 14)),
+    'MACD': MACD_NODE,
+    'Signal_Line': ('ewm', MACD_NODE, 9),
+    'Daily_Return': ('pct_change', CLOSE)
+}
+INDICATOR_CHUNK_ROWS = 1 << 16   # Rows per chunk in rolling-window kernels
+INDICATOR_CHUNK_CELLS = 1 << 20  # Cells per chunk when a kernel runs over many columns
+
+def _node_inputs(node: Tuple) -> List[Tuple]:
+    """Sub-expressions a node depends on"""
+    kind = node[0]
+    if kind == 'column':
+        return []
+    if kind == 'rolling_std':
+        # The deviations are taken from the window mean, which is shared with any SMA over it
+        return [node[1], ('rolling_mean', node[1], node[2])]
+    return [arg for arg in node[1:] if isinstance(arg, tuple)]
+
+def plan_indicators(names: Iterable[str], recipes: Optional[Dict[str, Tuple]] = None) -> Tuple[List[Tuple], Dict[Tuple, int]]:
+    """
+    Plan the evaluation of some indicators.
+    
+    Parameters:
+    -----------
+    names : Iterable[str]
+        Indicators to plan
+    recipes : Dict[str, Tuple], optional
+        Recipes by name; INDICATOR_RECIPES by default
+    
+    Returns:
+    --------
+    Tuple[List[Tuple], Dict[Tuple, int]]
+        The distinct nodes in dependency order, and the position of each
+        node's last consumer (so intermediates can be freed early)
+    """
+    order = []
+    seen = set()
+    
+    def visit(node):
+        if node in seen:
+            return
+        for dependency in _node_inputs(node):
+            visit(dependency)
+        seen.add(node)
+        order.append(node)
+    
+    recipes = INDICATOR_RECIPES if recipes is None else recipes
+    for name in names:
+        visit(recipes[name])
+    
+    last_use = {}
+    for position, node in enumerate(order):
+        for dependency in _node_inputs(node):
+            last_use[dependency] = position
+    return order, last_use
+
+def _chunk_rows(x: np.ndarray, window: int = 1) -> int:
+    """Rows per chunk; for 2-D input, few enough that the (rows x columns x window) temporaries stay bounded"""
+    if x.ndim == 1:
+        return INDICATOR_CHUNK_ROWS
+    return max(INDICATOR_CHUNK_CELLS // (max(x.shape[1], 1) * window), 1)
+
+def _rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing rolling mean of a series, or of every column of a 2-D array.
+    
+    Window sums are differences of cumulative sums, taken chunk by chunk with
+    each chunk (column) shifted by its first value so the sums stay small. A
+    window holding any NaN gives NaN, as with pandas' default min_periods.
+    """
+    n = len(x)
+    mean = np.full(x.shape, np.nan)
+    rows = _chunk_rows(x)
+    for start in range(max(window - 1, 0), n, rows):
+        stop = min(start + rows, n)
+        segment = x[start - window + 1:stop]
+        missing = np.isnan(segment)
+        gaps = missing.any()
+        if gaps:
+            shift = np.take_along_axis(segment, np.argmin(missing, axis=0)[None], axis=0)[0]
+            shift = np.where(np.isnan(shift), 0.0, shift)
+            centered = np.where(missing, 0.0, segment - shift)
+        else:
+            shift = segment[0]
+            centered = segment - shift
+        
+        sums = np.empty((len(segment) + 1,) + segment.shape[1:])
+        sums[0] = 0.0
+        np.cumsum(centered, axis=0, out=sums[1:])
+        window_mean = sums[window:] - sums[:-window]
+        window_mean /= window
+        window_mean += shift
+        if gaps:
+            counts = np.concatenate((np.zeros((1,) + segment.shape[1:], dtype=np.intp), np.cumsum(~missing, axis=0)))
+            window_mean[(counts[window:] - counts[:-window]) != window] = np.nan
+        mean[start:stop] = window_mean
+    return mean
+
+def _rolling_std(x: np.ndarray, mean: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing rolling sample standard deviation (ddof=1) around precomputed window means.
+    
+    Squared deviations are summed over a sliding-window view of each chunk,
+    a two-pass formula that stays exact however far prices drift.
+    """
+    n = len(x)
+    std = np.full(x.shape, np.nan)
+    rows = _chunk_rows(x, window)
+    for start in range(max(window - 1, 0), n, rows):
+        stop = min(start + rows, n)
+        deviation = np.lib.stride_tricks.sliding_window_view(x[start - window + 1:stop], window, axis=0) - mean[start:stop, ..., None]
+        std[start:stop] = np.sqrt(np.einsum('...k,...k->...', deviation, deviation) / (window - 1))
+    return std
+
+def _last_valid_rows(valid: np.ndarray) -> np.ndarray:
+    """Row of the last valid value at or before each cell (0 before the first), from one running maximum"""
+    rows = np.where(valid, np.arange(len(valid)).reshape((-1,) + (1,) * (valid.ndim - 1)), 0)
+    return np.maximum.accumulate(rows, axis=0, out=rows)
+
+def _ewm(x: np.ndarray, span: int) -> np.ndarray:
+    """Exponential moving average (of every column) matching pandas ewm(span, adjust=False).mean()"""
+    if np.isnan(x).any():
+        return (pd.DataFrame(x) if x.ndim == 2 else pd.Series(x)).ewm(span=span, adjust=False).mean().to_numpy()
+    alpha = 2.0 / (span + 1.0)
+    if len(x) == 0:
+        return x.copy()
+    # y[t] = alpha * x[t] + (1 - alpha) * y[t-1] as one C-level IIR filter pass, starting at y[0] = x[0]
+    y, _ = signal.lfilter([alpha], [1.0, alpha - 1.0], x, axis=0, zi=(1.0 - alpha) * x[:1])
+    return y
+
+def _evaluate_node(node: Tuple, values: Dict[Tuple, np.ndarray], df: pd.DataFrame) -> np.ndarray:
+    """
+    Evaluate one planned node from its already evaluated inputs.
+    
+    `df` may also map column names to (time x symbol) arrays, in which case
+    every kernel runs down the time axis of all columns at once.
+    """
+    kind = node[0]
+    if kind == 'column':
+        return np.asarray(df[node[1]], dtype=np.float64)
+    if kind == 'const':
+        return np.float64(node[1])
+    if kind == 'rolling_mean':
+        return _rolling_mean(values[node[1]], node[2])
+    if kind == 'rolling_std':
+        return _rolling_std(values[node[1]], values[('rolling_mean', node[1], node[2])], node[2])
+    if kind == 'ewm':
+        return _ewm(values[node[1]], node[2])
+    
+    x = values[node[1]]
+    if kind == 'diff':
+        out = np.empty_like(x)
+        out[:1] = np.nan
+        np.subtract(x[1:], x[:-1], out=out[1:])
+        return out
+    if kind == 'gain':
+        return np.where(x > 0, x, 0.0)
+    if kind == 'loss':
+        return np.where(x < 0, -x, 0.0)
+    if kind == 'scale':
+        return x * node[2]
+    if kind == 'neg':
+        return -x
+    if kind == 'abs':
+        return np.abs(x)
+    if kind == 'log':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.log(x)
+    if kind == 'shift':
+        out = np.full(x.shape, np.nan)
+        if node[2] < len(x):
+            out[node[2]:] = x[:len(x) - node[2]]
+        return out
+    if kind == 'pct_change':
+        missing = np.isnan(x)
+        if missing.any():
+            # Gaps carry the last value, as pandas' pct_change pads them
+            x = np.take_along_axis(x, _last_valid_rows(~missing), axis=0)
+        out = np.empty_like(x)
+        out[:1] = np.nan
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(x[1:], x[:-1], out=out[1:])
+        out[1:] -= 1.0
+        return out
+    
+    y = values[node[2]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if kind == 'add':
+            return x + y
+        if kind == 'sub':
+            return x - y
+        if kind == 'mul':
+            return x * y
+        if kind == 'div':
+            return x / y
+        if kind == 'rsi':
+            return 100.0 - 100.0 / (1.0 + x / y)
+    raise ValueError(f"Unknown indicator node: {kind}")
+
+def _evaluate_recipes(source, names: List[str], recipes: Dict[str, Tuple], invalid: Optional[np.ndarray] = None) -> Iterator[Tuple[Tuple, np.ndarray]]:
+    """
+    Evaluate the plan for some indicators, yielding (node, values) for each
+    requested node as soon as it is ready. Cells flagged `invalid` are set
+    to NaN in every computed node, so they never enter a window.
+    """
+    order, last_use = plan_indicators(names, recipes)
+    requested = {recipes[name] for name in names}
+    values = {}
+    for position, node in enumerate(order):
+        values[node] = _evaluate_node(node, values, source)
+        if invalid is not None and node[0] not in ('column', 'const'):
+            values[node][invalid] = np.nan
+        if node in requested:
+            yield node, values[node]
+        # Free intermediates once their last consumer has run
+        for dependency in _node_inputs(node):
+            if last_use.get(dependency) == position:
+                del values[dependency]
+
+def compute_indicators(df: pd.DataFrame, names: Optional[Iterable[str]] = None, recipes: Optional[Dict[str, Tuple]] = None) -> pd.DataFrame:
+    """
+    Evaluate indicators from INDICATOR_RECIPES into one preallocated block.
+    
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Bars with at least a 'close' column
+    names : Iterable[str], optional
+        Indicators to compute; all of the recipes by default
+    recipes : Dict[str, Tuple], optional
+        Recipes by name, e.g. INDICATOR_RECIPES extended with compiled
+        custom indicators; INDICATOR_RECIPES by default
+        
+    Returns:
+    --------
+    pd.DataFrame
+        One float64 column per indicator, sharing df's index
+    """
+    recipes = INDICATOR_RECIPES if recipes is None else recipes
+    names = list(recipes if names is None else names)
+    outputs = {}
+    for column, name in enumerate(names):
+        outputs.setdefault(recipes[name], []).append(column)
+    
+    block = np.empty((len(df), len(names)), dtype=np.float64, order='F')
+    for node, value in _evaluate_recipes(df, names, recipes):
+        for column in outputs[node]:
+            block[:, column] = value
+    
+    return pd.DataFrame(block, index=df.index, columns=names, copy=False)
+
+# Custom indicator expressions
+# Features written like "SMA(close, 20) - EMA(close, 50)" compile to the same
+# node graph as INDICATOR_RECIPES, so shared sub-expressions (with each other
+# and with the built-in indicators) are evaluated once, as whole arrays.
+MODEL_FEATURES = ['open', 'high', 'low', 'close', 'volume', 'SMA_20', 'SMA_50', 'EMA_20', 'RSI', 'MACD']
+EXPRESSION_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+class IndicatorExpressionError(ValueError):
+    """Raised when a custom indicator definition cannot be compiled"""
+
+def _rsi_node(x: Tuple, window: int = 14) -> Tuple:
+    delta = ('diff', x)
+    return ('rsi', ('rolling_mean', ('gain', delta), window), ('rolling_mean', ('loss', delta), window))
+
+# Function name -> builder taking one series node followed by integer windows
+EXPRESSION_FUNCTIONS = {
+    'sma': lambda x, window: ('rolling_mean', x, window),
+    'ema': lambda x, span: ('ewm', x, span),
+    'std': lambda x, window: ('rolling_std', x, window),
+    'rsi': _rsi_node,
+    'zscore': lambda x, window: ('div', ('sub', x, ('rolling_mean', x, window)), ('rolling_std', x, window)),
+    'diff': lambda x: ('diff', x),
+    'pct_change': lambda x: ('pct_change', x),
+    'lag': lambda x, periods=1: ('shift', x, periods),
+    'abs': lambda x: ('abs', x),
+    'log': lambda x: ('log', x)
+}
+EXPRESSION_OPERATORS = {ast.Add: ('add', np.add), ast.Sub: ('sub', np.subtract), ast.Mult: ('mul', np.multiply), ast.Div: ('div', np.divide)}
+
+def compile_expression(text: str, names: Optional[Dict[str, Tuple]] = None) -> Tuple:
+    """
+    Compile an indicator expression into an INDICATOR_RECIPES style node.
+    
+    Expressions combine the price columns, the built-in indicators (e.g.
+    MACD), earlier definitions in `names`, numbers, + - * / and the
+    functions in EXPRESSION_FUNCTIONS, e.g. "zscore(volume, 60)".
+    
+    Parameters:
+    -----------
+    text : str
+        The expression
+    names : Dict[str, Tuple], optional
+        Already compiled custom indicators that may be referred to
+        
+    Returns:
+    --------
+    Tuple
+        The expression's node; equal sub-expressions give equal nodes
+    """
+    names = names or {}
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError as e:
+        raise IndicatorExpressionError(f"Invalid expression '{text}': {e.msg}") from None
+    
+    def window(arg, function):
+        if not (isinstance(arg, ast.Constant) and type(arg.value) is int and arg.value > 0):
+            raise IndicatorExpressionError(f"{function}() expects positive whole numbers after its series")
+        return arg.value
+    
+    def visit(expr):
+        if isinstance(expr, ast.Constant) and type(expr.value) in (int, float):
+            return float(expr.value)
+        if isinstance(expr, ast.Name):
+            if expr.id in names:
+                return names[expr.id]
+            if expr.id in INDICATOR_RECIPES:
+                return INDICATOR_RECIPES[expr.id]
+            if expr.id.lower() in EXPRESSION_COLUMNS:
+                return ('column', expr.id.lower())
+            raise IndicatorExpressionError(f"Unknown name '{expr.id}'")
+        if isinstance(expr, ast.UnaryOp) and isinstance(expr.op, (ast.USub, ast.UAdd)):
+            operand = visit(expr.operand)
+            if isinstance(expr.op, ast.UAdd):
+                return operand
+            return -operand if isinstance(operand, float) else ('neg', operand)
+        if isinstance(expr, ast.BinOp) and type(expr.op) in EXPRESSION_OPERATORS:
+            kind, fold = EXPRESSION_OPERATORS[type(expr.op)]
+            left, right = visit(expr.left), visit(expr.right)
+            if kind == 'div' and right == 0.0:
+                raise IndicatorExpressionError(f"Division by zero in '{text}'")
+            if isinstance(left, float) and isinstance(right, float):
+                return float(fold(left, right))
+            # Scaling by a constant is the same node the Bollinger recipes use
+            if kind == 'mul' and isinstance(left, float):
+                return ('scale', right, left)
+            if kind in ('mul', 'div') and isinstance(right, float):
+                return ('scale', left, right if kind == 'mul' else 1.0 / right)
+            return (kind,
+                    ('const', left) if isinstance(left, float) else left,
+                    ('const', right) if isinstance(right, float) else right)
+        if isinstance(expr, ast.Call) and isinstance(expr.func, ast.Name) and not expr.keywords:
+            function = expr.func.id.lower()
+            if function not in EXPRESSION_FUNCTIONS:
+                raise IndicatorExpressionError(f"Unknown function '{expr.func.id}'")
+            if not expr.args:
+                raise IndicatorExpressionError(f"{expr.func.id}() expects a series")
+            series = visit(expr.args[0])
+            if isinstance(series, float):
+                raise IndicatorExpressionError(f"{expr.func.id}() expects a series, not a number")
+            windows = [window(arg, expr.func.id) for arg in expr.args[1:]]
+            try:
+                return EXPRESSION_FUNCTIONS[function](series, *windows)
+            except TypeError:
+                raise IndicatorExpressionError(f"Wrong number of arguments to {expr.func.id}()") from None
+        raise IndicatorExpressionError(f"Unsupported syntax in '{text}': {ast.unparse(expr)}")
+    
+    node = visit(tree.body)
+    if isinstance(node, float):
+        raise IndicatorExpressionError(f"'{text}' does not depend on any series")
+    return node
+
+def parse_indicator_definitions(text: str) -> Dict[str, Tuple]:
+    """
+    Compile custom indicator definitions, one "name = expression" per line.
+    
+    Later definitions may use earlier ones. Blank lines and lines starting
+    with '#' are skipped.
+    
+    Returns:
+    --------
+    Dict[str, Tuple]
+        Compiled nodes by indicator name, in definition order
+    """
+    recipes = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        name, equals, expression = line.partition('=')
+        name = name.strip()
+        if not equals or not name.isidentifier():
+            raise IndicatorExpressionError(f"Expected 'name = expression', got '{line}'")
+        if name in INDICATOR_RECIPES or name.lower() in EXPRESSION_COLUMNS or name in recipes:
+            raise IndicatorExpressionError(f"'{name}' is already defined")
+        recipes[name] = compile_expression(expression.strip(), recipes)
+    return recipes
+
+def indicator_lookback(node: Tuple) -> int:
+    """Bars of history a node needs before its first complete value"""
+    kind = node[0]
+    if kind in ('rolling_mean', 'rolling_std'):
+        return indicator_lookback(node[1]) + node[2] - 1
+    lookback = max((indicator_lookback(dependency) for dependency in _node_inputs(node)), default=0)
+    if kind in ('diff', 'pct_change'):
+        return lookback + 1
+    if kind == 'shift':
+        return lookback + node[2]
+    return lookback
+
+def model_feature_columns(df: pd.DataFrame, custom_features: Iterable[str] = ()) -> List[str]:
+    """Model inputs: the price columns plus whichever indicators and custom features df has"""
+    return MODEL_FEATURES[:5] + [column for column in [*MODEL_FEATURES[5:], *custom_features] if column in df.columns]
+
+# Multi-timeframe features
+# Indicators computed on weekly or monthly bars rolled up from the daily ones
+# and joined back to the daily rows, using only coarse bars that had closed
+TIMEFRAMES = {'1W': 'W', '1M': 'M'}
+TIMEFRAME_INDICATORS = ['RSI', 'MACD', 'SMA_20']
+
+def timeframe_feature_names(timeframes: Iterable[str], names: Iterable[str] = TIMEFRAME_INDICATORS) -> List[str]:
+    """Columns holding the multi-timeframe features, e.g. 'RSI_1W' or 'MACD_1M'"""
+    names = list(names)
+    return [f"{name}_{timeframe}" for timeframe in timeframes for name in names]
+
+def timeframe_features(df: pd.DataFrame, timeframes: Iterable[str] = tuple(TIMEFRAMES), names: Iterable[str] = TIMEFRAME_INDICATORS, recipes: Optional[Dict[str, Tuple]] = None) -> pd.DataFrame:
+    """
+    Indicators of coarser bars, as-of joined back to every row of df.
+    
+    Each timeframe is rolled up with the reductions behind resample_bars and
+    its indicators are evaluated on the much shorter coarse series. Rows of
+    the i-th coarse bar then take the values of bar i-1, the latest one that
+    had closed before their own bar opened, so no row sees prices from later
+    in its week or month. The join is one gather per column straight into a
+    preallocated block, and df itself is never copied.
+    
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        OHLCV bars indexed by timestamp in ascending order
+    timeframes : Iterable[str]
+        Keys of TIMEFRAMES, or any pandas frequency coarser than the bars
+    names : Iterable[str]
+        Indicators to compute on each timeframe
+    recipes : Dict[str, Tuple], optional
+        Recipes by name; INDICATOR_RECIPES by default
+        
+    Returns:
+    --------
+    pd.DataFrame
+        One float64 column per timeframe and indicator, named as by
+        timeframe_feature_names and sharing df's index; NaN until the first
+        coarse bar has closed and the indicator has warmed up
+    """
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise ValueError("Multi-timeframe features need data indexed by date")
+    timeframes, names = list(timeframes), list(names)
+    columns = timeframe_feature_names(timeframes, names)
+    block = np.full((len(df), len(columns)), np.nan, order='F')
+    
+    for position, timeframe in enumerate(timeframes):
+        keys = _bucket_keys(df.index, TIMEFRAMES.get(timeframe, timeframe))
+        if len(keys) == 0:
+            continue
+        starts, ends = _bucket_bounds(keys.asi8)
+        values = compute_indicators(pd.DataFrame(_roll_up_bars(df, starts, ends)), names, recipes).to_numpy()
+        
+        # Rows of the first coarse bar have no completed bar to look back on
+        completed = np.repeat(np.arange(len(starts) - 1), (ends - starts)[1:])
+        for offset in range(len(names)):
+            np.take(values[:, offset], completed, out=block[ends[0]:, position * len(names) + offset])
+    
+    return pd.DataFrame(block, index=df.index, columns=columns, copy=False)
+
+def _correlation_with_gaps_as_zero(x: np.ndarray, valid: np.ndarray, y: np.ndarray) -> float:
+    """
+    Pearson correlation of x with y.fillna(0) over the rows where x is valid.
+    
+    Indicators only have NaNs during their warm-up, so the common case works
+    on views of the arrays and the dot products need no temporary copies.
+    """
+    start = int(np.argmax(valid))
+    if not valid[start:].all():
+        x, y, start = x[valid], y[valid], 0
+    x, y = x[start:], y[start:]
+    n = len(x)
+    if n < 2:
+        return np.nan
+    
+    missing = np.isnan(y)
+    first = int(np.argmin(missing)) if missing.any() else 0
+    if missing[first:].any():
+        y, first = np.nan_to_num(y, nan=0.0), 0
+    x_centered = x - x.mean()
+    
+    # The zero-filled warm-up rows add nothing to the sums over y
+    y_sum = y[first:].sum()
+    covariance = np.dot(x_centered[first:], y[first:])
+    y_spread = np.dot(y[first:], y[first:]) - y_sum * y_sum / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(covariance / np.sqrt(np.dot(x_centered, x_centered) * y_spread))
+
+def calculate_technical_indicators(df, custom_recipes: Optional[Dict[str, Tuple]] = None, timeframes: Iterable[str] = ()):
+    """
+    Calculate various technical indicators for stock data.
+    
+    Custom indicators (compiled by parse_indicator_definitions) are planned
+    together with the built-in ones, so shared sub-expressions are computed
+    once, and are added as columns and correlated like them. So are the
+    indicators of any coarser timeframes (see timeframe_features).
+    """
+    custom_recipes = custom_recipes or {}
+    indicators = compute_indicators(df, recipes={**INDICATOR_RECIPES, **custom_recipes})
+    blocks = [indicators]
+    if timeframes:
+        blocks.append(timeframe_features(df, timeframes))
+    
+    # Calculate correlations with daily returns (indicator gaps count as 0)
+    correlations = {}
+    technical_indicators = ['SMA_20', 'SMA_50', 'EMA_20', 'RSI', 'MACD', *custom_recipes]
+    returns = indicators['Daily_Return'].to_numpy()
+    values = correlate_with_returns(returns, [indicators[indicator].to_numpy() for indicator in technical_indicators])
+    correlations.update(zip(technical_indicators, values.tolist()))
+    for block in blocks[1:]:
+        values = correlate_with_returns(returns, [block[column].to_numpy() for column in block.columns])
+        correlations.update(zip(block.columns, values.tolist()))
+    
+    # Assemble without copying: the input's (possibly shared) price arrays and the
+    # indicator blocks are used as they are; earlier indicator columns, including
+    # those of timeframes no longer selected, are replaced
+    replaced = {column for block in blocks for column in block.columns}
+    replaced.update(timeframe_feature_names(TIMEFRAMES))
+    columns = {column: df[column] for column in df.columns if column not in replaced}
+    for block in blocks:
+        columns.update((column, block[column]) for column in block.columns)
+    df = pd.DataFrame(columns, index=df.index, copy=False)
+    
+    return df, correlations
+
+# Panel (time x symbol) engine
+# A whole universe held as aligned 2-D arrays, so fills, outlier handling
+# and indicators run once down the time axis for every symbol together
+PANEL_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+class PricePanel:
+    """
+    Bars of many symbols as aligned (time x symbol) arrays.
+    
+    Rows are the union of all symbols' timestamps. `listed` marks the cells
+    from each symbol's first bar to its last; cells outside it are NaN in
+    every field, while missing cells inside it are gaps to be filled.
+    
+    Parameters:
+    -----------
+    index : pd.DatetimeIndex
+        Timestamps, one per row
+    symbols : List[str]
+        Symbols, one per column
+    fields : Dict[str, np.ndarray]
+        Float64 (time x symbol) array per field, e.g. 'close' or 'RSI'
+    listed : np.ndarray
+        Boolean (time x symbol) validity mask
+    """
+    
+    def __init__(self, index: pd.DatetimeIndex, symbols: List[str], fields: Dict[str, np.ndarray], listed: np.ndarray):
+        self.index = index
+        self.symbols = list(symbols)
+        self.fields = fields
+        self.listed = listed
+    
+    @classmethod
+    def _from_rows(cls, symbols: List[str], symbol_codes: np.ndarray, dates: pd.Index, columns: Dict[str, np.ndarray]) -> "PricePanel":
+        """Scatter long rows (symbol code, date, field values) into aligned arrays"""
+        time_codes, index = pd.factorize(dates, sort=True)
+        shape = (len(index), len(symbols))
+        
+        present = np.zeros(shape, dtype=bool)
+        present[time_codes, symbol_codes] = True
+        listed = present
+        if shape[0]:
+            rows = np.arange(shape[0])[:, None]
+            listed = (rows >= np.argmax(present, axis=0)) & (rows <= shape[0] - 1 - np.argmax(present[::-1], axis=0))
+        
+        fields = {}
+        for field, column in columns.items():
+            values = np.full(shape, np.nan)
+            values[time_codes, symbol_codes] = column
+            fields[field] = values
+        return cls(pd.DatetimeIndex(index, name='date'), symbols, fields, listed)
+    
+    @classmethod
+    def from_long(cls, panel: pd.DataFrame) -> "PricePanel":
+        """Build from a long panel indexed by (symbol, date), as returned by build_panel"""
+        symbol_codes, symbols = pd.factorize(panel.index.get_level_values(0), sort=True)
+        columns = {field: panel[field].to_numpy(dtype=np.float64) for field in PANEL_FIELDS if field in panel.columns}
+        return cls._from_rows(list(symbols), symbol_codes, panel.index.get_level_values(1), columns)
+    
+    @classmethod
+    def from_frames(cls, frames: Dict[str, pd.DataFrame]) -> "PricePanel":
+        """Build from per-symbol bar frames, without stacking them into one frame first"""
+        symbols = sorted(symbol for symbol, frame in frames.items() if frame is not None and len(frame))
+        if not symbols:
+            return cls.from_long(build_panel({}, []))
+        parts = [frames[symbol] for symbol in symbols]
+        symbol_codes = np.repeat(np.arange(len(symbols)), [len(frame) for frame in parts])
+        dates = parts[0].index.append([frame.index for frame in parts[1:]])
+        fields = [field for field in PANEL_FIELDS if all(field in frame.columns for frame in parts)]
+        stacked = np.concatenate([
+            (frame if list(frame.columns) == fields else frame[fields]).to_numpy(dtype=np.float64) for frame in parts
+        ])
+        return cls._from_rows(symbols, symbol_codes, dates, {field: stacked[:, i] for i, field in enumerate(fields)})
+    
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.listed.shape
+    
+    def frame(self, symbol: str) -> pd.DataFrame:
+        """One symbol's listed rows with every field as a column"""
+        column = self.symbols.index(symbol)
+        rows = self.listed[:, column]
+        return pd.DataFrame({field: values[rows, column] for field, values in self.fields.items()}, index=self.index[rows])
+    
+    def cross_section(self) -> pd.DataFrame:
+        """Every field of every symbol at its latest listed row"""
+        rows = len(self.index) - 1 - np.argmax(self.listed[::-1], axis=0)
+        columns = np.arange(len(self.symbols))
+        section = {'date': self.index[rows]}
+        section.update((field, values[rows, columns]) for field, values in self.fields.items())
+        return pd.DataFrame(section, index=pd.Index(self.symbols, name='symbol'))
+    
+    def to_long(self) -> pd.DataFrame:
+        """Listed cells as a long panel indexed by (symbol, date)"""
+        time_codes, symbol_codes = np.nonzero(self.listed.T)[::-1]
+        index = pd.MultiIndex.from_arrays(
+            [np.asarray(self.symbols, dtype=object)[symbol_codes], self.index[time_codes]], names=['symbol', 'date']
+        )
+        return pd.DataFrame({field: values[time_codes, symbol_codes] for field, values in self.fields.items()}, index=index)
+
+def _fill_panel(values: np.ndarray, listed: np.ndarray) -> np.ndarray:
+    """
+    Forward fill, then backward fill, the gaps of every column inside its listing.
+    
+    The same fill as fill_missing_2d, but gathered for all columns at once
+    (positions of the last valid row come from one running maximum), and
+    cells outside each listing stay NaN.
+    """
+    valid = ~np.isnan(values)
+    last_valid = _last_valid_rows(valid)
+    # Leading gaps take the first valid value instead
+    np.maximum(last_valid, np.argmax(valid, axis=0), out=last_valid)
+    filled = np.take_along_axis(values, last_valid, axis=0)
+    filled[~listed] = np.nan
+    return filled
+
+def detect_panel_outliers(values: np.ndarray, listed: np.ndarray, method: str = 'zscore', threshold: float = 3.0, window: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    detect_outliers for every symbol of a panel field at once.
+    
+    Statistics of each column only cover its listed cells, and the rolling
+    and expanding windows start at each symbol's first bar, so a column is
+    judged exactly as its symbol would be on its own.
+    
+    Parameters:
+    -----------
+    values : np.ndarray
+        Filled (time x symbol) array, NaN outside the listings
+    listed : np.ndarray
+        Boolean (time x symbol) validity mask
+    method, threshold, window
+        As for detect_outliers
+        
+    Returns:
+    --------
+    Tuple[np.ndarray, np.ndarray]
+        Outlier mask and the replacement for each cell (a single row for
+        the per-column methods)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if method == 'zscore':
+            count = np.count_nonzero(listed, axis=0)
+            center = values.sum(axis=0, where=listed) / count
+            squared = np.where(listed, values - center, 0.0)
+            np.square(squared, out=squared)
+            mask = squared > threshold * threshold * squared.sum(axis=0) / count
+            replacement = (center * count - values.sum(axis=0, where=mask)) / (count - np.count_nonzero(mask, axis=0))
+            return mask, replacement[None, :]
+        
+        if method == 'mad':
+            center = np.nanmedian(values, axis=0)
+            deviation = np.abs(values - center)
+            mask = MAD_SCALE * deviation > threshold * np.nanmedian(deviation, axis=0)
+            return mask, center[None, :]
+        
+        if method in ('rolling', 'expanding'):
+            # Each column is shifted by its first listed value so the running sums stay small
+            first = np.take_along_axis(values, np.argmax(listed, axis=0)[None], axis=0)
+            shifted = np.where(listed, values - first, 0.0)
+            counts = np.cumsum(listed, axis=0)
+            sums = np.cumsum(shifted, axis=0)
+            squares = np.cumsum(np.square(shifted, out=shifted), axis=0)
+            if method == 'rolling':
+                counts[window:] = counts[window:] - counts[:-window]
+                sums[window:] = sums[window:] - sums[:-window]
+                squares[window:] = squares[window:] - squares[:-window]
+                sums /= counts
+                variance = np.maximum(squares / counts - sums * sums, 0.0)
+            else:
+                sums /= counts
+                variance = squares / counts - sums * sums
+            sums += first
+            deviation = values - sums
+            mask = (deviation * deviation > threshold * threshold * variance) & listed
+            if method == 'expanding':
+                mask &= counts >= window
+            return mask, sums
+    
+    raise ValueError(f"Unknown outlier method: {method}")
+
+def preprocess_panel(panel: PricePanel, method: str = 'zscore', threshold: float = 3.0, window: int = 20) -> Tuple[PricePanel, pd.DataFrame]:
+    """
+    Fill gaps and replace outliers in every field of a panel.
+    
+    Returns:
+    --------
+    Tuple[PricePanel, pd.DataFrame]
+        The preprocessed panel, and per symbol the number of missing and of
+        outlier values handled in each field
+    """
+    fields, report = {}, {}
+    for field, values in panel.fields.items():
+        missing = np.isnan(values) & panel.listed
+        filled = _fill_panel(values, panel.listed) if missing.any() else values.copy()
+        outliers, replacement = detect_panel_outliers(filled, panel.listed, method, threshold, window)
+        np.copyto(filled, np.broadcast_to(replacement, filled.shape), where=outliers)
+        fields[field] = filled
+        report[(field, 'missing')] = np.count_nonzero(missing, axis=0)
+        report[(field, 'outliers')] = np.count_nonzero(outliers, axis=0)
+    return PricePanel(panel.index, panel.symbols, fields, panel.listed), pd.DataFrame(report, index=pd.Index(panel.symbols, name='symbol'))
+
+def compute_panel_indicators(panel: PricePanel, names: Optional[Iterable[str]] = None, recipes: Optional[Dict[str, Tuple]] = None) -> PricePanel:
+    """
+    Evaluate indicators for every symbol of a panel in one pass per node.
+    
+    The plan is the same as compute_indicators', with every kernel running
+    down the time axis of the whole (time x symbol) array. Cells outside a
+    symbol's listing are NaN in every intermediate, so each column matches
+    what compute_indicators gives for its symbol alone.
+    
+    Returns:
+    --------
+    PricePanel
+        The panel with one extra field per indicator (price fields are shared)
+    """
+    recipes = INDICATOR_RECIPES if recipes is None else recipes
+    names = list(recipes if names is None else names)
+    outputs = {}
+    for name in names:
+        outputs.setdefault(recipes[name], []).append(name)
+    
+    fields = dict(panel.fields)
+    for node, value in _evaluate_recipes(panel.fields, names, recipes, invalid=~panel.listed):
+        for name in outputs[node]:
+            fields[name] = value
+    return PricePanel(panel.index, panel.symbols, fields, panel.listed)
+
+# Indicator parameter sweeps
+# A whole family of one indicator over many window lengths, evaluated in one
+# pass into a (time x window) block instead of one pandas rolling call each
+SWEEP_INDICATORS = ['SMA', 'EMA', 'RSI', 'BB_width']
+DEFAULT_SWEEP_WINDOWS = [5, 10, 14, 20, 30, 50, 100, 200]
+SWEEP_CHUNK_ROWS = 1 << 12   # Rows per chunk; bounds the (rows x windows) temporaries
+SWEEP_TWO_PASS_WINDOW = 20   # Longest window whose standard deviation is summed two-pass
+
+def _rolling_grid(x: np.ndarray, windows: np.ndarray, with_std: bool = False, shifted: bool = True) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Trailing rolling means (and sample stds) of a series for many windows at once.
+    
+    Each chunk takes one cumulative sum (and sum of squares), shifted by its
+    first value unless `shifted` is False, and every window's sums are
+    differences of two slices of it. Series of non-negative parts such as
+    gains are summed unshifted, so windows of exact zeros stay exactly zero.
+    Like pandas, a window holding any NaN gives NaN.
+    """
+    n, k = len(x), len(windows)
+    means = np.full((n, k), np.nan, order='F')
+    stds = np.full((n, k), np.nan, order='F') if with_std else None
+    longest = int(windows.max()) if k else 0
+    for start in range(0, n, SWEEP_CHUNK_ROWS):
+        stop = min(start + SWEEP_CHUNK_ROWS, n)
+        lo = max(start - longest + 1, 0)
+        segment = x[lo:stop]
+        valid = ~np.isnan(segment)
+        shift = segment[np.argmax(valid)] if shifted and valid.any() else 0.0
+        centered = np.where(valid, segment - shift, 0.0)
+        sums = np.concatenate(([0.0], np.cumsum(centered)))
+        counts = np.concatenate(([0], np.cumsum(valid)))
+        squares = np.concatenate(([0.0], np.cumsum(centered * centered))) if with_std else None
+        
+        for column, window in enumerate(windows):
+            first = max(start, window - 1)
+            if first >= stop:
+                continue
+            # Cumulative positions ending the output rows, and those just before each window
+            ends = slice(first - lo + 1, stop - lo + 1)
+            begins = slice(first - lo + 1 - window, stop - lo + 1 - window)
+            complete = (counts[ends] - counts[begins]) == window
+            window_sums = sums[ends] - sums[begins]
+            means[first:stop, column] = np.where(complete, shift + window_sums / window, np.nan)
+            if with_std:
+                variance = (squares[ends] - squares[begins] - window_sums * window_sums / window) / (window - 1)
+                stds[first:stop, column] = np.where(complete, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+    return means, stds
+
+def sweep_indicator(df: pd.DataFrame, indicator: str, windows: Iterable[int]) -> pd.DataFrame:
+    """
+    Compute one indicator for a list of window lengths in a single pass.
+    
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Bars with at least a 'close' column
+    indicator : str
+        One of SWEEP_INDICATORS: 'SMA', 'EMA' (span), 'RSI' or 'BB_width'
+        ((upper - lower) / middle Bollinger band, at 2 standard deviations)
+    windows : Iterable[int]
+        Window lengths (spans for EMA)
+        
+    Returns:
+    --------
+    pd.DataFrame
+        A (time x window) block with columns like 'SMA_20', matching the
+        single-window recipes of INDICATOR_RECIPES
+    """
+    if indicator not in SWEEP_INDICATORS:
+        raise ValueError(f"Unknown sweep indicator: {indicator}")
+    windows = np.asarray(list(windows), dtype=np.intp)
+    if len(windows) and windows.min() < (2 if indicator == 'BB_width' else 1):
+        raise ValueError(f"Window lengths for {indicator} must be at least {2 if indicator == 'BB_width' else 1}")
+    close = df['close'].to_numpy(dtype=np.float64)
+    
+    if indicator == 'SMA':
+        block, _ = _rolling_grid(close, windows)
+    elif indicator == 'BB_width':
+        middle, std = _rolling_grid(close, windows, with_std=True)
+        # Differences of cumulative squares lose the small spreads of short
+        # windows to cancellation; those are summed around each window's mean
+        for column in np.flatnonzero(windows <= SWEEP_TWO_PASS_WINDOW):
+            std[:, column] = _rolling_std(close, middle[:, column], int(windows[column]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            block = np.divide(4.0 * std, middle, out=std)
+    elif indicator == 'RSI':
+        delta = np.concatenate(([np.nan], np.diff(close)))
+        gains, _ = _rolling_grid(np.where(delta > 0, delta, 0.0), windows, shifted=False)
+        losses, _ = _rolling_grid(np.where(delta < 0, -delta, 0.0), windows, shifted=False)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            block = 100.0 - 100.0 / (1.0 + gains / losses)
+    else:
+        # Each span is its own IIR filter; lfilter runs each in one C pass
+        block = np.empty((len(close), len(windows)), order='F')
+        for column, span in enumerate(windows):
+            block[:, column] = _ewm(close, int(span))
+    
+    return pd.DataFrame(block, index=df.index, columns=[f"{indicator}_{w}" for w in windows], copy=False)
+
+def correlate_with_returns(returns: np.ndarray, columns: List[np.ndarray]) -> np.ndarray:
+    """Correlation of returns with each column (NaNs counted as 0) over the rows with a valid return"""
+    valid = ~np.isnan(returns)
+    return np.array([_correlation_with_gaps_as_zero(returns, valid, column) for column in columns])
+
+def sweep_correlations(df: pd.DataFrame, windows: Iterable[int] = DEFAULT_SWEEP_WINDOWS, indicators: Iterable[str] = SWEEP_INDICATORS) -> pd.DataFrame:
+    """
+    Correlation of every swept indicator with daily returns.
+    
+    Returns:
+    --------
+    pd.DataFrame
+        One row per indicator and one column per window length
+    """
+    windows = list(windows)
+    returns = compute_indicators(df, ['Daily_Return'])['Daily_Return'].to_numpy()
+    grid = pd.DataFrame(index=pd.Index(list(indicators), name='indicator'), columns=pd.Index(windows, name='window'), dtype=np.float64)
+    for indicator in grid.index:
+        block = sweep_indicator(df, indicator, windows).to_numpy()
+        grid.loc[indicator] = correlate_with_returns(returns, [block[:, column] for column in range(len(windows))])
+    return grid
+
+def parse_windows(text: str) -> List[int]:
+    """Parse a comma separated list of window lengths, e.g. "5, 10, 20" or "10-50:10" ranges"""
+    windows = []
+    for part in filter(None, (part.strip() for part in text.split(','))):
+        if '-' in part:
+            bounds, _, step = part.partition(':')
+            low, high = (int(bound) for bound in bounds.split('-', 1))
+            windows.extend(range(low, high + 1, int(step) if step else 1))
+        else:
+            windows.append(int(part))
+    return sorted(set(windows))
+
+# Streaming indicators
+# O(1)-per-bar counterparts of INDICATOR_RECIPES for live updates and
+# recursive forecasting; fed bar by bar they reproduce compute_indicators.
+class RollingWindow:
+    """
+    Ring buffer over the last `window` values with running mean and sample std.
     
-    # Add processed close price
-    fig.add_trace(go.Scatter(
-        x=processed_df.index if isinstance(processed_df.index, pd.DatetimeIndex) else processed_df['date'],
-        y=processed_df['close'],
-        name='Processed Close Price',
-        line=dict(color='green', width=1)
-    ))
+    Sums are kept around a shift (a value in the window) so they stay small, and
+    are recomputed from the buffer once per `window` updates so rounding
+    cannot build up; each update is amortised O(1). Like pandas, a window
+    holding any NaN has no statistics.
     
-    # Update layout
-    fig.update_layout(
-        title='Comparison of Close Prices Before and After Preprocessing',
-        yaxis_title='Price',
-        template='plotly_dark',
-        showlegend=True
-    )
+    Parameters:
+    -----------
+    window : int
+        Number of most recent values covered
+    min_periods : int, optional
+        Values needed before statistics are given; `window` by default
+    """
+    __slots__ = ('window', 'min_periods', '_buffer', '_position', '_count', '_nan_count',
+                 '_shift', '_sum', '_sum_squares', '_since_refresh')
+    
+    def __init__(self, window: int, min_periods: Optional[int] = None):
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self._buffer = [np.nan] * window
+        self._position = self._count = self._nan_count = self._since_refresh = 0
+        self._shift = self._sum = self._sum_squares = 0.0
+    
+    def update(self, value: float) -> None:
+        """Push one value, dropping the oldest once the window is full"""
+        value = float(value)
+        if self._count == self.window:
+            old = self._buffer[self._position]
+            if old != old:
+                self._nan_count -= 1
+            else:
+                old -= self._shift
+                self._sum -= old
+                self._sum_squares -= old * old
+        else:
+            self._count += 1
+        self._buffer[self._position] = value
+        self._position = (self._position + 1) % self.window
+        
+        if value != value:
+            self._nan_count += 1
+        else:
+            value -= self._shift
+            self._sum += value
+            self._sum_squares += value * value
+        self._since_refresh += 1
+        if self._since_refresh >= self.window:
+            self._refresh()
+    
+    def _refresh(self) -> None:
+        """Recompute the sums exactly around the latest valid value"""
+        valid = [value for value in self._buffer[:self._count] if value == value]
+        self._shift = valid[-1] if valid else 0.0
+        deviations = [value - self._shift for value in valid]
+        self._sum = math.fsum(deviations)
+        self._sum_squares = math.fsum(d * d for d in deviations)
+        self._since_refresh = 0
+    
+    @property
+    def ready(self) -> bool:
+        """Whether the window holds enough values and no NaN"""
+        return self._count >= max(self.min_periods, 1) and self._nan_count == 0
+    
+    @property
+    def mean(self) -> float:
+        return self._shift + self._sum / self._count if self.ready else np.nan
+    
+    @property
+    def std(self) -> float:
+        n = self._count
+        if not self.ready or n < 2:
+            return np.nan
+        return math.sqrt(max(self._sum_squares - self._sum * self._sum / n, 0.0) / (n - 1))
+
+class StreamingEMA:
+    """
+    Exponential moving average matching pandas ewm(span, adjust=False).mean().
     
-    st.plotly_chart(fig, use_container_width=True)
+    Follows pandas' recurrence, including how the weight of the running
+    average decays across NaN inputs.
+    """
+    __slots__ = ('alpha', 'value', '_old_weight')
+    
+    def __init__(self, span: int):
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = np.nan
+        self._old_weight = 1.0
+    
+    def update(self, x: float) -> float:
+        x = float(x)
+        if self.value != self.value:
+            if x == x:
+                self.value = x
+            return self.value
+        self._old_weight *= 1.0 - self.alpha
+        if x == x:
+            if self.value != x:
+                self.value = (self._old_weight * self.value + self.alpha * x) / (self._old_weight + self.alpha)
+            self._old_weight = 1.0
+        return self.value
 
-def calculate_technical_indicators(df):
-    """Calculate various technical indicators for stock data"""
-    df = df.copy()
-    
-    # Moving Averages
-    df['SMA_20'] = df['close'].rolling(window=20).mean()
-    df['SMA_50'] = df['close'].rolling(window=50).mean()
-    df['EMA_20'] = df['close'].ewm(span=20, adjust=False).mean()
-    
-    # Bollinger Bands
-    df['BB_middle'] = df['close'].rolling(window=20).mean()
-    df['BB_upper'] = df['BB_middle'] + 2 * df['close'].rolling(window=20).std()
-    df['BB_lower'] = df['BB_middle'] - 2 * df['close'].rolling(window=20).std()
-    
-    # RSI
-    delta = df['close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    df['RSI'] = 100 - (100 / (1 + rs))
-    
-    # MACD
-    exp1 = df['close'].ewm(span=12, adjust=False).mean()
-    exp2 = df['close'].ewm(span=26, adjust=False).mean()
-    df['MACD'] = exp1 - exp2
-    df['Signal_Line'] = df['MACD'].ewm(span=9, adjust=False).mean()
-    
-    # Calculate daily returns
-    df['Daily_Return'] = df['close'].pct_change()
-    
-    # Calculate correlations with daily returns
-    correlations = {}
-    technical_indicators = ['SMA_20', 'SMA_50', 'EMA_20', 'RSI', 'MACD']
-    for indicator in technical_indicators:
-        correlations[indicator] = df['Daily_Return'].corr(df[indicator].fillna(0))
+class StreamingRSI:
+    """Relative strength index over rolling mean gains and losses of close-to-close changes"""
+    __slots__ = ('_previous', '_gains', '_losses')
+    
+    def __init__(self, period: int = 14, min_periods: Optional[int] = None):
+        self._previous = np.nan
+        self._gains = RollingWindow(period, min_periods)
+        self._losses = RollingWindow(period, min_periods)
+    
+    def update(self, close: float) -> float:
+        delta = close - self._previous
+        self._previous = close
+        # A missing change counts as neither gain nor loss, as in the batch recipe
+        self._gains.update(delta if delta > 0 else 0.0)
+        self._losses.update(-delta if delta < 0 else 0.0)
+        gain, loss = self._gains.mean, self._losses.mean
+        if loss == 0.0:
+            rs = math.inf if gain > 0 else np.nan
+        else:
+            rs = gain / loss
+        return 100.0 - 100.0 / (1.0 + rs)
+
+class StreamingMACD:
+    """MACD line (fast EMA minus slow EMA) and its signal EMA"""
+    __slots__ = ('_fast', '_slow', '_signal')
+    
+    def __init__(self, fast: int = 12, slow: int = 26, signal_span: int = 9):
+        self._fast = StreamingEMA(fast)
+        self._slow = StreamingEMA(slow)
+        self._signal = StreamingEMA(signal_span)
+    
+    def update(self, close: float) -> Tuple[float, float]:
+        macd = self._fast.update(close) - self._slow.update(close)
+        return macd, self._signal.update(macd)
+
+class StreamingIndicators:
+    """
+    Every indicator in INDICATOR_RECIPES, updated in O(1) per closing price.
     
-    return df, correlations
+    The 20-bar window is shared by SMA_20 and the Bollinger bands, as in the
+    batch plan. Feeding a series bar by bar gives the same values as
+    compute_indicators on it, to rounding.
+    
+    Parameters:
+    -----------
+    min_periods : int, optional
+        Values needed by the rolling windows before they report; each
+        window's length by default (as in the batch recipes)
+    """
+    __slots__ = ('_window_20', '_window_50', '_ema_20', '_rsi', '_macd', '_previous')
+    
+    def __init__(self, min_periods: Optional[int] = None):
+        self._window_20 = RollingWindow(20, min_periods)
+        self._window_50 = RollingWindow(50, min_periods)
+        self._ema_20 = StreamingEMA(20)
+        self._rsi = StreamingRSI(14, min_periods)
+        self._macd = StreamingMACD()
+        self._previous = np.nan
+    
+    def update(self, close: float) -> Dict[str, float]:
+        """Add one closing price and return the indicators at that bar"""
+        close = float(close)
+        self._window_20.update(close)
+        self._window_50.update(close)
+        sma_20, std_20 = self._window_20.mean, self._window_20.std
+        macd, signal_line = self._macd.update(close)
+        # Returns carry the last price across gaps, like pandas' pct_change
+        current = close if close == close else self._previous
+        previous, self._previous = self._previous, current
+        if previous != previous or current != current:
+            daily_return = np.nan
+        elif previous == 0.0:
+            daily_return = math.copysign(math.inf, current) if current else np.nan
+        else:
+            daily_return = current / previous - 1.0
+        return {
+            'SMA_20': sma_20,
+            'SMA_50': self._window_50.mean,
+            'EMA_20': self._ema_20.update(close),
+            'BB_middle': sma_20,
+            'BB_upper': sma_20 + 2.0 * std_20,
+            'BB_lower': sma_20 - 2.0 * std_20,
+            'RSI': self._rsi.update(close),
+            'MACD': macd,
+            'Signal_Line': signal_line,
+            'Daily_Return': daily_return
+        }
+    
+    def update_many(self, closes: Iterable[float]) -> pd.DataFrame:
+        """Add several closing prices and return one row of indicators per price"""
+        return pd.DataFrame([self.update(close) for close in closes], columns=list(INDICATOR_RECIPES))
 
 def display_technical_indicators(df, correlations):
     """Display technical indicators with interactive plots"""
@@ -1051,11 +4110,46 @@ def display_technical_indicators(df, correlations):
     )
     st.plotly_chart(fig_corr, use_container_width=True)
     
+    # The same correlations across a grid of window lengths
+    with st.expander("Parameter Sweep"):
+        sweep_indicators = st.multiselect("Indicators", SWEEP_INDICATORS, default=SWEEP_INDICATORS, key='sweep_indicators')
+        windows_text = st.text_input(
+            "Window lengths (comma separated, ranges as start-stop:step)",
+            value=", ".join(str(window) for window in DEFAULT_SWEEP_WINDOWS),
+            key='sweep_windows'
+        )
+        if st.checkbox("Run sweep", key='run_sweep'):
+            try:
+                windows = parse_windows(windows_text)
+                grid = sweep_correlations(df, windows, sweep_indicators) if windows and sweep_indicators else None
+            except ValueError as e:
+                st.error(f"Error running sweep: {str(e)}")
+            else:
+                if grid is None:
+                    st.warning("Please choose at least one indicator and one window length.")
+                else:
+                    fig_grid = go.Figure(go.Heatmap(
+                        z=grid.to_numpy(),
+                        x=[str(window) for window in grid.columns],
+                        y=list(grid.index),
+                        colorscale='RdBu',
+                        zmid=0,
+                        colorbar=dict(title='Correlation')
+                    ))
+                    fig_grid.update_layout(
+                        title='Correlation with Daily Returns by Window Length',
+                        template='plotly_dark',
+                        xaxis_title='Window',
+                        yaxis_title='Indicator'
+                    )
+                    st.plotly_chart(fig_grid, use_container_width=True)
+                    st.dataframe(grid.style.format("{:.4f}"))
+    
     # Display the technical indicators data
     with st.expander("View Technical Indicators Data"):
         st.dataframe(df.tail(50))
 
-def split_and_visualize_data(df, test_size=0.2, random_state=42):
+def split_and_visualize_data(df, test_size=0.2, random_state=42, custom_features: Iterable[str] = ()):
     """
     Split the dataset into training and testing sets and visualize the split.
     
@@ -1067,6 +4161,8 @@ def split_and_visualize_data(df, test_size=0.2, random_state=42):
         The proportion of the dataset to include in the test split
     random_state : int
         Random state for reproducibility
+    custom_features : Iterable[str]
+        Names of custom indicator columns to use as features
     
     Returns:
     --------
@@ -1075,20 +4171,16 @@ def split_and_visualize_data(df, test_size=0.2, random_state=42):
     """
     
     # Prepare features and target
-    # Use all available technical indicators as features
-    feature_columns = ['open', 'high', 'low', 'close', 'volume']
-    
-    # Add technical indicators if they exist
-    technical_indicators = ['SMA_20', 'SMA_50', 'EMA_20', 'RSI', 'MACD']
-    for indicator in technical_indicators:
-        if indicator in df.columns:
-            feature_columns.append(indicator)
+    # Use the price columns and all available technical indicators as features,
+    # plus technical indicators and custom features if they exist
+    feature_columns = model_feature_columns(df, custom_features)
     
-    # Remove any NaN values that might have been created by technical indicators
-    df_clean = df.dropna()
+    # Remove any rows with NaN values that might have been created by
+    # technical indicators, copying only the feature columns
+    df_clean = df.loc[df.notna().all(axis=1).to_numpy(), feature_columns]
     
     # Prepare features (X) and target (y)
-    X = df_clean[feature_columns]
+    X = df_clean
     # Use next day's closing price as target
     y = df_clean['close'].shift(-1)[:-1]
     X = X[:-1]  # Remove the last row as we don't have tomorrow's price for it
@@ -1621,10 +4713,7 @@ def create_download_dataframe(df, y_test, predictions, future_predictions=None,
         
         # Add future predictions if available
         if future_predictions is not None:
-            future_dates = pd.date_range(
-                start=dates[-1] + pd.Timedelta(days=1),
-                periods=len(future_predictions)
-            )
+            future_dates = future_bar_index(pd.DatetimeIndex(dates), len(future_predictions))
             
             future_df = pd.DataFrame({
                 'Date': future_dates,
@@ -1746,13 +4835,7 @@ def visualize_predictions(df, y_test, predictions, future_predictions=None, mode
         # Plot future predictions if available
         if future_predictions is not None:
             # Generate future dates
-            last_date = dates[-1]
-            if isinstance(last_date, pd.Timestamp):
-                future_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), 
-                                          periods=len(future_predictions))
-            else:
-                future_dates = pd.date_range(start=pd.Timestamp(last_date) + pd.Timedelta(days=1), 
-                                          periods=len(future_predictions))
+            future_dates = future_bar_index(pd.DatetimeIndex(dates), len(future_predictions))
             
             fig.add_trace(
                 go.Scatter(
@@ -1856,10 +4939,14 @@ def visualize_predictions(df, y_test, predictions, future_predictions=None, mode
         
         return fig, stats
 
-def predict_future_prices(model, scaler, last_window, n_steps=30):
+def predict_future_prices(model, scaler, last_window, n_steps=30, custom_recipes: Optional[Dict[str, Tuple]] = None):
     """
     Predict future stock prices using the trained model.
     
+    Multi-timeframe features are joined from the window extended by the
+    predicted bars, so last_window must then be indexed by date and long
+    enough for their weekly or monthly bars to have warmed up.
+    
     Parameters:
     -----------
     model : sklearn model
@@ -1870,80 +4957,90 @@ def predict_future_prices(model, scaler, last_window, n_steps=30):
         Last window of data used for prediction
     n_steps : int
         Number of future steps to predict
+    custom_recipes : Dict[str, Tuple], optional
+        Compiled custom indicators the model was trained on
     
     Returns:
     --------
     array-like : Predicted future prices
     """
     future_predictions = []
-    current_window = last_window.copy()
-    
-    # Calculate technical indicators for the initial window
-    def calculate_window_indicators(window_df):
-        # Calculate SMA
-        window_df['SMA_20'] = window_df['close'].rolling(window=20, min_periods=1).mean()
-        window_df['SMA_50'] = window_df['close'].rolling(window=50, min_periods=1).mean()
-        
-        # Calculate EMA
-        window_df['EMA_20'] = window_df['close'].ewm(span=20, adjust=False, min_periods=1).mean()
-        
-        # Calculate RSI
-        delta = window_df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14, min_periods=1).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14, min_periods=1).mean()
-        rs = gain / loss
-        window_df['RSI'] = 100 - (100 / (1 + rs))
-        
-        # Calculate MACD
-        exp1 = window_df['close'].ewm(span=12, adjust=False, min_periods=1).mean()
-        exp2 = window_df['close'].ewm(span=26, adjust=False, min_periods=1).mean()
-        window_df['MACD'] = exp1 - exp2
-        
-        return window_df
+    current_window = last_window
     
-    # Ensure current_window is a DataFrame with datetime index
+    # Ensure current_window is a DataFrame
     if not isinstance(current_window, pd.DataFrame):
         current_window = pd.DataFrame(current_window)
     
+    # Indicator state is seeded from the window once and then advanced one
+    # predicted bar at a time, instead of recomputing every indicator over
+    # the whole window for each step; short windows report partial
+    # averages (min_periods=1)
+    indicators = StreamingIndicators(min_periods=1)
+    for close in current_window['close'].to_numpy(dtype=np.float64):
+        latest = indicators.update(close)
+    volumes = RollingWindow(len(current_window), min_periods=1)
+    for volume in current_window['volume'].to_numpy(dtype=np.float64):
+        volumes.update(volume)
+    last_bar = current_window.iloc[-1]
+    
+    # The features the model was trained on, in training order
+    required_features = list(getattr(scaler, 'feature_names_in_', MODEL_FEATURES))
+    custom_recipes = custom_recipes or {}
+    custom_features = [feature for feature in required_features if feature in custom_recipes]
+    timeframe_columns = set(required_features).intersection(timeframe_feature_names(TIMEFRAMES))
+    timeframes = [timeframe for timeframe in TIMEFRAMES if timeframe_columns.intersection(timeframe_feature_names([timeframe]))]
+    lagged = [(feature, column, int(lag)) for feature in required_features if '_lag_' in feature
+              for column, lag in [feature.rsplit('_lag_', 1)] if column in LAG_FEATURES and lag.isdigit()]
+    if custom_features or timeframes or lagged:
+        # Custom, multi-timeframe and lagged features are re-evaluated over the
+        # window extended by the predicted bars, one vectorised pass per step
+        history = np.empty((len(current_window) + n_steps, len(EXPRESSION_COLUMNS)))
+        history[:len(current_window)] = current_window[EXPRESSION_COLUMNS].to_numpy(dtype=np.float64)
+        filled = len(current_window)
+        dates = current_window.index.append(future_bar_index(current_window.index, n_steps)) if timeframes else None
+    row = {feature: last_bar[feature] for feature in EXPRESSION_COLUMNS}
+    
     for _ in range(n_steps):
-        # Calculate technical indicators for current window
-        window_with_indicators = calculate_window_indicators(current_window)
-        
-        # Get the last row with all features
-        last_row = window_with_indicators.iloc[-1:]
-        
-        # Ensure all required features are present
-        required_features = ['open', 'high', 'low', 'close', 'volume', 
-                           'SMA_20', 'SMA_50', 'EMA_20', 'RSI', 'MACD']
+        row.update((feature, latest[feature]) for feature in required_features if feature in latest)
+        if custom_features or timeframes or lagged:
+            bars = pd.DataFrame(history[:filled], columns=EXPRESSION_COLUMNS, index=dates[:filled] if timeframes else None)
+        if lagged:
+            bars['Daily_Return'] = bars['close'].pct_change()
+            row.update((feature, bars[column].iat[-1 - lag]) for feature, column, lag in lagged)
+        if custom_features:
+            row.update(compute_indicators(bars, custom_features, custom_recipes).iloc[-1].items())
+        if timeframes:
+            row.update(timeframe_features(bars, timeframes).iloc[-1].items())
         
         # Scale the features
-        scaled_features = scaler.transform(last_row[required_features])
+        scaled_features = scaler.transform(pd.DataFrame([row], columns=required_features))
         
         # Make prediction
         prediction = model.predict(scaled_features)
         future_predictions.append(prediction[0])
         
-        # Create new row with predicted close price
-        new_row = pd.DataFrame({
-            'open': [prediction[0]],  # Use prediction as next open
-            'high': [prediction[0]],  # Initialize with prediction
-            'low': [prediction[0]],   # Initialize with prediction
-            'close': [prediction[0]], # Use prediction as close
-            'volume': [current_window['volume'].mean()]  # Use mean volume
-        }, index=[current_window.index[-1] + pd.Timedelta(days=1)])
-        
-        # Update the window by removing oldest row and adding new row
-        current_window = pd.concat([current_window[1:], new_row])
+        # The next bar opens, trades and closes at the predicted price with
+        # the mean volume of the window it slides over
+        volume = volumes.mean
+        row = {'open': prediction[0], 'high': prediction[0], 'low': prediction[0], 'close': prediction[0], 'volume': volume}
+        volumes.update(volume)
+        latest = indicators.update(prediction[0])
+        if custom_features or timeframes or lagged:
+            history[filled] = [row[column] for column in EXPRESSION_COLUMNS]
+            filled += 1
     
     return np.array(future_predictions)
 
+MODEL_TYPES = ["Linear Regression", "Logistic Regression", "K-Means Clustering"]
+
 def display_model_selection():
     """Display model selection options in the sidebar"""
     st.sidebar.markdown("### Model Configuration")
     
     model_type = st.sidebar.selectbox(
         "Select Model Type",
-        ["Linear Regression", "Logistic Regression", "K-Means Clustering"],
+        MODEL_TYPES,
+        index=MODEL_TYPES.index(st.session_state.get('model_config', {}).get('type', MODEL_TYPES[0])),
         help="Choose the type of machine learning model to train"
     )
     
@@ -1953,31 +5050,31 @@ def display_model_selection():
     if model_type == "Linear Regression":
         params['fit_intercept'] = st.sidebar.checkbox(
             "Fit Intercept",
-            value=True,
+            value=saved_model_param(model_type, 'fit_intercept', True),
             help="Whether to calculate the intercept for this model"
         )
         
     elif model_type == "Logistic Regression":
         params['C'] = st.sidebar.slider(
             "Regularization (C)",
-            0.01, 10.0, 1.0,
+            0.01, 10.0, float(saved_model_param(model_type, 'C', 1.0)),
             help="Inverse of regularization strength"
         )
         params['max_iter'] = st.sidebar.slider(
             "Maximum Iterations",
-            100, 1000, 200,
+            100, 1000, int(saved_model_param(model_type, 'max_iter', 200)),
             help="Maximum number of iterations for solver"
         )
         
     else:  # K-Means Clustering
         params['n_clusters'] = st.sidebar.slider(
             "Number of Clusters",
-            2, 10, 5,
+            2, 10, int(saved_model_param(model_type, 'n_clusters', 5)),
             help="Number of clusters to form"
         )
         params['n_init'] = st.sidebar.slider(
             "Number of Initializations",
-            5, 20, 10,
+            5, 20, int(saved_model_param(model_type, 'n_init', 10)),
             help="Number of times to run k-means with different centroid seeds"
         )
     
@@ -2002,24 +5099,19 @@ def create_model(model_type, params):
             random_state=42
         )
 
-def prepare_data_for_model(df, model_type):
+def prepare_data_for_model(df, model_type, custom_features: Iterable[str] = ()):
     """Prepare features and target based on model type"""
-    # Common feature columns
-    feature_columns = ['open', 'high', 'low', 'close', 'volume']
-    
-    # Add technical indicators if they exist
-    technical_indicators = ['SMA_20', 'SMA_50', 'EMA_20', 'RSI', 'MACD']
-    for indicator in technical_indicators:
-        if indicator in df.columns:
-            feature_columns.append(indicator)
+    # Common feature columns,
+    # plus technical indicators and custom features if they exist
+    feature_columns = model_feature_columns(df, custom_features)
     
-    # Remove any NaN values
-    df_clean = df.dropna()
+    # Remove any rows with NaN values, copying only the feature columns
+    df_clean = df.loc[df.notna().all(axis=1).to_numpy(), feature_columns]
     
     if model_type == "Linear Regression":
         # Predict next day's closing price
         y = df_clean['close'].shift(-1)  # Next day's price
-        X = df_clean[feature_columns]
+        X = df_clean
         # Remove the last row since we don't have next day's price for it
         X = X[:-1]
         y = y[:-1]  # Remove the last NaN value from target
@@ -2027,18 +5119,521 @@ def prepare_data_for_model(df, model_type):
     elif model_type == "Logistic Regression":
         # Predict price direction (up/down)
         y = (df_clean['close'].shift(-1) > df_clean['close'])  # Next day's direction
-        X = df_clean[feature_columns]
+        X = df_clean
         # Remove the last row since we don't have next day's direction for it
         X = X[:-1]
         y = y[:-1].astype(int)  # Remove the last NaN value and convert to int
         
     else:  # K-Means Clustering
         # No target needed for clustering
-        X = df_clean[feature_columns]
+        X = df_clean
         y = None
     
     return X, y
 
+# Lagged-window features
+# The previous N bars of a few columns as extra model inputs, held as
+# stride-tricks windows over one small array instead of N shifted columns
+LAG_FEATURES = ['close', 'Daily_Return', 'volume']
+LAGGED_BATCH_ROWS = 1 << 12   # Samples per mini-batch streamed by LaggedFeatures.batches
+
+def lagged_windows(values: np.ndarray, lags: int) -> np.ndarray:
+    """
+    Read-only (rows - lags + 1) x lags x columns view of a 2-D array, where
+    window i holds rows i to i + lags - 1, oldest first. Nothing is copied.
+    """
+    return np.lib.stride_tricks.sliding_window_view(values, lags, axis=0).transpose(0, 2, 1)
+
+def lagged_feature_names(columns: Iterable[str], lags: int) -> List[str]:
+    """Names of the flattened window columns, e.g. 'close_lag_2', in window order"""
+    columns = list(columns)
+    return [f"{column}_lag_{lag}" for lag in range(lags, 0, -1) for column in columns]
+
+class LaggedFeatures:
+    """
+    Model inputs extended with the previous `lags` bars of a few columns.
+    
+    The lagged values are never laid out as columns: `windows` is a
+    (samples x lags x features) view over one small array of the source
+    columns, so a 250-bar window costs no more memory than a 1-bar one.
+    Contiguous rows are only built when a model needs them, for a range of
+    samples by matrix() or frame(), or a mini-batch at a time by batches().
+    
+    Parameters:
+    -----------
+    X : pd.DataFrame
+        Current-bar features, one row per sample
+    y : pd.Series or None
+        Targets aligned with X; None for clustering
+    windows : np.ndarray
+        (samples x lags x features) windows aligned with X; row i holds the
+        bars before X's row i, oldest first
+    lag_columns : List[str]
+        Source column of each window feature
+    """
+    
+    def __init__(self, X: pd.DataFrame, y: Optional[pd.Series], windows: np.ndarray, lag_columns: List[str]):
+        self.X = X
+        self.y = y
+        self.windows = windows
+        self.lag_columns = list(lag_columns)
+    
+    def __len__(self) -> int:
+        return len(self.X)
+    
+    @property
+    def lags(self) -> int:
+        return self.windows.shape[1]
+    
+    @property
+    def feature_names(self) -> List[str]:
+        return list(self.X.columns) + lagged_feature_names(self.lag_columns, self.lags)
+    
+    def matrix(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Contiguous float64 rows of samples start:stop, current features first"""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        n_current = self.X.shape[1]
+        out = np.empty((stop - start, n_current + self.lags * len(self.lag_columns)))
+        out[:, :n_current] = self.X.iloc[start:stop].to_numpy(dtype=np.float64)
+        # Splitting the trailing axis of a row slice is always a view, so the
+        # windows are copied straight into place
+        out[:, n_current:].reshape(stop - start, self.lags, len(self.lag_columns))[:] = self.windows[start:stop]
+        return out
+    
+    def frame(self, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        """matrix(start, stop) as a DataFrame with the feature names, without a further copy"""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        return pd.DataFrame(self.matrix(start, stop), index=self.X.index[start:stop], columns=self.feature_names, copy=False)
+    
+    def batches(self, batch_size: int = LAGGED_BATCH_ROWS, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[pd.DataFrame, Optional[pd.Series]]]:
+        """
+        Stream samples start:stop as (features, targets) mini-batches.
+        
+        Only one batch is materialised at a time, for incremental learners
+        (partial_fit) or batched prediction on histories too long to lay out.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        for begin in range(start, stop, batch_size):
+            end = min(begin + batch_size, stop)
+            yield self.frame(begin, end), None if self.y is None else self.y.iloc[begin:end]
+
+def prepare_lagged_data(df: pd.DataFrame, model_type: str, lags: int, custom_features: Iterable[str] = (), lag_features: Iterable[str] = LAG_FEATURES) -> LaggedFeatures:
+    """
+    Prepare features and target as prepare_data_for_model does, plus windows
+    of the previous `lags` bars of lag_features.
+    
+    Samples whose window would reach before the start of the data or over
+    a gap are dropped.
+    
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Bars with the model features, e.g. from calculate_technical_indicators
+    model_type : str
+        As for prepare_data_for_model
+    lags : int
+        Bars of history in each window
+    custom_features : Iterable[str]
+        Names of custom indicator columns to use as features
+    lag_features : Iterable[str]
+        Columns to take windows of; those missing from df are skipped
+        
+    Returns:
+    --------
+    LaggedFeatures
+        The samples, with zero-copy windows
+    """
+    if lags < 1:
+        raise ValueError("lags must be at least 1")
+    X, y = prepare_data_for_model(df, model_type, custom_features)
+    lag_columns = [column for column in lag_features if column in df.columns]
+    values = df[lag_columns].to_numpy(dtype=np.float64)
+    
+    # prepare_data_for_model keeps the complete rows, in order
+    positions = np.flatnonzero(df.notna().all(axis=1).to_numpy())[:len(X)]
+    gaps_before = np.r_[0, np.cumsum(np.isnan(values).any(axis=1))]
+    usable = (positions >= lags) & (gaps_before[positions] == gaps_before[np.maximum(positions - lags, 0)])
+    
+    first = int(np.argmax(usable)) if usable.any() else len(usable)
+    keep = slice(first, None) if usable[first:].all() else usable
+    X, y = X.iloc[keep], None if y is None else y.iloc[keep]
+    
+    # In the usual case the samples are consecutive bars after the warm-up,
+    # and their windows are a slice of the view rather than a gathered copy
+    rows = positions[keep] - lags
+    windows = lagged_windows(values, lags)
+    if len(rows) and rows[-1] - rows[0] == len(rows) - 1:
+        windows = windows[rows[0]:rows[-1] + 1]
+    else:
+        windows = windows[rows]
+    return LaggedFeatures(X, y, windows, lag_columns)
+
+# Walk-forward cross-validation
+# Every fold trains on the past and tests on the bars that follow it, on all
+# history so far (expanding) or a fixed-length window (rolling); an embargo
+# leaves a gap between the two so targets spanning the boundary cannot leak
+WALK_FORWARD_MODES = ['expanding', 'rolling']
+WALK_FORWARD_MAX_WORKERS = os.cpu_count() or 1
+
+def walk_forward_splits(n_samples: int, train_size: int, test_size: int, step: Optional[int] = None, embargo: int = 0, mode: str = 'expanding') -> np.ndarray:
+    """
+    Bounds of the walk-forward folds over n_samples chronological samples.
+    
+    Parameters:
+    -----------
+    n_samples : int
+        Number of samples
+    train_size : int
+        Training samples of the first fold, and of every fold when rolling
+    test_size : int
+        Test samples of every fold
+    step : int, optional
+        Samples each fold advances by; test_size (back-to-back test
+        windows) by default
+    embargo : int
+        Samples skipped between the end of training and the start of testing
+    mode : str
+        'expanding' or 'rolling'
+        
+    Returns:
+    --------
+    np.ndarray
+        (folds x 4) integer array of train_start, train_end, test_start and
+        test_end, with the ends exclusive
+    """
+    step = test_size if step is None else step
+    if mode not in WALK_FORWARD_MODES:
+        raise ValueError(f"Unknown walk-forward mode '{mode}'")
+    if min(train_size, test_size, step) < 1 or embargo < 0:
+        raise ValueError("Training, test and step sizes must be positive and the embargo non-negative")
+    
+    test_start = np.arange(train_size + embargo, n_samples - test_size + 1, step)
+    train_end = test_start - embargo
+    train_start = np.zeros_like(train_end) if mode == 'expanding' else train_end - train_size
+    return np.column_stack([train_start, train_end, test_start, test_start + test_size])
+
+def fold_metrics(model_type: str, y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
+    """The metrics evaluate_regression_model / evaluate_classification_model report, without the charts"""
+    if model_type == "Linear Regression":
+        return {
+            'R²': r2_score(y_true, y_pred),
+            'RMSE': float(np.sqrt(mean_squared_error(y_true, y_pred))),
+            'MAE': mean_absolute_error(y_true, y_pred)
+        }
+    return {
+        'Accuracy': accuracy_score(y_true, y_pred),
+        'Precision': precision_score(y_true, y_pred, zero_division=0),
+        'Recall': recall_score(y_true, y_pred, zero_division=0),
+        'F1 Score': f1_score(y_true, y_pred, zero_division=0)
+    }
+
+def _evaluate_fold(X: np.ndarray, y: np.ndarray, fold: int, bounds: Tuple[int, int, int, int], model_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Scale, fit and score one fold; the slices of X and y are views"""
+    train_start, train_end, test_start, test_end = bounds
+    started = time.perf_counter()
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X[train_start:train_end])
+    X_test = scaler.transform(X[test_start:test_end])
+    model = create_model(model_type, params)
+    model.fit(X_train, y[train_start:train_end])
+    
+    result = {'Fold': fold + 1, 'Train Rows': train_end - train_start, 'Test Start': test_start}
+    result.update(fold_metrics(model_type, y[test_start:test_end], model.predict(X_test)))
+    result['Seconds'] = time.perf_counter() - started
+    return result
+
+# Each worker process receives the samples once, when it starts, instead of
+# with every fold or candidate it is sent
+_WORKER_DATA: Dict[str, Optional[np.ndarray]] = {}
+# Workers are not forked from the multithreaded Streamlit server, where a lock
+# held by another thread at fork time would stay locked in the child forever
+MODEL_WORKER_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+def _init_model_worker(X: np.ndarray, y: Optional[np.ndarray]) -> None:
+    _WORKER_DATA.update(X=X, y=y)
+    # One BLAS thread per process, so the workers don't oversubscribe the cores
+    threadpool_limits(1)
+
+def _evaluate_fold_in_worker(fold: int, bounds: Tuple[int, int, int, int], model_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    return _evaluate_fold(_WORKER_DATA['X'], _WORKER_DATA['y'], fold, bounds, model_type, params)
+
+def walk_forward_evaluate(X, y, model_type: str, params: Dict[str, Any], splits: np.ndarray, max_workers: int = WALK_FORWARD_MAX_WORKERS) -> Iterator[Dict[str, Any]]:
+    """
+    Evaluate a model configuration on every walk-forward fold.
+    
+    Folds run in parallel on a process pool and each result is yielded as
+    soon as its fold finishes, so callers can report progress while the
+    slower folds are still training. With one worker (or one fold) they run
+    in this process instead.
+    
+    Parameters:
+    -----------
+    X : pd.DataFrame, np.ndarray or LaggedFeatures
+        Chronological features, e.g. from prepare_data_for_model
+    y : array-like
+        Targets aligned with X
+    model_type : str
+        "Linear Regression" or "Logistic Regression"
+    params : Dict[str, Any]
+        Model parameters, as for create_model
+    splits : np.ndarray
+        Fold bounds from walk_forward_splits
+    max_workers : int
+        Worker processes to use at most
+        
+    Returns:
+    --------
+    Iterator[Dict[str, Any]]
+        One row per fold (fold number, training rows, test start, metrics
+        and seconds taken), in order of completion
+    """
+    X = X.matrix() if isinstance(X, LaggedFeatures) else np.ascontiguousarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    splits = [tuple(int(bound) for bound in bounds) for bounds in splits]
+    workers = min(max_workers, len(splits))
+    if workers <= 1:
+        for fold, bounds in enumerate(splits):
+            yield _evaluate_fold(X, y, fold, bounds, model_type, params)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers, mp_context=MODEL_WORKER_CONTEXT, initializer=_init_model_worker, initargs=(X, y)) as executor:
+        futures = [executor.submit(_evaluate_fold_in_worker, fold, bounds, model_type, params) for fold, bounds in enumerate(splits)]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # Stop queued folds if the caller stops early or a fold fails
+            for future in futures:
+                future.cancel()
+
+def display_walk_forward(X, y, model_type: str, params: Dict[str, Any]):
+    """Walk-forward validation of the current configuration, with per-fold metrics streamed in as folds finish"""
+    with st.expander("Walk-Forward Validation"):
+        n_samples = len(X)
+        mode = st.radio("Training Window", [mode.title() for mode in WALK_FORWARD_MODES], horizontal=True,
+                        help="Expanding trains each fold on all earlier bars, rolling on a fixed number of them").lower()
+        col1, col2, col3, col4 = st.columns(4)
+        train_size = col1.number_input("Training Bars", min_value=10, max_value=max(10, n_samples), value=max(10, n_samples // 2))
+        test_size = col2.number_input("Test Bars", min_value=1, max_value=max(1, n_samples), value=max(1, min(21, n_samples // 10)))
+        step = col3.number_input("Step", min_value=1, max_value=max(1, n_samples), value=int(test_size))
+        embargo = col4.number_input("Embargo", min_value=0, max_value=max(0, n_samples), value=0,
+                                    help="Bars left out between each fold's training and test data")
+        
+        if st.button("Run Walk-Forward Validation"):
+            splits = walk_forward_splits(n_samples, int(train_size), int(test_size), int(step), int(embargo), mode)
+            if len(splits) == 0:
+                st.warning("Not enough data for a single fold; reduce the training or test bars.")
+                return
+            
+            progress_bar = st.progress(0)
+            table = st.empty()
+            results = []
+            started = time.perf_counter()
+            try:
+                for result in walk_forward_evaluate(X, y, model_type, params, splits):
+                    results.append(result)
+                    progress_bar.progress(len(results) / len(splits))
+                    table.dataframe(pd.DataFrame(results).sort_values('Fold').set_index('Fold'))
+            except Exception as e:
+                st.error(f"Error during walk-forward validation: {str(e)}")
+                return
+            
+            results = pd.DataFrame(results).sort_values('Fold').set_index('Fold')
+            st.session_state['walk_forward_results'] = results
+            metric_columns = [column for column in results.columns if column not in ('Train Rows', 'Test Start', 'Seconds')]
+            st.success(f"Evaluated {len(results)} folds in {time.perf_counter() - started:.1f}s "
+                       f"(slowest fold {results['Seconds'].max():.1f}s)")
+            st.dataframe(results[metric_columns].agg(['mean', 'std', 'min', 'max']).T)
+            
+            fig = go.Figure()
+            for metric in metric_columns:
+                fig.add_trace(go.Scatter(x=results.index, y=results[metric], mode='lines+markers', name=metric))
+            fig.update_layout(
+                title='Walk-Forward Metrics by Fold',
+                template='plotly_dark',
+                xaxis_title='Fold',
+                yaxis_title='Value'
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+# Hyperparameter search
+# Successive halving: every candidate is trained on the most recent few
+# training rows, the best third go on with three times the rows, and so on
+# until the survivors are trained on all of them
+SEARCH_SPACE = {
+    "Linear Regression": {'fit_intercept': [True, False]},
+    "Logistic Regression": {'C': [0.01, 0.03, 0.1, 0.3, 1.0, 3.0, 10.0], 'max_iter': [100, 200, 500, 1000]},
+    "K-Means Clustering": {'n_clusters': list(range(2, 11)), 'n_init': [5, 10, 20]}
+}
+SEARCH_SCORES = {"Linear Regression": 'R²', "Logistic Regression": 'Accuracy', "K-Means Clustering": 'Silhouette'}
+SEARCH_MIN_ROWS = 50   # Training rows of the first round, at least
+SILHOUETTE_SAMPLE_ROWS = 2000   # Validation rows the clustering score is estimated on
+
+def search_candidates(model_type: str, n_candidates: Optional[int] = None, random_state: int = 42) -> List[Dict[str, Any]]:
+    """
+    Parameter settings to search: the whole SEARCH_SPACE grid, or
+    n_candidates random settings drawn from the same ranges as the sliders
+    in display_model_selection (C log-uniformly)
+    """
+    space = SEARCH_SPACE[model_type]
+    grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    if n_candidates is None or model_type == "Linear Regression":
+        return grid
+    
+    rng = np.random.default_rng(random_state)
+    if model_type == "Logistic Regression":
+        return [{'C': round(float(10 ** rng.uniform(-2, 1)), 2), 'max_iter': int(rng.integers(100, 1001))}
+                for _ in range(n_candidates)]
+    return [{'n_clusters': int(rng.integers(2, 11)), 'n_init': int(rng.integers(5, 21))} for _ in range(n_candidates)]
+
+def halving_budgets(n_candidates: int, n_rows: int, factor: int = 3, min_rows: int = SEARCH_MIN_ROWS) -> List[int]:
+    """Training rows of each successive-halving round, ending with all n_rows"""
+    rounds = 1 + max(0, math.ceil(math.log(max(n_candidates, 1), factor) - 1e-9))
+    budgets = [n_rows // factor ** (rounds - 1 - i) for i in range(rounds)]
+    return sorted({min(max(budget, min_rows), n_rows) for budget in budgets})
+
+def _score_candidate(X: np.ndarray, y: Optional[np.ndarray], candidate: int, params: Dict[str, Any], model_type: str, rows: int, train_end: int) -> Tuple[int, float]:
+    """Fit one setting on the last `rows` training rows and score it on the rows after train_end"""
+    model = create_model(model_type, params)
+    X_train, X_valid = X[train_end - rows:train_end], X[train_end:]
+    try:
+        if model_type == "K-Means Clustering":
+            labels = model.fit(X_train).predict(X_valid)
+            score = silhouette_score(X_valid, labels, sample_size=min(len(X_valid), SILHOUETTE_SAMPLE_ROWS), random_state=42)
+        else:
+            model.fit(X_train, y[train_end - rows:train_end])
+            score = fold_metrics(model_type, y[train_end:], model.predict(X_valid))[SEARCH_SCORES[model_type]]
+    except ValueError:
+        # E.g. a budget holding one class only, or more clusters than points
+        score = np.nan
+    return candidate, float(score)
+
+def _score_candidate_in_worker(candidate: int, params: Dict[str, Any], model_type: str, rows: int, train_end: int) -> Tuple[int, float]:
+    return _score_candidate(_WORKER_DATA['X'], _WORKER_DATA['y'], candidate, params, model_type, rows, train_end)
+
+def halving_search(X, y, model_type: str, candidates: List[Dict[str, Any]], factor: int = 3, validation_size: float = 0.2, max_workers: int = WALK_FORWARD_MAX_WORKERS) -> Iterator[Dict[str, Any]]:
+    """
+    Successive-halving search over model settings, run on a process pool.
+    
+    The features are scaled once, with the scaler fitted on the training
+    rows, and that one matrix is shared by every candidate in every round
+    (each worker process receives it once). Each round trains the surviving
+    candidates on the most recent training rows of its budget, scores them
+    on the validation rows that follow and keeps the best 1/factor of them.
+    
+    Parameters:
+    -----------
+    X : pd.DataFrame, np.ndarray or LaggedFeatures
+        Chronological features
+    y : array-like or None
+        Targets aligned with X; None for clustering
+    model_type : str
+        Key of SEARCH_SPACE
+    candidates : List[Dict[str, Any]]
+        Settings to search, e.g. from search_candidates
+    factor : int
+        Budget growth, and candidate reduction, per round
+    validation_size : float
+        Share of the (latest) rows held out for scoring
+    max_workers : int
+        Worker processes to use at most
+        
+    Returns:
+    --------
+    Iterator[Dict[str, Any]]
+        One row per candidate and round (round, training rows, candidate
+        number, its settings and SEARCH_SCORES[model_type] score), in order
+        of completion; the best of the last round is the search's result
+    """
+    X = X.matrix() if isinstance(X, LaggedFeatures) else np.ascontiguousarray(X, dtype=np.float64)
+    y = None if y is None else np.asarray(y)
+    train_end = len(X) - math.ceil(validation_size * len(X))
+    if train_end < 1 or train_end == len(X):
+        raise ValueError("Not enough data to hold out validation rows")
+    # Scale a private copy; X may be the caller's own feature matrix
+    scaler = StandardScaler().fit(X[:train_end])
+    X = scaler.transform(X)
+    
+    budgets = halving_budgets(len(candidates), train_end, factor)
+    workers = min(max_workers, len(candidates))
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=MODEL_WORKER_CONTEXT, initializer=_init_model_worker, initargs=(X, y)) if workers > 1 else None
+    survivors = list(range(len(candidates)))
+    try:
+        for round_number, rows in enumerate(budgets, start=1):
+            if executor is None:
+                outcomes = (_score_candidate(X, y, candidate, candidates[candidate], model_type, rows, train_end) for candidate in survivors)
+            else:
+                futures = [executor.submit(_score_candidate_in_worker, candidate, candidates[candidate], model_type, rows, train_end)
+                           for candidate in survivors]
+                outcomes = (future.result() for future in as_completed(futures))
+            
+            scores = {}
+            for candidate, score in outcomes:
+                scores[candidate] = score
+                yield {'Round': round_number, 'Rows': rows, 'Candidate': candidate + 1, **candidates[candidate], 'Score': score}
+            
+            # Failed settings (NaN) rank last; ties keep the original order
+            ranked = sorted(survivors, key=lambda candidate: -np.nan_to_num(scores[candidate], nan=-np.inf))
+            survivors = ranked[:max(1, math.ceil(len(ranked) / factor))]
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+def display_hyperparameter_search(df: pd.DataFrame, model_type: str):
+    """Search the current model type's settings and save the best as the model configuration"""
+    with st.expander("Hyperparameter Search"):
+        col1, col2 = st.columns(2)
+        search_mode = col1.radio("Candidates", ["Grid", "Random"], horizontal=True,
+                                 help="The whole grid of " + ", ".join(SEARCH_SPACE[model_type]) + " values, or random settings from the slider ranges")
+        n_candidates = col2.number_input("Random Candidates", min_value=2, max_value=200, value=27, disabled=search_mode == "Grid")
+        factor = st.slider("Halving Factor", 2, 5, 3, help="Each round keeps the best 1/factor of the settings and gives them factor times the training rows")
+        
+        if st.button("Run Search"):
+            candidates = search_candidates(model_type, None if search_mode == "Grid" else int(n_candidates))
+            score_name = SEARCH_SCORES[model_type]
+            extra_features = [*st.session_state.get('custom_recipes', {}), *timeframe_feature_names(st.session_state.get('timeframes', []))]
+            lags = st.session_state.get('lags', 0)
+            
+            progress_bar = st.progress(0)
+            table = st.empty()
+            results = []
+            try:
+                if lags:
+                    data = prepare_lagged_data(df, model_type, lags, extra_features)
+                    X, y = data, data.y
+                else:
+                    X, y = prepare_data_for_model(df, model_type, extra_features)
+                budgets = halving_budgets(len(candidates), len(X) - math.ceil(0.2 * len(X)), factor)
+                total = sum(max(1, math.ceil(len(candidates) / factor ** i)) for i in range(len(budgets)))
+                for result in halving_search(X, y, model_type, candidates, factor):
+                    results.append(result)
+                    progress_bar.progress(min(1.0, len(results) / total))
+                    table.dataframe(pd.DataFrame(results).rename(columns={'Score': score_name}))
+            except Exception as e:
+                st.error(f"Error during hyperparameter search: {str(e)}")
+                return
+            
+            results = pd.DataFrame(results)
+            final = results[results['Round'] == results['Round'].max()].sort_values(['Score', 'Candidate'], ascending=[False, True])
+            if final['Score'].isna().all():
+                st.warning("No setting could be scored on this data.")
+                return
+            best = candidates[int(final['Candidate'].iloc[0]) - 1]
+            st.session_state['model_config'] = {
+                'type': model_type,
+                'params': best
+            }
+            st.success(f"Best {model_type} setting ({score_name} {final['Score'].iloc[0]:.4f}) saved as the model configuration: "
+                       + ", ".join(f"{param}={value}" for param, value in best.items()))
+            st.dataframe(final.rename(columns={'Score': score_name}).set_index('Candidate'))
+
+def saved_model_param(model_type: str, param: str, default: Any) -> Any:
+    """A parameter of the saved model configuration, if it is for model_type"""
+    config = st.session_state.get('model_config', {})
+    return config.get('params', {}).get(param, default) if config.get('type') == model_type else default
+
 def train_model_pipeline():
     """Main model training pipeline with dynamic model selection"""
     # Get data from session state
@@ -2050,6 +5645,11 @@ def train_model_pipeline():
     
     # Display model selection sidebar
     model_type, params = display_model_selection()
+    lags = st.sidebar.slider(
+        "Lagged Bars",
+        0, 250, 0,
+        help="Also give the model the previous N bars of " + ", ".join(LAG_FEATURES) + " as features"
+    )
     
     # Create progress bar
     progress_bar = st.progress(0)
@@ -2058,18 +5658,29 @@ def train_model_pipeline():
     try:
         # Step 1: Prepare data
         status_text.text("Preparing data...")
-        X, y = prepare_data_for_model(df, model_type)
+        extra_features = [*st.session_state.get('custom_recipes', {}), *timeframe_feature_names(st.session_state.get('timeframes', []))]
+        if lags:
+            # Windows of the previous bars stay views until each split is laid out
+            data = prepare_lagged_data(df, model_type, lags, extra_features)
+        else:
+            X, y = prepare_data_for_model(df, model_type, extra_features)
         progress_bar.progress(20)
         
         # Step 2: Split data
         status_text.text("Splitting data...")
         if model_type != "K-Means Clustering":
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, shuffle=False
-            )
+            if lags:
+                # The same chronological 80/20 split as train_test_split
+                split = len(data) - math.ceil(0.2 * len(data))
+                X_train, X_test = data.frame(0, split), data.frame(split)
+                y_train, y_test = data.y.iloc[:split], data.y.iloc[split:]
+            else:
+                X_train, X_test, y_train, y_test = train_test_split(
+                    X, y, test_size=0.2, shuffle=False
+                )
         else:
-            X_train = X
-            X_test = X
+            X_train = data.frame() if lags else X
+            X_test = X_train
             y_train = None
             y_test = None
         progress_bar.progress(40)
@@ -2078,7 +5689,7 @@ def train_model_pipeline():
         status_text.text("Scaling features...")
         scaler = StandardScaler()
         X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
+        X_test_scaled = X_train_scaled if X_test is X_train else scaler.transform(X_test)
         progress_bar.progress(60)
         
         # Step 4: Create and train model
@@ -2108,6 +5719,7 @@ def train_model_pipeline():
         st.session_state['model'] = model
         st.session_state['model_type'] = model_type
         st.session_state['scaler'] = scaler
+        st.session_state['lags'] = lags
         st.session_state['predictions'] = test_pred
         st.session_state['metrics'] = metrics
         
@@ -2124,6 +5736,10 @@ def train_model_pipeline():
         st.subheader("Model Performance Visualization")
         st.plotly_chart(fig, use_container_width=True)
         
+        # A single split says little about a trading model; check it across many
+        if model_type != "K-Means Clustering":
+            display_walk_forward(data if lags else X, data.y if lags else y, model_type, params)
+        
         # Add download button for predictions
         if model_type != "K-Means Clustering":
             results_df = create_download_dataframe(df, y_test, test_pred, model_type=model_type.lower().replace(" ", "_"))
@@ -2270,17 +5886,26 @@ def main():
     # Apply the selected theme
     apply_theme()
     
-    # Add Alpha Vantage API key input
-    global ALPHA_VANTAGE_API_KEY
-    ALPHA_VANTAGE_API_KEY = st.sidebar.text_input(
+    # Add Alpha Vantage API key input; each key gets its own client so sessions
+    # never share a connection pool, quota or rate limit
+    api_key = st.sidebar.text_input(
         "Alpha Vantage API Key",
         type="password",
         help="Enter your Alpha Vantage API key. Get one for free at https://www.alphavantage.co/support/#api-key"
     )
-    if ALPHA_VANTAGE_API_KEY:
+    st.session_state['alpha_vantage_client'] = get_alpha_vantage_client(api_key)
+    if st.session_state['alpha_vantage_client'] is not None:
         st.sidebar.success("✅ API Key set")
+        bucket = st.session_state['alpha_vantage_client'].bucket
+        st.sidebar.caption(
+            f"Alpha Vantage queue: {bucket.queue_depth} waiting · "
+            f"next call in ~{bucket.expected_wait():.0f}s"
+        )
     else:
         st.sidebar.info("ℹ️ Enter API key for more reliable data fetching")
+    for provider, breaker in PROVIDER_BREAKERS.items():
+        if breaker.state == 'open':
+            st.sidebar.warning(f"⚠️ {PROVIDER_NAMES[provider]} is failing and is temporarily skipped")
     
     # Create pipeline step buttons
     pipeline_buttons = {
@@ -2421,14 +6046,14 @@ def main():
             
             data_source = st.radio(
                 "Data Source",
-                ["Upload CSV", "Fetch from Yahoo Finance"],
-                help="Select whether to upload your own CSV file or fetch data from Yahoo Finance"
+                ["Upload CSV", "Fetch from Yahoo Finance", "Fetch Watchlist"],
+                help="Select whether to upload your own CSV file, fetch one ticker or fetch a whole watchlist"
             )
             
             if data_source == "Upload CSV":
                 st.markdown(f"""
                     <div class="data-loading-subtext">
-                        <p>Upload your stock data in CSV format. The file should contain the following columns:</p>
+                        <p>Upload your stock data as CSV (plain, .csv.gz or .csv.zst), Parquet or Arrow. The file should contain the following columns:</p>
                         <ul>
                             <li>Date (YYYY-MM-DD format)</li>
                             <li>Open (Opening price)</li>
@@ -2441,9 +6066,9 @@ def main():
                 """, unsafe_allow_html=True)
                 
                 uploaded_file = st.file_uploader(
-                    "Upload your stock data CSV file",
-                    type=["csv"],
-                    help="Upload a CSV file with columns: Date, Open, High, Low, Close, Volume"
+                    "Upload your stock data file",
+                    type=["csv", "gz", "zst", "parquet", "arrow", "feather", "ipc"],
+                    help="Upload a CSV (optionally .csv.gz or .csv.zst), Parquet or Arrow file with columns: Date, Open, High, Low, Close, Volume"
                 )
                 
                 if uploaded_file is not None:
@@ -2453,6 +6078,77 @@ def main():
                         st.success("Data loaded successfully!")
                         display_stock_data(df)
                     
+            elif data_source == "Fetch Watchlist":
+                st.markdown(f"""
+                    <div class="data-loading-subtext">
+                        <p>Enter several ticker symbols separated by commas, spaces or new lines. They are fetched concurrently.</p>
+                    </div>
+                """, unsafe_allow_html=True)
+                
+                watchlist = st.text_area(
+                    "Ticker Symbols",
+                    help="For example: AAPL, MSFT, GOOGL"
+                )
+                
+                col1, col2 = st.columns(2)
+                with col1:
+                    start_date = st.date_input(
+                        "Start Date",
+                        help="Select the start date for historical data",
+                        key="watchlist_start_date"
+                    )
+                with col2:
+                    end_date = st.date_input(
+                        "End Date",
+                        help="Select the end date for historical data",
+                        key="watchlist_end_date"
+                    )
+                
+                if st.button("Fetch Watchlist"):
+                    symbols = watchlist.replace(",", " ").split()
+                    if symbols and start_date and end_date:
+                        client = st.session_state.get('alpha_vantage_client')
+                        source = "alpha_vantage" if client is not None else "yahoo"
+                        if client is not None:
+                            # Alpha Vantage calls are paced to the quota rather than rejected
+                            st.info(f"Alpha Vantage quota allows {ALPHA_VANTAGE_CALLS_PER_MINUTE} calls per minute; "
+                                    f"uncached tickers may take up to ~{client.bucket.expected_wait(len(symbols)):.0f}s.")
+                        with st.spinner(f"Fetching data for {len(symbols)} tickers..."):
+                            panel, status = fetch_watchlist_data(symbols, start_date, end_date, source=source, client=client)
+                            # Bars live in the shared memory-mapped store, not in each session
+                            if not panel.empty:
+                                get_history_store().write(panel)
+                        st.session_state['watchlist_range'] = (start_date, end_date + timedelta(days=1))
+                        st.session_state['watchlist_status'] = status
+                    else:
+                        st.warning("Please fill in all the required fields.")
+                
+                if 'watchlist_status' in st.session_state:
+                    status_df = pd.DataFrame.from_dict(st.session_state['watchlist_status'], orient='index')
+                    succeeded = int(status_df['ok'].sum())
+                    st.subheader("Fetch Status")
+                    st.write(f"Fetched {succeeded} of {len(status_df)} tickers")
+                    st.dataframe(status_df)
+                    
+                    loaded_symbols = [symbol for symbol, result in st.session_state['watchlist_status'].items() if result['ok']]
+                    if loaded_symbols:
+                        selected_symbol = st.selectbox("Ticker to analyse", loaded_symbols)
+                        df = get_history_store().load(selected_symbol, *st.session_state['watchlist_range'])
+                        st.session_state['data'] = df
+                        display_stock_data(df, title=f"{selected_symbol} Data Overview")
+                        
+                        if st.button("Compute Universe Features", help="Preprocess and compute every indicator for all fetched tickers in one pass"):
+                            with st.spinner(f"Computing features for {len(loaded_symbols)} tickers..."):
+                                store = get_history_store()
+                                frames = {symbol: store.load(symbol, *st.session_state['watchlist_range']) for symbol in loaded_symbols}
+                                panel, report = preprocess_panel(PricePanel.from_frames(frames))
+                                panel = compute_panel_indicators(panel, recipes={**INDICATOR_RECIPES, **st.session_state.get('custom_recipes', {})})
+                            st.success(f"Computed {len(panel.fields)} features over {panel.shape[0]} dates for {panel.shape[1]} tickers")
+                            st.subheader("Latest Features by Ticker")
+                            st.dataframe(panel.cross_section())
+                            with st.expander("Preprocessing Report"):
+                                st.dataframe(report)
+
             else:  # Fetch from Yahoo Finance
                 st.markdown(f"""
                     <div class="data-loading-subtext">
@@ -2481,10 +6177,18 @@ def main():
                         help="Select the end date for historical data"
                     )
                 
+                interval = st.selectbox(
+                    "Bar Interval",
+                    ["1d"] + list(INTRADAY_INTERVALS),
+                    help="Intraday bars are only available for recent dates (Yahoo Finance: 7 days of 1m, 60 days of other intervals)"
+                )
+                
                 if st.button("Fetch Data"):
                     if ticker and start_date and end_date:
                         with st.spinner(f"Fetching data for {ticker}..."):
-                            df = fetch_stock_data(ticker, start_date, end_date)
+                            df = fetch_stock_data(ticker, start_date, end_date,
+                                                  client=st.session_state.get('alpha_vantage_client'),
+                                                  interval=interval)
                             if df is not None:
                                 st.session_state['data'] = df
                                 st.success(f"Successfully fetched data for {ticker}!")
@@ -2494,7 +6198,21 @@ def main():
         elif current_step == "Preprocessing":
             if 'data' in st.session_state:
                 df = st.session_state['data']
-                processed_df, summary, stats_summary = preprocess_stock_data(df)
+                outlier_method = st.selectbox(
+                    "Outlier Detection",
+                    list(OUTLIER_METHODS),
+                    format_func=OUTLIER_METHODS.get,
+                    help="How values are judged to be outliers (|z| > 3) before being replaced"
+                )
+                if outlier_method == 'expanding':
+                    # Only rows appended since the last run are processed
+                    preprocessor = st.session_state.setdefault('preprocessor', IncrementalPreprocessor())
+                    processed_df, summary, stats_summary = preprocess_incremental(
+                        df, preprocessor, st.session_state.get('preprocessed_data')
+                    )
+                    st.session_state['preprocessed_data'] = processed_df
+                else:
+                    processed_df, summary, stats_summary = preprocess_stock_data(df, method=outlier_method)
                 if processed_df is not None:
                     st.session_state['data'] = processed_df
                     display_preprocessing_results(df, processed_df, summary, stats_summary)
@@ -2503,7 +6221,38 @@ def main():
         elif current_step == "Feature Engineering":
             if 'data' in st.session_state:
                 df = st.session_state['data']
-                df_with_features, correlations = calculate_technical_indicators(df)
+                with st.expander("Custom Indicators"):
+                    definitions = st.text_area(
+                        "Definitions (one per line, as name = expression)",
+                        value=st.session_state.get('custom_indicators', ''),
+                        placeholder="trend_gap = SMA(close, 20) - EMA(close, 50)\nvolume_z = zscore(volume, 60)",
+                        help="Combine open, high, low, close, volume, the built-in indicators and earlier definitions "
+                             "with + - * / and " + ", ".join(EXPRESSION_FUNCTIONS) + ". "
+                             "Custom indicators are used as model features."
+                    )
+                try:
+                    custom_recipes = parse_indicator_definitions(definitions)
+                except IndicatorExpressionError as e:
+                    st.error(f"Error in custom indicators: {str(e)}")
+                    custom_recipes = {}
+                else:
+                    st.session_state['custom_indicators'] = definitions
+                st.session_state['custom_recipes'] = custom_recipes
+                with st.expander("Multi-Timeframe Features"):
+                    if isinstance(df.index, pd.DatetimeIndex):
+                        timeframes = st.multiselect(
+                            "Timeframes",
+                            list(TIMEFRAMES),
+                            default=st.session_state.get('timeframes', []),
+                            help="Adds " + ", ".join(TIMEFRAME_INDICATORS) + " of weekly (1W) or monthly (1M) bars "
+                                 "as model features. Each day sees only bars that closed before its own week or "
+                                 "month began, so rows before the indicators warm up are dropped from training."
+                        )
+                    else:
+                        st.warning("Multi-timeframe features need data indexed by date.")
+                        timeframes = []
+                st.session_state['timeframes'] = timeframes
+                df_with_features, correlations = calculate_technical_indicators(df, custom_recipes, timeframes)
                 st.session_state['data'] = df_with_features
                 display_technical_indicators(df_with_features, correlations)
             else:
@@ -2514,7 +6263,8 @@ def main():
                 
                 model_type = st.selectbox(
                     "Select Model Type",
-                    ["Linear Regression", "Logistic Regression", "K-Means Clustering"],
+                    MODEL_TYPES,
+                    index=MODEL_TYPES.index(st.session_state.get('model_config', {}).get('type', MODEL_TYPES[0])),
                     help="Choose the type of machine learning model to train"
                 )
                 
@@ -2524,31 +6274,31 @@ def main():
                 if model_type == "Linear Regression":
                     params['fit_intercept'] = st.checkbox(
                         "Fit Intercept",
-                        value=True,
+                        value=saved_model_param(model_type, 'fit_intercept', True),
                         help="Whether to calculate the intercept for this model"
                     )
                     
                 elif model_type == "Logistic Regression":
                     params['C'] = st.slider(
                         "Regularization (C)",
-                        0.01, 10.0, 1.0,
+                        0.01, 10.0, float(saved_model_param(model_type, 'C', 1.0)),
                         help="Inverse of regularization strength"
                     )
                     params['max_iter'] = st.slider(
                         "Maximum Iterations",
-                        100, 1000, 200,
+                        100, 1000, int(saved_model_param(model_type, 'max_iter', 200)),
                         help="Maximum number of iterations for solver"
                     )
                     
                 else:  # K-Means Clustering
                     params['n_clusters'] = st.slider(
                         "Number of Clusters",
-                        2, 10, 5,
+                        2, 10, int(saved_model_param(model_type, 'n_clusters', 5)),
                         help="Number of clusters to form"
                     )
                     params['n_init'] = st.slider(
                         "Number of Initializations",
-                        5, 20, 10,
+                        5, 20, int(saved_model_param(model_type, 'n_init', 10)),
                         help="Number of times to run k-means with different centroid seeds"
                     )
                 
@@ -2566,6 +6316,8 @@ def main():
                     st.write("Parameters:")
                     for param, value in params.items():
                         st.write(f"- {param}: {value}")
+                
+                display_hyperparameter_search(st.session_state['data'], model_type)
             else:
                 st.error("No data available. Please load and preprocess data first!")
         elif current_step == "Model Training":
@@ -2594,21 +6346,28 @@ def main():
                             model = st.session_state['model']
                             scaler = st.session_state['scaler']
                             
-                            # Get the last window of data with all required features
+                            # Get the last window of data with all required features,
+                            # long enough for the custom indicators to be complete;
+                            # weekly and monthly features need the whole history
+                            custom_recipes = st.session_state.get('custom_recipes', {})
+                            history_rows = max([50] + [indicator_lookback(node) + 1 for node in custom_recipes.values()])
+                            history_rows = max(history_rows, st.session_state.get('lags', 0) + 2)
+                            if st.session_state.get('timeframes'):
+                                history_rows = len(df)
                             required_features = ['open', 'high', 'low', 'close', 'volume']
-                            last_window = df.tail(50)[required_features].copy()  # Get more data for technical indicators
+                            last_window = df.tail(history_rows)[required_features].copy()  # Get more data for technical indicators
                             
                             # Generate predictions
                             future_predictions = predict_future_prices(
                                 model, 
                                 scaler, 
                                 last_window, 
-                                n_steps=n_days
+                                n_steps=n_days,
+                                custom_recipes=custom_recipes
                             )
                             
                             # Create dates for future predictions
-                            last_date = df.index[-1]
-                            future_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=n_days)
+                            future_dates = future_bar_index(df.index, n_days)
                             
                             # Create DataFrame with predictions
                             predictions_df = pd.DataFrame({
@@ -2674,28 +6433,248 @@ def main():
         
     """, unsafe_allow_html=True)
 
+# CSV ingestion configuration
+CSV_PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+CSV_REQUIRED_COLUMNS = CSV_PRICE_COLUMNS + ['volume']
+CSV_BLOCK_SIZE = 8 << 20    # Bytes parsed per block; also the progress granularity
+CSV_DATE_FORMATS = [pa_csv.ISO8601, '%m/%d/%Y', '%Y/%m/%d'] if pa_csv is not None else []
+
+class CSVFormatError(ValueError):
+    """Raised when an uploaded file lacks the columns the app needs"""
+
+class _CountingReader(io.RawIOBase):
+    """Read-only file wrapper that counts the bytes consumed, for progress reporting"""
+    
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        self.bytes_read += len(data)
+        return len(data)
+
+def _compact_volume(volume: pd.Series) -> pd.Series:
+    """Store whole-number volumes as int64 and anything else as float32"""
+    values = volume.to_numpy()
+    if not np.isnan(values).any() and np.array_equal(values, np.floor(values)):
+        return volume.astype(np.int64)
+    return volume.astype(np.float32)
+
+def _open_csv_stream(source, compression: Optional[str] = None):
+    """
+    Open a CSV file from the start, decompressing on the fly.
+    
+    Returns the stream to parse and the counting reader underneath it, whose
+    bytes_read tracks progress through the (compressed) file.
+    """
+    source.seek(0)
+    counter = _CountingReader(source)
+    if compression is None:
+        return counter, counter
+    if pa is not None:
+        return pa.CompressedInputStream(pa.PythonFile(counter, mode='r'), compression), counter
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=counter), counter
+    raise CSVFormatError(f"Reading {compression}-compressed files requires pyarrow")
+
+def read_ohlcv_csv(source, total_bytes: Optional[int] = None, progress: Optional[Callable[[float], None]] = None, compression: Optional[str] = None) -> pd.DataFrame:
+    """
+    Read an OHLCV CSV into compact dtypes.
+    
+    Only the date and OHLCV columns are read (matched case-insensitively),
+    dates are parsed while reading and prices are stored as float32. The file
+    is parsed in blocks with pyarrow's multithreaded reader when available,
+    falling back to chunked pandas parsing for dates Arrow cannot read.
+    Compressed files are decompressed as a stream, never fully in memory.
+    
+    Parameters:
+    -----------
+    source : file-like
+        Seekable binary file holding the CSV
+    total_bytes : int, optional
+        Size of the file, used to report progress
+    progress : Callable[[float], None], optional
+        Called with the fraction of the file read so far
+    compression : str, optional
+        'gzip' or 'zstd' for compressed CSVs
+        
+    Returns:
+    --------
+    pd.DataFrame
+        Lowercase OHLCV columns, indexed by date when a date column exists
+        
+    Raises:
+    -------
+    CSVFormatError
+        If any of the OHLCV columns is missing
+    """
+    # Map the lowercase names we need onto the header as written
+    stream, _ = _open_csv_stream(source, compression)
+    header = stream.read(1 << 16).split(b'\n', 1)[0].decode('utf-8-sig').strip().split(',')
+    columns = {name.strip().strip('"').lower(): name.strip().strip('"') for name in header}
+    missing = [col for col in CSV_REQUIRED_COLUMNS if col not in columns]
+    if missing:
+        raise CSVFormatError(f"Missing required columns: {', '.join(missing)}")
+    wanted = (['date'] if 'date' in columns else []) + CSV_REQUIRED_COLUMNS
+    
+    def report(done):
+        if progress is not None and total_bytes:
+            progress(min(done / total_bytes, 1.0))
+    
+    df = None
+    if pa_csv is not None:
+        column_types = {columns[col]: pa.float32() for col in CSV_PRICE_COLUMNS}
+        column_types[columns['volume']] = pa.float64()
+        if 'date' in columns:
+            column_types[columns['date']] = pa.timestamp('ns')
+        stream, counter = _open_csv_stream(source, compression)
+        try:
+            reader = pa_csv.open_csv(
+                stream,
+                read_options=pa_csv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=[columns[col] for col in wanted],
+                    column_types=column_types,
+                    timestamp_parsers=CSV_DATE_FORMATS
+                )
+            )
+            batches = []
+            for batch in reader:
+                batches.append(batch)
+                report(counter.bytes_read)
+            df = pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
+        except pa.ArrowInvalid:
+            # Unusual date or number formats: let pandas have a go
+            pass
+    
+    if df is None:
+        stream, counter = _open_csv_stream(source, compression)
+        dtypes = {columns[col]: np.float32 for col in CSV_PRICE_COLUMNS}
+        dtypes[columns['volume']] = np.float64
+        chunks = []
+        for chunk in pd.read_csv(stream, usecols=[columns[col] for col in wanted], dtype=dtypes,
+                                 parse_dates=[columns['date']] if 'date' in columns else False,
+                                 chunksize=1_000_000):
+            chunks.append(chunk)
+            report(counter.bytes_read)
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=wanted)
+    
+    df.columns = [col.lower() for col in df.columns]
+    df['volume'] = _compact_volume(df['volume'])
+    if 'date' in df.columns:
+        df.set_index('date', inplace=True)
+    report(total_bytes or 0)
+    return df
+
+def read_ohlcv_columnar(source, file_format: str) -> pd.DataFrame:
+    """
+    Read OHLCV bars from a Parquet or Arrow IPC file.
+    
+    Only the date and OHLCV columns are decoded. Arrow IPC files are mapped
+    straight from the uploaded bytes, and numeric columns without nulls are
+    handed to pandas without copying.
+    
+    Parameters:
+    -----------
+    source : file-like
+        Binary file holding the data
+    file_format : str
+        'parquet' or 'arrow'
+        
+    Returns:
+    --------
+    pd.DataFrame
+        Lowercase OHLCV columns, indexed by date when a date column exists
+    """
+    if pa is None:
+        raise CSVFormatError(f"Reading {file_format} files requires pyarrow")
+    
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        source.seek(0)
+        parquet_file = pq.ParquetFile(source)
+        names = parquet_file.schema_arrow.names
+        columns = {name.lower(): name for name in names}
+        read = lambda wanted: parquet_file.read(columns=wanted, use_threads=True)
+    else:
+        import pyarrow.ipc as ipc
+        buffer = pa.py_buffer(source.getvalue()) if hasattr(source, 'getvalue') else pa.py_buffer(source.read())
+        try:
+            table = ipc.open_file(buffer).read_all()
+        except pa.ArrowInvalid:
+            # Streaming IPC format rather than the random-access file format
+            table = ipc.open_stream(buffer).read_all()
+        columns = {name.lower(): name for name in table.column_names}
+        read = lambda wanted: table.select(wanted)
+    
+    missing = [col for col in CSV_REQUIRED_COLUMNS if col not in columns]
+    if missing:
+        raise CSVFormatError(f"Missing required columns: {', '.join(missing)}")
+    wanted = (['date'] if 'date' in columns else []) + CSV_REQUIRED_COLUMNS
+    
+    table = read([columns[col] for col in wanted])
+    table = table.rename_columns(wanted).replace_schema_metadata(None)
+    for col in CSV_PRICE_COLUMNS:
+        if table.schema.field(col).type != pa.float32():
+            table = table.set_column(table.schema.get_field_index(col), col, table[col].cast(pa.float32(), safe=False))
+    
+    df = table.to_pandas(split_blocks=True)
+    df['volume'] = _compact_volume(df['volume'].astype(np.float64))
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+        df.set_index('date', inplace=True)
+    return df
+
+# Upload formats, by file name suffix
+UPLOAD_FORMATS = {
+    '.csv': ('csv', None),
+    '.csv.gz': ('csv', 'gzip'),
+    '.csv.zst': ('csv', 'zstd'),
+    '.parquet': ('parquet', None),
+    '.arrow': ('arrow', None),
+    '.feather': ('arrow', None),
+    '.ipc': ('arrow', None)
+}
+
+def upload_format(file_name: str) -> Tuple[str, Optional[str]]:
+    """Return the (format, compression) of an uploaded file from its name"""
+    name = file_name.lower()
+    for suffix in sorted(UPLOAD_FORMATS, key=len, reverse=True):
+        if name.endswith(suffix):
+            return UPLOAD_FORMATS[suffix]
+    raise ValueError(f"unsupported file type {file_name}; upload one of {', '.join(UPLOAD_FORMATS)}")
+
 def load_csv_data(uploaded_file):
     """
-    Load a CSV file uploaded by the user and return a pandas DataFrame.
-    Ensures all column names are lowercase and checks for required columns.
+    Load a data file uploaded by the user and return a pandas DataFrame.
+    Accepts CSV (optionally .gz or .zst compressed), Parquet and Arrow IPC.
+    Reads only the date and OHLCV columns, into lowercase float32 price
+    columns, and shows a progress bar while large CSVs are parsed.
     """
+    progress_bar = st.progress(0.0, text="Reading file...")
     try:
-        df = pd.read_csv(uploaded_file)
-        df.columns = [col.lower() for col in df.columns]
-        # Optionally, parse dates if a 'date' column exists
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
-            df.set_index('date', inplace=True)
-        # Check for required columns
-        required_cols = {'open', 'high', 'low', 'close', 'volume'}
-        missing = required_cols - set(df.columns)
-        if missing:
-            st.error(f"Missing required columns in uploaded CSV: {', '.join(missing)}. Please upload a file with columns: {', '.join(required_cols)}.")
-            return None
-        return df
+        file_format, compression = upload_format(getattr(uploaded_file, 'name', '.csv'))
+        if file_format != 'csv':
+            return read_ohlcv_columnar(uploaded_file, file_format)
+        return read_ohlcv_csv(
+            uploaded_file,
+            total_bytes=getattr(uploaded_file, 'size', None),
+            progress=lambda fraction: progress_bar.progress(fraction, text=f"Reading file... {fraction:.0%}"),
+            compression=compression
+        )
+    except CSVFormatError as e:
+        st.error(f"{e} in uploaded file. Please upload a file with columns: {', '.join(CSV_REQUIRED_COLUMNS)}.")
+        return None
     except Exception as e:
-        st.error(f"Error loading CSV: {e}")
+        st.error(f"Error loading file: {e}")
         return None
+    finally:
+        progress_bar.empty()
 
 def get_base64_of_bin_file(bin_file):
     """Convert binary file to base64 string"""
@@ -0,0 +1,70 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import app
+
+
+def make_trades(count=20_000, seed=0):
+    """Trades at irregular times over two sessions, with quiet minutes"""
+    rng = np.random.default_rng(seed)
+    times = pd.Timestamp('2024-03-04 09:30') + pd.to_timedelta(np.sort(rng.choice(2 * 86_400, count, replace=False)), unit='s')
+    # Leave a gap so some intervals have no trades at all
+    times = times[(times < pd.Timestamp('2024-03-04 12:00')) | (times > pd.Timestamp('2024-03-04 13:17'))]
+    return pd.DataFrame({
+        'price': 100 + np.cumsum(rng.normal(0, 0.05, len(times))),
+        'size': rng.integers(1, 500, len(times)).astype(float),
+    }, index=times)
+
+
+def pandas_bars(trades, rule):
+    """Reference bars from pandas' resample, without the empty intervals"""
+    bars = trades['price'].resample(rule).ohlc()
+    bars['volume'] = trades['size'].resample(rule).sum()
+    return bars.dropna(subset=['open']).rename_axis('date')
+
+
+class AggregateTradesTest(unittest.TestCase):
+    def test_matches_pandas_resample(self):
+        trades = make_trades()
+        for rule in ['1min', '5min', '15min', '1h']:
+            with self.subTest(rule=rule):
+                pd.testing.assert_frame_equal(app.aggregate_trades(trades, rule), pandas_bars(trades, rule), check_freq=False)
+
+    def test_unsorted_trades_match_sorted(self):
+        trades = make_trades()
+        shuffled = trades.sample(frac=1.0, random_state=1)
+        pd.testing.assert_frame_equal(app.aggregate_trades(shuffled, '5min'), app.aggregate_trades(trades, '5min'))
+
+
+class ResampleBarsTest(unittest.TestCase):
+    def test_minute_bars_match_pandas_resample(self):
+        bars = app.aggregate_trades(make_trades(), '1min')
+        for rule in ['15min', '1h', '1D']:
+            with self.subTest(rule=rule):
+                expected = bars.resample(rule).agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+                expected = expected.dropna(subset=['open'])
+                pd.testing.assert_frame_equal(app.resample_bars(bars, rule), expected, check_freq=False)
+
+    def test_resampled_minute_bars_match_trades_aggregated_directly(self):
+        trades = make_trades()
+        minute = app.aggregate_trades(trades, '1min')
+        pd.testing.assert_frame_equal(app.resample_bars(minute, '1h'), app.aggregate_trades(trades, '1h'))
+
+    def test_daily_bars_match_pandas_calendar_resample(self):
+        days = pd.bdate_range('2023-01-02', periods=300, name='date')
+        rng = np.random.default_rng(2)
+        close = 100 + np.cumsum(rng.normal(0, 1, len(days)))
+        bars = pd.DataFrame({'open': close + 0.1, 'high': close + 1, 'low': close - 1, 'close': close,
+                             'volume': rng.integers(1_000, 9_000, len(days)).astype(float)}, index=days)
+        for rule, pandas_rule in [('W', 'W'), ('M', 'ME')]:
+            with self.subTest(rule=rule):
+                expected = bars.resample(pandas_rule).agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+                # pandas labels calendar bars by their end, resample_bars by their start
+                expected.index = expected.index.to_period(rule).to_timestamp().rename('date')
+                pd.testing.assert_frame_equal(app.resample_bars(bars, rule), expected, check_freq=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
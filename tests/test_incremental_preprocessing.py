@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import app
+
+
+def make_bars(n=400, seed=1):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    df = pd.DataFrame({
+        "open": close * (1 + rng.normal(0, 0.002, n)),
+        "high": close * 1.01,
+        "low": close * 0.99,
+        "close": close,
+        "volume": rng.integers(100_000, 1_000_000, n).astype(float),
+    }, index=pd.bdate_range("2020-01-01", periods=n))
+    # A few spikes for the outlier test to catch
+    df.iloc[[60, 150, 310], 3] *= 1.8
+    df.iloc[[90, 200], 4] *= 12
+    return df
+
+
+def run_in_batches(df, bounds):
+    preprocessor = app.IncrementalPreprocessor()
+    processed = None
+    for end in bounds:
+        processed, _, _ = app.preprocess_incremental(df.iloc[:end], preprocessor, processed)
+    return processed, preprocessor
+
+
+class IncrementalPreprocessingTest(unittest.TestCase):
+    def assert_matches_full_run(self, df, bounds):
+        expected, _, _ = app.preprocess_stock_data(df, method="expanding")
+        processed, preprocessor = run_in_batches(df, bounds)
+        pd.testing.assert_frame_equal(processed, expected, rtol=1e-9)
+        outliers = app.detect_outliers(app.fill_missing_2d(df[app.OUTLIER_COLUMNS].to_numpy(dtype=float).copy()), "expanding")[0]
+        np.testing.assert_array_equal(preprocessor.outlier_counts, outliers.sum(axis=0))
+
+    def test_batches_match_full_run(self):
+        df = make_bars()
+        for bounds in ([400], [1, 400], [20, 21, 250, 400], list(range(7, 400, 37)) + [400]):
+            with self.subTest(bounds=bounds):
+                self.assert_matches_full_run(df, bounds)
+
+    def test_first_batch_without_valid_close(self):
+        df = make_bars()
+        df.iloc[0, 3] = np.nan
+        self.assert_matches_full_run(df, [1, 400])
+
+    def test_column_missing_for_several_batches(self):
+        df = make_bars()
+        df.iloc[:45, 4] = np.nan
+        df.iloc[[100, 101, 260], [0, 3]] = np.nan
+        self.assert_matches_full_run(df, [10, 30, 44, 46, 300, 400])
+
+    def test_gaps_in_other_columns_carry_across_batches(self):
+        df = make_bars()
+        df["dividend"] = np.where(np.arange(len(df)) % 50 == 0, 0.5, np.nan)
+        df.iloc[0, 5] = np.nan
+        self.assert_matches_full_run(df, [30, 49, 52, 400])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import app
+
+WINDOWS = [2, 5, 14, 20, 50, 200]
+
+
+def make_bars(rows=10_000, seed=0, gaps=()):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    close[list(gaps)] = np.nan
+    return pd.DataFrame({'close': close}, index=pd.date_range('2024-01-02 09:30', periods=rows, freq='min', name='date'))
+
+
+def reference(close, indicator, window):
+    """One window of the indicator with pandas, as the single-window recipes compute it"""
+    if indicator == 'SMA':
+        return close.rolling(window).mean()
+    if indicator == 'EMA':
+        return close.ewm(span=window, adjust=False).mean()
+    if indicator == 'BB_width':
+        middle = close.rolling(window).mean()
+        std = close.rolling(window).std()
+        return ((middle + 2 * std) - (middle - 2 * std)) / middle
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).rolling(window).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window).mean()
+    return 100 - 100 / (1 + gain / loss)
+
+
+class SweepIndicatorTest(unittest.TestCase):
+    def assert_matches_pandas(self, df):
+        for indicator in app.SWEEP_INDICATORS:
+            with self.subTest(indicator=indicator):
+                block = app.sweep_indicator(df, indicator, WINDOWS)
+                expected = pd.DataFrame({f"{indicator}_{w}": reference(df['close'], indicator, w) for w in WINDOWS})
+                # pandas' online rolling std is itself only good to about 1e-8 on these prices
+                pd.testing.assert_frame_equal(block, expected, check_exact=False, rtol=1e-8, atol=1e-7)
+
+    def test_matches_pandas_per_window(self):
+        # Longer than one chunk, so windows straddle chunk boundaries
+        self.assert_matches_pandas(make_bars())
+
+    def test_matches_pandas_with_missing_closes(self):
+        self.assert_matches_pandas(make_bars(gaps=[0, 1, 2, 700, 4095, 4096, 4097, 9000]))
+
+    def test_short_band_widths_are_exact(self):
+        df = make_bars()
+        close = df['close'].to_numpy()
+        block = app.sweep_indicator(df, 'BB_width', [2, 5])
+        for window in [2, 5]:
+            view = np.lib.stride_tricks.sliding_window_view(close, window)
+            exact = 4 * view.std(axis=1, ddof=1) / view.mean(axis=1)
+            np.testing.assert_allclose(block[f"BB_width_{window}"].to_numpy()[window - 1:], exact, rtol=1e-11)
+
+    def test_windows_without_gains_give_zero_rsi(self):
+        df = make_bars(100)
+        df['close'] = np.r_[np.linspace(120, 110, 50), np.linspace(110, 130, 50)]
+        rsi = app.sweep_indicator(df, 'RSI', [5])['RSI_5']
+        self.assertTrue((rsi.iloc[5:50] == 0.0).all())
+        self.assertTrue((rsi.iloc[55:] == 100.0).all())
+
+    def test_matches_recipes(self):
+        df = make_bars(3000)
+        indicators = app.compute_indicators(df, ['SMA_20', 'SMA_50', 'EMA_20'])
+        np.testing.assert_allclose(app.sweep_indicator(df, 'SMA', [20, 50]).to_numpy(), indicators[['SMA_20', 'SMA_50']].to_numpy(), rtol=1e-9)
+        np.testing.assert_allclose(app.sweep_indicator(df, 'EMA', [20])['EMA_20'], indicators['EMA_20'], rtol=1e-12)
+
+    def test_rejects_short_windows(self):
+        df = make_bars(100)
+        with self.assertRaises(ValueError):
+            app.sweep_indicator(df, 'BB_width', [1, 20])
+        with self.assertRaises(ValueError):
+            app.sweep_indicator(df, 'SMA', [0])
+
+
+class SweepCorrelationsTest(unittest.TestCase):
+    def test_matches_pandas_corr(self):
+        df = make_bars(5000, gaps=[100, 101])
+        grid = app.sweep_correlations(df, WINDOWS)
+        returns = df['close'].ffill().pct_change(fill_method=None)
+        for indicator in app.SWEEP_INDICATORS:
+            for window in WINDOWS:
+                with self.subTest(indicator=indicator, window=window):
+                    expected = returns.corr(reference(df['close'], indicator, window).fillna(0))
+                    self.assertAlmostEqual(grid.loc[indicator, window], expected, places=9)
+
+
+if __name__ == '__main__':
+    unittest.main()
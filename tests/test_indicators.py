@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import app
+
+
+def make_bars(rows=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    return pd.DataFrame({'close': close}, index=pd.date_range('2024-01-02 09:30', periods=rows, freq='min', name='date'))
+
+
+def reference_indicators(close):
+    """The indicators as calculate_technical_indicators computed them with pandas, one call each"""
+    df = pd.DataFrame(index=close.index)
+    df['SMA_20'] = close.rolling(window=20).mean()
+    df['SMA_50'] = close.rolling(window=50).mean()
+    df['EMA_20'] = close.ewm(span=20, adjust=False).mean()
+    df['BB_middle'] = close.rolling(window=20).mean()
+    df['BB_upper'] = df['BB_middle'] + 2 * close.rolling(window=20).std()
+    df['BB_lower'] = df['BB_middle'] - 2 * close.rolling(window=20).std()
+    delta = close.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    df['RSI'] = 100 - (100 / (1 + gain / loss))
+    exp1 = close.ewm(span=12, adjust=False).mean()
+    exp2 = close.ewm(span=26, adjust=False).mean()
+    df['MACD'] = exp1 - exp2
+    df['Signal_Line'] = df['MACD'].ewm(span=9, adjust=False).mean()
+    df['Daily_Return'] = close.ffill().pct_change(fill_method=None)
+    return df
+
+
+class ComputeIndicatorsTest(unittest.TestCase):
+    def assert_matches_reference(self, df):
+        expected = reference_indicators(df['close'])
+        pd.testing.assert_frame_equal(app.compute_indicators(df), expected, check_exact=False, rtol=1e-9, atol=1e-9)
+
+    def test_matches_pandas(self):
+        self.assert_matches_reference(make_bars())
+
+    def test_matches_pandas_across_chunks(self):
+        # More rows than one rolling-window chunk
+        self.assert_matches_reference(make_bars(app.INDICATOR_CHUNK_ROWS + 1000))
+
+    def test_matches_pandas_with_missing_closes(self):
+        df = make_bars()
+        df.iloc[[0, 1, 500, 501, 502, 1700], 0] = np.nan
+        self.assert_matches_reference(df)
+
+    def test_selected_indicators_match_full_block(self):
+        df = make_bars()
+        full = app.compute_indicators(df)
+        names = ['Signal_Line', 'BB_lower', 'SMA_20']
+        pd.testing.assert_frame_equal(app.compute_indicators(df, names), full[names])
+
+    def test_shared_subexpressions_are_planned_once(self):
+        nodes, _ = app.plan_indicators(app.INDICATOR_RECIPES)
+        self.assertEqual(len(nodes), len(set(nodes)))
+        self.assertEqual(sum(node[0] == 'rolling_mean' and node[2] == 20 for node in nodes), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
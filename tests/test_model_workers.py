@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import app
+
+
+def make_features(rows=1200, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    df = pd.DataFrame({
+        'open': close,
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'close': close,
+        'volume': rng.integers(100_000, 1_000_000, rows).astype(float),
+    })
+    df, _ = app.calculate_technical_indicators(df)
+    return app.prepare_data_for_model(df, 'Linear Regression')
+
+
+class ProcessPoolTest(unittest.TestCase):
+    """The worker pool must give the same results as running in-process"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.X, cls.y = make_features()
+
+    def test_workers_are_not_forked(self):
+        self.assertIn(app.MODEL_WORKER_CONTEXT.get_start_method(), ('forkserver', 'spawn'))
+
+    def test_walk_forward_pool_matches_single_process(self):
+        splits = app.walk_forward_splits(len(self.X), 400, 100, mode='expanding')
+        params = {'fit_intercept': True}
+        serial = pd.DataFrame(list(app.walk_forward_evaluate(self.X, self.y, 'Linear Regression', params, splits, max_workers=1)))
+        pooled = pd.DataFrame(list(app.walk_forward_evaluate(self.X, self.y, 'Linear Regression', params, splits, max_workers=2)))
+        pooled = pooled.sort_values('Fold').reset_index(drop=True)
+        pd.testing.assert_frame_equal(serial.drop(columns='Seconds'), pooled.drop(columns='Seconds'))
+
+    def test_halving_search_pool_matches_single_process(self):
+        candidates = app.search_candidates('Linear Regression', None)
+        X = np.ascontiguousarray(self.X, dtype=np.float64)
+        before = X.copy()
+        serial = pd.DataFrame(list(app.halving_search(X, self.y, 'Linear Regression', candidates, max_workers=1)))
+        pooled = pd.DataFrame(list(app.halving_search(X, self.y, 'Linear Regression', candidates, max_workers=2)))
+        keys = ['Round', 'Candidate']
+        pd.testing.assert_frame_equal(serial.sort_values(keys).reset_index(drop=True),
+                                      pooled.sort_values(keys).reset_index(drop=True))
+        np.testing.assert_array_equal(X, before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import app
+
+
+def daily_bars(start, end):
+    index = pd.date_range(start, end - pd.Timedelta(days=1), freq="D")
+    return pd.DataFrame({"open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1.0}, index=index)
+
+
+class CacheFreshnessTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(app, "OHLCV_CACHE_DIR", self.cache_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.cache_dir.cleanup)
+        self.today = pd.Timestamp.now().normalize()
+        self.yesterday = self.today - pd.Timedelta(days=1)
+        # Plans are made at noon so the checks never straddle midnight
+        self.noon = self.today + pd.Timedelta(hours=12)
+
+    def at(self, moment):
+        return mock.patch.object(app.time, "time", return_value=moment.timestamp())
+
+    def write_at(self, fetched, start, end):
+        with self.at(fetched):
+            app.write_cached_ohlcv("yahoo", "TEST", daily_bars(start, end), start, end)
+
+    def plan_at_noon(self, start, end):
+        with self.at(self.noon):
+            return app.plan_delta_fetch("yahoo", "TEST", start, end)
+
+    def test_bar_fetched_during_its_session_is_refetched(self):
+        start = self.yesterday - pd.Timedelta(days=1)
+        self.write_at(self.yesterday + pd.Timedelta(hours=11), start, self.today)
+        self.assertEqual(self.plan_at_noon(start, self.today), [(self.yesterday, self.today)])
+
+    def test_bar_fetched_after_its_day_closed_is_kept(self):
+        start = self.yesterday - pd.Timedelta(days=1)
+        self.write_at(self.today + pd.Timedelta(minutes=1), start, self.today)
+        self.assertEqual(self.plan_at_noon(start, self.today), [])
+
+    def test_live_bar_stays_fresh_within_ttl(self):
+        tomorrow = self.today + pd.Timedelta(days=1)
+        self.write_at(self.noon - pd.Timedelta(minutes=1), self.yesterday, tomorrow)
+        self.assertEqual(self.plan_at_noon(self.yesterday, tomorrow), [])
+
+    def test_backfill_does_not_refresh_the_newest_bar(self):
+        tomorrow = self.today + pd.Timedelta(days=1)
+        live_start = self.today - pd.Timedelta(days=5)
+        self.write_at(self.today + pd.Timedelta(hours=10), live_start, tomorrow)
+        backfill_start = live_start - pd.Timedelta(days=30)
+        self.write_at(self.noon, backfill_start, live_start)
+        self.assertEqual(self.plan_at_noon(backfill_start, tomorrow), [(self.today, tomorrow)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import app
+
+FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def make_frames(seed=0):
+    """Symbols listed over different spans of one calendar, with gaps and spikes"""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range('2019-01-01', periods=900, name='date')
+    frames = {}
+    for symbol, (first, last) in {'AAA': (0, 900), 'BBB': (120, 900), 'CCC': (40, 610)}.items():
+        rows = last - first
+        close = 50 * np.exp(np.cumsum(rng.normal(0, 0.015, rows)))
+        frame = pd.DataFrame({
+            'open': close * (1 + rng.normal(0, 0.003, rows)),
+            'high': close * 1.01,
+            'low': close * 0.99,
+            'close': close,
+            'volume': rng.integers(10_000, 90_000, rows).astype(float),
+        }, index=days[first:last])
+        frame.iloc[rng.choice(rows, 5, replace=False), 3] *= 4.0
+        frame.iloc[rng.choice(rows, 8, replace=False), rng.integers(0, 5)] = np.nan
+        frames[symbol] = frame
+    return frames
+
+
+class PricePanelTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.frames = make_frames()
+        cls.panel = app.PricePanel.from_frames(cls.frames)
+
+    def test_frames_round_trip(self):
+        for symbol, frame in self.frames.items():
+            with self.subTest(symbol=symbol):
+                pd.testing.assert_frame_equal(self.panel.frame(symbol), frame, check_freq=False)
+
+    def test_indicators_match_each_symbol_alone(self):
+        panel = app.compute_panel_indicators(self.panel)
+        for symbol, frame in self.frames.items():
+            with self.subTest(symbol=symbol):
+                expected = app.compute_indicators(frame)
+                pd.testing.assert_frame_equal(panel.frame(symbol)[expected.columns], expected,
+                                              check_exact=False, rtol=1e-9, atol=1e-9, check_freq=False)
+
+    def test_preprocessing_matches_each_symbol_alone(self):
+        for method in app.OUTLIER_METHODS:
+            processed, report = app.preprocess_panel(self.panel, method)
+            for symbol, frame in self.frames.items():
+                with self.subTest(method=method, symbol=symbol):
+                    expected, _, _ = app.preprocess_stock_data(frame, method)
+                    pd.testing.assert_frame_equal(processed.frame(symbol)[FIELDS], expected[FIELDS],
+                                                  check_exact=False, rtol=1e-9, check_freq=False)
+                    np.testing.assert_array_equal(report.loc[symbol, pd.IndexSlice[:, 'missing']], frame[FIELDS].isna().sum())
+
+
+if __name__ == '__main__':
+    unittest.main()
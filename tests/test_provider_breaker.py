@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+import requests
+from requests.adapters import BaseAdapter
+
+import app
+
+
+class FailingAdapter(BaseAdapter):
+    """Transport that fails every request, as during a Yahoo Finance outage"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        raise requests.ConnectionError("connection refused")
+
+    def close(self):
+        pass
+
+
+class YahooOutageOpensBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.adapters = dict(app.YAHOO_SESSION.adapters)
+        self.failing = FailingAdapter()
+        app.YAHOO_SESSION.mount("https://", self.failing)
+        app.YAHOO_SESSION.mount("http://", self.failing)
+        self.breaker = app.PROVIDER_BREAKERS["yahoo"]
+        self.breaker.record_success()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(app, "OHLCV_CACHE_DIR", self.cache_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        app.YAHOO_SESSION.adapters.clear()
+        app.YAHOO_SESSION.adapters.update(self.adapters)
+        self.breaker.record_success()
+        app.NEGATIVE_CACHE.clear("yahoo", "MSFT")
+        self.cache_dir.cleanup()
+
+    def test_breaker_opens_after_threshold(self):
+        start, end = pd.Timestamp("2024-01-01"), pd.Timestamp("2024-04-01")
+        for _ in range(self.breaker.failure_threshold):
+            self.assertEqual(self.breaker.state, "closed")
+            app.NEGATIVE_CACHE.clear("yahoo", "MSFT")
+            with self.assertRaises(app.ProviderUnavailableError):
+                app.call_provider("yahoo", app.load_yahoo_bars, "MSFT", start, end, 2, 0)
+        self.assertEqual(self.breaker.state, "open")
+        self.assertEqual(app.load_cache_coverage("yahoo", "MSFT")["intervals"], [])
+
+        # An open breaker skips Yahoo Finance without touching the network
+        calls = self.failing.calls
+        app.NEGATIVE_CACHE.clear("yahoo", "MSFT")
+        with self.assertRaises(app.ProviderUnavailableError):
+            app.call_provider("yahoo", app.load_yahoo_bars, "MSFT", start, end, 2, 0)
+        self.assertEqual(self.failing.calls, calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
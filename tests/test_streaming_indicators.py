@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import app
+
+
+def make_closes(rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows))),
+                     index=pd.bdate_range('2015-01-02', periods=rows, name='date'), name='close')
+
+
+class StreamingIndicatorsTest(unittest.TestCase):
+    def assert_matches_batch(self, close):
+        streamed = app.StreamingIndicators().update_many(close)
+        streamed.index = close.index
+        expected = app.compute_indicators(close.to_frame())
+        pd.testing.assert_frame_equal(streamed, expected, check_exact=False, rtol=1e-9, atol=1e-9)
+
+    def test_matches_batch_indicators(self):
+        self.assert_matches_batch(make_closes())
+
+    def test_matches_batch_indicators_with_missing_closes(self):
+        close = make_closes()
+        close.iloc[[0, 300, 301, 302, 1500]] = np.nan
+        self.assert_matches_batch(close)
+
+    def test_matches_batch_indicators_on_a_long_series(self):
+        # Far more bars than any window, so rounding in the running sums would show
+        close = make_closes(20_000, seed=1) * 1e4
+        self.assert_matches_batch(close)
+
+    def test_resumed_stream_matches_one_pass(self):
+        close = make_closes()
+        whole = app.StreamingIndicators().update_many(close)
+        state = app.StreamingIndicators()
+        parts = pd.concat([state.update_many(close.iloc[:777]), state.update_many(close.iloc[777:])], ignore_index=True)
+        pd.testing.assert_frame_equal(parts, whole)
+
+    def test_min_periods_matches_pandas_min_periods(self):
+        close = make_closes(300)
+        streamed = app.StreamingIndicators(min_periods=1).update_many(close)
+        expected_std = close.rolling(20, min_periods=1).std().to_numpy()
+        np.testing.assert_allclose(streamed['SMA_20'], close.rolling(20, min_periods=1).mean(), rtol=1e-9)
+        np.testing.assert_allclose(streamed['SMA_50'], close.rolling(50, min_periods=1).mean(), rtol=1e-9)
+        np.testing.assert_allclose(streamed['BB_upper'], close.rolling(20, min_periods=1).mean() + 2 * expected_std, rtol=1e-9)
+
+
+class StreamingEMATest(unittest.TestCase):
+    def test_matches_pandas_ewm_across_gaps(self):
+        close = make_closes(500)
+        close.iloc[[0, 1, 50, 51, 52, 53, 400]] = np.nan
+        ema = app.StreamingEMA(20)
+        streamed = [ema.update(value) for value in close]
+        np.testing.assert_allclose(streamed, close.ewm(span=20, adjust=False).mean(), rtol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import app
+
+
+def make_bars(rows=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    return pd.DataFrame({
+        'open': close * (1 + rng.normal(0, 0.002, rows)),
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'close': close,
+        'volume': rng.integers(100_000, 1_000_000, rows).astype(float),
+    }, index=pd.bdate_range('2018-01-01', periods=rows, name='date'))
+
+
+def reference_features(df, timeframe, pandas_rule):
+    """Indicators of the coarse bars with pandas, each row taking those of the previous coarse bar"""
+    close = df['close'].resample(pandas_rule).last().dropna()
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).rolling(14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+    coarse = pd.DataFrame({
+        f'RSI_{timeframe}': 100 - 100 / (1 + gain / loss),
+        f'MACD_{timeframe}': close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean(),
+        f'SMA_20_{timeframe}': close.rolling(20).mean(),
+    }).shift(1)
+    coarse.index = coarse.index.to_period(app.TIMEFRAMES[timeframe])
+    features = coarse.reindex(df.index.to_period(app.TIMEFRAMES[timeframe]))
+    features.index = df.index
+    return features
+
+
+class TimeframeFeaturesTest(unittest.TestCase):
+    def test_matches_pandas_resample_and_shift(self):
+        df = make_bars()
+        features = app.timeframe_features(df)
+        for timeframe, pandas_rule in [('1W', 'W'), ('1M', 'ME')]:
+            with self.subTest(timeframe=timeframe):
+                expected = reference_features(df, timeframe, pandas_rule)
+                pd.testing.assert_frame_equal(features[expected.columns], expected, check_exact=False, rtol=1e-9, atol=1e-9)
+
+    def test_no_look_ahead(self):
+        df = make_bars()
+        features = app.timeframe_features(df)
+        for cut in [250, 251, 799, 1200]:
+            with self.subTest(cut=cut):
+                # Later prices, however different, must not change any earlier row
+                changed = df.copy()
+                changed.iloc[cut:, :4] *= 3.0
+                pd.testing.assert_frame_equal(app.timeframe_features(changed).iloc[:cut], features.iloc[:cut])
+                pd.testing.assert_frame_equal(app.timeframe_features(df.iloc[:cut]), features.iloc[:cut])
+
+    def test_rows_only_see_completed_bars(self):
+        df = make_bars()
+        sma = app.timeframe_features(df, ['1W'], ['SMA_20'])['SMA_20_1W']
+        weeks = df.index.to_period('W')
+        for row in [200, 201, 202, 203, 204, 900]:
+            completed = df['close'][weeks < weeks[row]]
+            week_closes = completed.groupby(weeks[weeks < weeks[row]]).last()
+            self.assertAlmostEqual(sma.iloc[row], week_closes.iloc[-20:].mean(), places=9)
+
+    def test_requires_a_date_index(self):
+        with self.assertRaises(ValueError):
+            app.timeframe_features(make_bars().reset_index(drop=True))
+
+
+if __name__ == '__main__':
+    unittest.main()